@@ -1,44 +1,379 @@
-# Project/server/hole_punching/rendez_vous.py
+# Project/client/hole_punching/fake_client.py
 
 """
-    UDP client.
+    UDP rendezvous load generator.
     Only here for development purpose.
 
-        1) Run server.py script (UDP server)
-        2) Run this script (UDP client)
-        4) You should see server response message
-        5) Wait for server to close
+    Simulated Unreal hosts send Register requests, simulated clients send
+    Join requests toward a random host (length prefixed JSON, or binary
+    with --binary). Each socket keeps at most one request in flight so
+    every reply is matched to its request; a socket whose request timed
+    out is replaced (late replies cannot be mismatched).
+
+        # Against a running server, 5000 requests per second for 10 s
+        python -m Project.client.hole_punching.fake_client --server 127.0.0.1:5000 --rate 5000
+
+        # Flat out against a local server started in a child process
+        python -m Project.client.hole_punching.fake_client --spawn thread --duration 5 -o thread.json
+
+    Reported (JSON): sent / received / lost requests, achieved packets per
+    second, reply latency percentiles, requests not sent because every
+    socket was busy (generator saturated) and introductions received by
+    simulated hosts when a client joined their session.
 """
 
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import selectors
 import socket
+import sys
+import time
+
+# Static typing checking
+from typing import Any, Dict, List, Optional, Tuple
+
+
+Address = Tuple[str, int]
+
+
+# Datagram sent to a host when a client joins its session (not a reply)
+_INTRODUCE_JSON = b'"Request": "Introduce"'
+
+
+def is_introduction(data: bytes) -> bool:
+    from Project.server.hole_punching import wire
+
+    if wire.is_binary(data):
+        return wire.message_type(data) == wire.INTRODUCE
+    return _INTRODUCE_JSON in data
+
+
+def fstring(obj: Dict[str, Any]) -> bytes:
+    """Length prefixed JSON, as sent by Unreal."""
+    data = json.dumps(obj).encode('utf-8')
+    return len(data).to_bytes(4, byteorder='big') + data
+
+
+class Peer(object):
+
+    """A simulated host or client and its request (encoded once)."""
+
+    __slots__ = ('kind', 'request')
+
+    def __init__(self, kind: str, request: bytes):
+        self.kind = kind
+        self.request = request
+
+
+def make_peers(hosts: int, clients: int, binary: bool, seed: int, offset: int = 0) -> List[Peer]:
+    """*hosts* Register peers then *clients* Join peers (SessionId unique by *offset*)."""
+    from Project.server.hole_punching import wire
+
+    rnd = random.Random(seed)
+    peers = []
+    sessions = ['{0:032X}'.format(offset + index) for index in range(max(hosts, 1))]
+    for session in sessions[:hosts]:
+        if binary:
+            request = wire.encode_register(session)
+        else:
+            request = fstring({'Origin': 'Host', 'Request': 'Register', 'SessionId': session})
+        peers.append(Peer('register', request))
+    for _ in range(clients):
+        session = rnd.choice(sessions)
+        hostAddr = ('10.{0}.{1}.{2}'.format(rnd.randrange(256), rnd.randrange(256), rnd.randrange(1, 255)),
+                    rnd.randrange(1024, 65536))
+        if binary:
+            request = wire.encode_join(hostAddr, session)
+        else:
+            request = fstring({'Origin': 'Client', 'Request': 'Join', 'SessionId': session,
+                               'HostIP': hostAddr[0], 'HostPort': hostAddr[1]})
+        peers.append(Peer('join', request))
+    rnd.shuffle(peers)
+    return peers
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds (nearest rank)."""
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def rank(p: float) -> float:
+        return values[min(len(values) - 1, max(0, int(round(p * len(values))) - 1))] * 1e3
+
+    return {'p50': rank(0.50), 'p90': rank(0.90), 'p99': rank(0.99), 'p999': rank(0.999),
+            'max': values[-1] * 1e3, 'mean': sum(values) / len(values) * 1e3}
+
+
+class LoadGenerator(object):
+
+    """
+        Send requests of *peers* to *server* from *sockets* UDP sockets.
+        *rate* is the target requests per second, 0 sends as fast as replies
+        come back (one request in flight per socket).
+    """
+
+    def __init__(self, server: Address, peers: List[Peer], sockets: int = 256,
+                 rate: float = 0.0, timeout: float = 1.0):
+        super().__init__()
+        self.server = server
+        self.peers = peers
+        self.rate = rate
+        self.timeout = timeout
+
+        self._selector = selectors.DefaultSelector()
+        self._free = []         # type: List[socket.socket]
+        # socket -> (send time, peer kind)
+        self._pending = {}      # type: Dict[socket.socket, Tuple[float, str]]
+        for _ in range(sockets):
+            self._free.append(self._open())
+
+        self.sent = 0
+        self.received = 0
+        self.lost = 0
+        self.skipped = 0
+        self.introductions = 0
+        self.latencies = []     # type: List[float]
+        self.by_type = {}       # type: Dict[str, Dict[str, int]]
+
+    def _open(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ)
+        return sock
+
+    def _count(self, kind: str, key: str) -> None:
+        counts = self.by_type.setdefault(kind, {'sent': 0, 'received': 0, 'lost': 0})
+        counts[key] += 1
+
+    def _send(self, peer: Peer, now: float) -> bool:
+        if not self._free:
+            return False
+        sock = self._free.pop()
+        try:
+            sock.sendto(peer.request, self.server)
+        except (BlockingIOError, InterruptedError):
+            self._free.append(sock)
+            return False
+        self._pending[sock] = (now, peer.kind)
+        self.sent += 1
+        self._count(peer.kind, 'sent')
+        return True
+
+    def _receive(self, wait: float) -> None:
+        for key, _ in self._selector.select(max(wait, 0.0)):
+            sock = key.fileobj
+            while True:
+                try:
+                    data = sock.recv(4096)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    # ICMP port unreachable (server down), request is lost
+                    break
+                if is_introduction(data):
+                    # Host socket told about a joining client
+                    self.introductions += 1
+                    continue
+                now = time.perf_counter()
+                sent = self._pending.pop(sock, None)
+                if sent is None:
+                    continue
+                self.latencies.append(now - sent[0])
+                self.received += 1
+                self._count(sent[1], 'received')
+                self._free.append(sock)
+
+    def _expire(self, now: float) -> None:
+        for sock, (sentAt, kind) in list(self._pending.items()):
+            if now - sentAt < self.timeout:
+                continue
+            del self._pending[sock]
+            self.lost += 1
+            self._count(kind, 'lost')
+            # A late reply must not be taken for the next request's one
+            self._selector.unregister(sock)
+            sock.close()
+            self._free.append(self._open())
+
+    def run(self, duration: float) -> float:
+        """Generate load during *duration* seconds then wait for replies. Return elapsed seconds."""
+        peerIndex = 0
+        start = time.perf_counter()
+        end = start + duration
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        nextSend = start
+        nextExpire = start + self.timeout
+
+        now = start
+        while now < end:
+            if interval:
+                # Catch up on schedule, requests without a free socket are skipped
+                while nextSend <= now:
+                    if not self._send(self.peers[peerIndex], now):
+                        self.skipped += 1
+                    peerIndex = (peerIndex + 1) % len(self.peers)
+                    nextSend += interval
+                wait = min(nextSend, end) - time.perf_counter()
+            else:
+                while self._free:
+                    self._send(self.peers[peerIndex], now)
+                    peerIndex = (peerIndex + 1) % len(self.peers)
+                wait = 0.01
+            self._receive(min(wait, 0.01))
+            now = time.perf_counter()
+            if now >= nextExpire:
+                self._expire(now)
+                nextExpire = now + min(self.timeout, 0.1)
+        elapsed = time.perf_counter() - start
+
+        # Drain replies still in flight
+        drainEnd = time.perf_counter() + self.timeout
+        while self._pending and time.perf_counter() < drainEnd:
+            self._receive(0.01)
+        self._expire(float('inf'))
+        return elapsed
+
+    def close(self) -> None:
+        for key in list(self._selector.get_map().values()):
+            key.fileobj.close()
+        self._selector.close()
+
+
+def _generate(args: Dict[str, Any], index: int, result: Any) -> None:
+    """Body of a generator process, puts its raw counters in *result*."""
+    peers = make_peers(args['hosts'], args['clients'], args['binary'], args['seed'] + index,
+                       offset=index * args['hosts'])
+    generator = LoadGenerator(tuple(args['server']), peers, sockets=args['sockets'],
+                              rate=args['rate'], timeout=args['timeout'])
+    try:
+        elapsed = generator.run(args['duration'])
+    finally:
+        generator.close()
+    result.put({'sent': generator.sent, 'received': generator.received, 'lost': generator.lost,
+                'skipped': generator.skipped, 'introductions': generator.introductions,
+                'elapsed': elapsed, 'by_type': generator.by_type,
+                'latencies': generator.latencies})
+
+
+def _serve(engine: str, port: int, ready: Any, stop: Any) -> None:
+    """Body of the local server process (see --spawn)."""
+    from Project.server.hole_punching import DestruckUDPServer, AsyncDestruckUDPServer
+
+    server = (AsyncDestruckUDPServer if engine == 'asyncio' else DestruckUDPServer)()
+    server.start('127.0.0.1', port)
+    ready.set()
+    stop.wait()
+    server.stop()
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Run *args['processes']* generators (rate, hosts and clients split between them)."""
+    processes = args['processes']
+    share = dict(args, hosts=max(1, args['hosts'] // processes),
+                 clients=args['clients'] // processes, rate=args['rate'] / processes,
+                 sockets=max(1, args['sockets'] // processes))
+
+    context = multiprocessing.get_context('spawn')
+    result = context.Queue()
+    workers = [context.Process(target=_generate, args=(share, index, result))
+               for index in range(processes)]
+    for worker in workers:
+        worker.start()
+    outcomes = [result.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    latencies = []      # type: List[float]
+    byType = {}         # type: Dict[str, Dict[str, int]]
+    for outcome in outcomes:
+        latencies.extend(outcome['latencies'])
+        for kind, counts in outcome['by_type'].items():
+            total = byType.setdefault(kind, {'sent': 0, 'received': 0, 'lost': 0})
+            for key, count in counts.items():
+                total[key] += count
+    sent = sum(o['sent'] for o in outcomes)
+    received = sum(o['received'] for o in outcomes)
+    elapsed = max(o['elapsed'] for o in outcomes)
+    return {
+        'config': {key: args[key] for key in ('server', 'hosts', 'clients', 'rate', 'duration', 'sockets',
+                                              'processes', 'timeout', 'binary', 'spawn')},
+        'sent': sent,
+        'received': received,
+        'lost': sum(o['lost'] for o in outcomes),
+        'skipped': sum(o['skipped'] for o in outcomes),
+        'introductions': sum(o['introductions'] for o in outcomes),
+        'elapsed': elapsed,
+        'pps_sent': sent / elapsed,
+        'pps_received': received / elapsed,
+        'loss_ratio': (sent - received) / sent if sent else 0.0,
+        'latency_ms': percentiles(latencies),
+        'by_type': byType,
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', default='127.0.0.1:5000', help='host:port of the rendezvous server')
+    parser.add_argument('--spawn', choices=('thread', 'asyncio'), default=None,
+                        help='start a local DestruckUDPServer (engine) on a free port instead')
+    parser.add_argument('--hosts', type=int, default=1000, help='simulated hosts (Register)')
+    parser.add_argument('--clients', type=int, default=4000, help='simulated clients (Join)')
+    parser.add_argument('--rate', type=float, default=0.0, help='requests per second, 0 for flat out')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    parser.add_argument('--sockets', type=int, default=256, help='UDP sockets (max requests in flight)')
+    parser.add_argument('--processes', type=int, default=1, help='generator processes')
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds before a request is lost')
+    parser.add_argument('--binary', action='store_true', help='binary wire format instead of JSON')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='', help='JSON result file (default to stdout)')
+    args = vars(parser.parse_args(argv))
+    hostName, _, port = args['server'].rpartition(':')
+    args['server'] = [hostName, int(port)]
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+
+    serverProcess = stop = None
+    if args['spawn']:
+        context = multiprocessing.get_context('spawn')
+        args['server'] = ['127.0.0.1', free_port()]
+        ready, stop = context.Event(), context.Event()
+        serverProcess = context.Process(target=_serve, args=(args['spawn'], args['server'][1], ready, stop))
+        serverProcess.start()
+        if not ready.wait(30):
+            raise RuntimeError('Local server did not start')
+    try:
+        report = run(args)
+    finally:
+        if serverProcess is not None:
+            stop.set()
+            serverProcess.join(10)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args['output']:
+        with open(args['output'], 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return report
 
 
 if __name__ == '__main__':
-    message = 'Hello server !'.encode()
-    # server_address = ('109.9.79.198', 5000)
-    # server_address = ('localhost', 5000)
-    server_address = ('109.9.79.198', 5000)
-
-    # Create a UDP socket wrapped in safe environment
-    # Auto handle close event if program crash
-    # Sugar syntax similar to
-    # try:
-    #   Create and use socket
-    # except Exception as e:
-    #     raise e
-    # finally:
-    #     close socket
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-        # Force a specific port for client
-        sock.bind(('', 5000))
-        # Define maximum time to wait between in each blocking call
-        # sock.settimeout(1)
-
-        # Send a fake message to test server response
-        sent = sock.sendto(message, server_address)
-
-        # # Check response
-        # msg, addr = sock.recvfrom(4096)
-        # print(msg.decode())
-        # msg, addr = sock.recvfrom(4096)
-        # print(msg.decode())
+    report = main()
+    sys.exit(0 if report['received'] else 1)
@@ -13,9 +13,16 @@ from flask_bcrypt import Bcrypt
 # Jinja filters
 from . import jinjafilter
 
+# Packets encoding
+from Project.tools import raw_json
+from Project.tools.logger import configure_sampling
+
 # Data storage
 from Project.server.data import DataManager
 
+# Monitoring
+from Project.tools.metrics import MetricsRegistry
+
 # Control server terminate at exit
 from werkzeug.serving import is_running_from_reloader
 
@@ -43,6 +50,12 @@ bcrypt = Bcrypt()
 container = DataManager()
 container.init_app(LOG)
 
+# Process metrics, exposed on /metrics
+metrics = MetricsRegistry(prefix='destruck_')
+metrics.gauge('hosts', 'Registered hosts', lambda: len(container))
+metrics.gauge('clients', 'Connected socket.io clients', lambda: len(container.clients))
+metrics.gauge('registry_version', 'Hosts registry version', lambda: container.version)
+
 
 def create_app(environnement: str = 'dev'):
     """Initialize the application. Environnement can be 'dev', 'testing', 'prod', 'prod_pythonanywhere'."""
@@ -57,6 +70,9 @@ def create_app(environnement: str = 'dev'):
     if environnement in mapper.keys():
         app.config.from_object(mapper[environnement])
 
+    # Sampled hot path logs (UDP datagrams, frequent socket.io events)
+    configure_sampling(app.config['LOG_SAMPLING'], app.config['LOG_SUMMARY_INTERVAL'])
+
     # Attach extensions
     jinjafilter.init_app(app)
     bcrypt.init_app(app)
@@ -82,15 +98,98 @@ def create_app(environnement: str = 'dev'):
         return render_template('errors/500.html'), 500
 
     # SocketIO support
-    socketio = SocketIO(app)
+    # Use a json module aware of pre-encoded payloads (see container.hosts_snapshot)
+    socketio = SocketIO(app, json=raw_json)
 
-    from Project.server.main.views import mainIO_blueprint
-    mainIO_blueprint.init_io(socketio)
+    from Project.server.main.views import mainIO_blueprint, hosts_feed, host_leases
+    mainIO_blueprint.init_io(socketio, metrics)
+
+    # Push hosts changes to subscribers
+    hosts_feed.window = app.config['HOSTS_FEED_WINDOW']
+    hosts_feed.init_io(socketio, container)
+
+    # Expire hosts which stopped sending heartbeats
+    host_leases.ttl = app.config['HOST_LEASE_TTL']
+    host_leases.tick = app.config['HOST_LEASE_TICK']
+    host_leases.init_io(socketio, container, metrics)
 
     # UDP server should only be run once
-    from Project.server.hole_punching import DestruckUDPServer
-    udpServer = DestruckUDPServer()
-    if (not is_running_from_reloader()):
-        udpServer.start('0.0.0.0', 5000)
+    from Project.server.hole_punching import DestruckUDPServer, AsyncDestruckUDPServer, UDPWorkerSupervisor
+    from Project.server.hole_punching.rate_limit import SourceRateLimiter
+    from Project.server.hole_punching.relay import UDPRelay
+    udpClass = AsyncDestruckUDPServer if app.config['UDP_ENGINE'] == 'asyncio' else DestruckUDPServer
+    limiter = None
+    if app.config['UDP_RATE_LIMIT'] > 0 or app.config['UDP_GLOBAL_PPS'] > 0:
+        limiter = SourceRateLimiter(app.config['UDP_RATE_LIMIT'], app.config['UDP_RATE_BURST'],
+                                    app.config['UDP_RATE_SOURCES'], app.config['UDP_GLOBAL_PPS'])
+    if app.config['UDP_WORKERS'] > 0:
+        if app.config['UDP_PROBE_PORTS']:
+            server_log.warning('UDP_PROBE_PORTS ignored with UDP_WORKERS, NAT classification disabled')
+        if app.config['UDP_RELAY']:
+            server_log.warning('UDP_RELAY ignored with UDP_WORKERS, relay disabled')
+        # Workers do not share the hosts registry
+        server_log.info('Host STATUS datagrams unavailable with UDP_WORKERS, use OnUpdateHostConnection')
+        udpServer = UDPWorkerSupervisor('0.0.0.0', app.config['UDP_PORT'],
+                                        workers=app.config['UDP_WORKERS'], factory=udpClass,
+                                        store_path=app.config['UDP_STORE_PATH'], limiter=limiter)
+        if (not is_running_from_reloader()):
+            udpServer.start()
+    else:
+        relay = None
+        if app.config['UDP_RELAY']:
+            relay = UDPRelay(app.config['UDP_RELAY_PORT'], app.config['UDP_RELAY_TIMEOUT'],
+                             app.config['UDP_RELAY_SESSIONS'], app.config['UDP_RELAY_PER_SOURCE'],
+                             app.config['UDP_RELAY_PER_HOST'])
+        udpServer = udpClass(queue_size=app.config['UDP_QUEUE_SIZE'],
+                             overflow=app.config['UDP_QUEUE_OVERFLOW'],
+                             limiter=limiter, probe_ports=app.config['UDP_PROBE_PORTS'], relay=relay,
+                             host_status=container.update_host_status,
+                             host_lookup=container.get_host_by_session)
+        if (not is_running_from_reloader()):
+            udpServer.start('0.0.0.0', app.config['UDP_PORT'])
+    _udp_metrics(udpServer)
 
     return app, socketio, udpServer
+
+
+def _udp_metrics(udpServer) -> None:
+    """Gauges of the UDP server running in this process (workers keep their own metrics)."""
+    from Project.server.hole_punching import UDPWorkerSupervisor
+    if isinstance(udpServer, UDPWorkerSupervisor):
+        metrics.gauge('udp_workers_alive', 'UDP worker processes running', udpServer.alive)
+        metrics.gauge('udp_worker_restarts_total', 'UDP worker processes restarted',
+                      lambda: udpServer.restarts, kind='counter')
+        return
+    metrics.gauge('udp_outbound_queue_depth', 'Datagrams waiting to be sent',
+                  lambda: udpServer.outbound_stats()['depth'])
+    metrics.gauge('udp_outbound_dropped_total', 'Datagrams dropped because the queue was full',
+                  lambda: {('0',): udpServer.outbound_stats()['dropped_0'],
+                           ('1',): udpServer.outbound_stats()['dropped_1']},
+                  labels=('priority',), kind='counter')
+    metrics.gauge('udp_handler_errors_total', 'Datagrams whose handler raised (dropped)',
+                  lambda: udpServer.handler_errors, kind='counter')
+    metrics.gauge('udp_rate_limited_total', 'Datagrams dropped before decoding by the rate limiter',
+                  lambda: {('source',): udpServer.limiter_stats().get('dropped_source', 0),
+                           ('global',): udpServer.limiter_stats().get('dropped_global', 0)},
+                  labels=('reason',), kind='counter')
+    metrics.gauge('udp_rate_limit_sources', 'Source addresses tracked by the rate limiter',
+                  lambda: udpServer.limiter_stats().get('sources', 0))
+    metrics.gauge('udp_rate_limit_evicted_total', 'Sources evicted from the rate limiter table',
+                  lambda: udpServer.limiter_stats().get('evicted', 0), kind='counter')
+    metrics.gauge('udp_nat_classified_ips', 'Public IPs whose NAT behaviour is known',
+                  lambda: len(udpServer.nat))
+    if udpServer.relay is not None:
+        _relay_metrics(udpServer.relay)
+
+
+def _relay_metrics(relay) -> None:
+    """Gauges of the UDP relay (counters kept by the relay thread)."""
+    metrics.gauge('udp_relay_sessions', 'Relay sessions allocated', lambda: len(relay))
+    metrics.gauge('udp_relay_reclaimed_total', 'Relay sessions reclaimed after idle timeout',
+                  lambda: relay.reclaimed, kind='counter')
+    metrics.gauge('udp_relay_packets_total', 'Datagrams forwarded by the relay',
+                  lambda: relay.stats()['packets'], kind='counter')
+    metrics.gauge('udp_relay_bytes_total', 'Bytes forwarded by the relay',
+                  lambda: relay.stats()['bytes'], kind='counter')
+    metrics.gauge('udp_relay_dropped_total', 'Datagrams dropped by the relay (unbound source or peer)',
+                  lambda: relay.dropped, kind='counter')
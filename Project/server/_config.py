@@ -19,6 +19,52 @@ class BaseConfig(object):
     WTF_CSRF_ENABLED = False
     DEBUG = False
     ENV = ''
+    # Seconds during which hosts changes are coalesced before being pushed
+    HOSTS_FEED_WINDOW = 0.25
+    # Seconds a host stays listed without heartbeat (OnHostHeartbeat), 0 keeps
+    # hosts until their socket disconnects. Leases are checked every HOST_LEASE_TICK seconds
+    HOST_LEASE_TTL = float(os.environ.get('HOST_LEASE_TTL', 0))
+    HOST_LEASE_TICK = 1.0
+    # UDP rendezvous engine: 'thread' (receive / send threads) or 'asyncio'
+    UDP_ENGINE = os.environ.get('UDP_ENGINE', 'thread')
+    # Messages waiting to be sent by the UDP server and policy when full
+    # ('drop_new' or 'shed', see OutboundQueue)
+    UDP_QUEUE_SIZE = 4096
+    UDP_QUEUE_OVERFLOW = 'drop_new'
+    # Number of rendezvous worker processes sharing the port (SO_REUSEPORT),
+    # 0 runs the server inside the application process
+    UDP_WORKERS = int(os.environ.get('UDP_WORKERS', 0))
+    # Port of the UDP rendezvous server, 0 for any free port
+    UDP_PORT = int(os.environ.get('UDP_PORT', 5000))
+    # SQLite file where UDP_WORKERS share host endpoints, empty for
+    # udp_endpoints_<port>.db in the temporary directory
+    UDP_STORE_PATH = os.environ.get('UDP_STORE_PATH', '')
+    # Extra ports answering NAT probes, one or two ('5001,5002'), empty disables
+    # NAT classification. Not available with UDP_WORKERS
+    UDP_PROBE_PORTS = [int(p) for p in os.environ.get('UDP_PROBE_PORTS', '').split(',') if p.strip()]
+    # Relay for peers which cannot punch (UDP_RELAY=1), sessions idle for
+    # UDP_RELAY_TIMEOUT seconds are reclaimed. Not available with UDP_WORKERS
+    UDP_RELAY = os.environ.get('UDP_RELAY', '0') == '1'
+    UDP_RELAY_PORT = int(os.environ.get('UDP_RELAY_PORT', 5003))
+    UDP_RELAY_TIMEOUT = 30.0
+    UDP_RELAY_SESSIONS = 4096
+    # Relay sessions at once per joining peer IP and per host IP
+    UDP_RELAY_PER_SOURCE = 4
+    UDP_RELAY_PER_HOST = 16
+    # Datagrams per second accepted from one source IP (bursts of UDP_RATE_BURST),
+    # at most UDP_RATE_SOURCES tracked sources. Off (0) by default: players behind
+    # a carrier grade NAT share one public IP and would share its budget. When
+    # enabled, size it for the busiest shared address expected, not for one player
+    UDP_RATE_LIMIT = float(os.environ.get('UDP_RATE_LIMIT', 0))
+    UDP_RATE_BURST = 40
+    UDP_RATE_SOURCES = 65536
+    # Datagrams per second accepted from all sources (per worker), 0 for no ceiling.
+    # Applies even when UDP_RATE_LIMIT is 0
+    UDP_GLOBAL_PPS = float(os.environ.get('UDP_GLOBAL_PPS', 20000))
+    # Write 1 line every N events of a logging category ('udp.recv=100,io.ask_hosts=10')
+    # and a summary line per category every LOG_SUMMARY_INTERVAL seconds (0 disables)
+    LOG_SAMPLING = os.environ.get('LOG_SAMPLING', '')
+    LOG_SUMMARY_INTERVAL = float(os.environ.get('LOG_SUMMARY_INTERVAL', 0))
 
 
 class DevelopmentConfig(BaseConfig):
@@ -27,13 +73,15 @@ class DevelopmentConfig(BaseConfig):
     PROPAGATE_EXCEPTIONS = True
 
 
-# class TestingConfig(BaseConfig):
-#     """Testing configuration."""
-#     DATABASE_NAME = '../tests/tests.db'
-#     DATABASE_PATH = basedir / DATABASE_NAME
-#     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + DATABASE_PATH
-#     TESTING = True
-#     PROPAGATE_EXCEPTIONS = True
+class TestingConfig(BaseConfig):
+    """Testing configuration."""
+    TESTING = True
+    PROPAGATE_EXCEPTIONS = True
+    # May run next to a development server
+    UDP_PORT = 0
+    # Load harnesses send every datagram from loopback (whatever the environment)
+    UDP_RATE_LIMIT = 0
+    UDP_GLOBAL_PPS = 0
 
 
 # class ProductionConfig(BaseConfig):
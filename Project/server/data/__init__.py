@@ -2,4 +2,6 @@
 
 from .host import Host
 
+from .query import HostQuery
+
 from .data_manager import DataManager
@@ -1,13 +1,20 @@
 # Project/server/data_manager.py
 
 import logging
+import secrets
+import threading
 
-from collections import namedtuple
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, deque
+from operator import itemgetter
 
-from Project.server.data import Host
+from Project.server.data import Host, HostQuery
+from Project.tools.raw_json import RawJSON
+from Project.tools.snapshot_map import SnapshotMap
+from Project.tools.timing_wheel import TimingWheel
 
 # Type checking
-from typing import NewType
+from typing import NewType, Dict, List, Optional, Any, Callable, Iterable
 
 HostType = NewType("Host", Host)
 
@@ -15,16 +22,139 @@ HostType = NewType("Host", Host)
 Client = namedtuple('Client', 'sid, adrr, port')
 
 
+class RegistrySnapshot(object):
+
+    """Hosts registry at one version, never modified once published.
+
+       *hosts* maps client_ID to (insertion sequence, Host), *indexes* map
+       an index name to {indexed value: {client_ID: True}} (see
+       `DataManager._INDEXES`), all of them SnapshotMap. Results derived
+       from the snapshot (ordered hosts, encoded list, sorted queries) are
+       cached on it by the first reader needing them.
+    """
+
+    __slots__ = ('version', 'hosts', 'indexes', '_ordered', '_encoded', '_queries')
+
+    def __init__(self, version: int, hosts: SnapshotMap, indexes: Dict[str, SnapshotMap]):
+        super().__init__()
+        self.version = version
+        self.hosts = hosts
+        self.indexes = indexes
+        self._ordered = None      # type: Optional[List[Host]]
+        self._encoded = None      # type: Optional[RawJSON]
+        # HostQuery.key -> (sort keys, hosts)
+        self._queries = dict()
+
+    def get(self, client_ID: str) -> Optional[Host]:
+        entry = self.hosts.get(client_ID, None)
+        return entry[1] if entry is not None else None
+
+    def ordered(self) -> List[Host]:
+        """Hosts in insertion order (shared, do not mutate)."""
+        ordered = self._ordered
+        if ordered is None:
+            ordered = self._ordered = [h for _, h in sorted(self.hosts.values(), key=itemgetter(0))]
+        return ordered
+
+    def bucket(self, name: str, value: Any) -> SnapshotMap:
+        """client_IDs indexed under *value* in index *name* (TypeError if unhashable)."""
+        return self.indexes[name].get(value, _NO_BUCKET)
+
+    def lookup(self, name: str, value: Any) -> List[Host]:
+        """Hosts indexed under *value* in index *name*, in insertion order."""
+        try:
+            bucket = self.bucket(name, value)
+        except TypeError:
+            return []
+        entries = [self.hosts.get(clientID) for clientID in bucket]
+        entries.sort(key=itemgetter(0))
+        return [h for _, h in entries]
+
+
+_NO_BUCKET = SnapshotMap()
+
+
 class DataManager(object):
 
-    """Container to store HOSTS and websocket CLIENTS."""
+    """Container to store HOSTS and websocket CLIENTS.
+
+       Hosts are stored in a primary index keyed by client_ID. Secondary
+       indexes (hostName, ipAddress, SessionId, ...) map a value to the hosts
+       sharing it and are kept in sync on add, remove and update so every
+       lookup / removal is O(1) whatever the number of hosts.
+
+       Read-copy-update: socket.io handlers (greenlets) and the UDP server
+       (threads) share the registry. Writers are serialized by a lock and
+       each mutation publishes a new `RegistrySnapshot`, built from the
+       previous one with copy on write maps (a few micro seconds whatever
+       the number of hosts). Published hosts are never modified, an update
+       publishes a copy. Readers only load the current snapshot: no lock,
+       never a half applied mutation.
+
+       Each mutation bumps `version`. The encoded host list returned by
+       `func::hosts_snapshot` is built once per snapshot. Same goes for
+       sorted results of `func::query_hosts`, pages are then a bisect and
+       a slice.
+
+       Listeners (see `func::add_listener`) are told about each mutation.
+       The last *changelog_size* mutations are also kept (ring buffer) to
+       answer `func::changes_since` with a delta instead of all hosts.
+       Versions restart from 0 with the process, *epoch* (random) tells
+       versions of this registry from those of a previous one.
 
-    def __init__(self):
+       Hosts may be given a lease (see `func::enable_leases`): a host not
+       renewed within the lease duration is removed by `func::expire_leases`.
+
+       A host may also be given a status token (see `func::issue_status_token`)
+       to refresh its open slots from the rendezvous server, without its
+       socket.io connection (see `func::update_host_status`).
+    """
+
+    # Secondary indexes (see `func::_index_keys`)
+    _INDEXES = ('hostName', 'ipAddress', 'SessionId',
+                'BuildUniqueId', 'bAllowJoinInProgress', 'HasOpenPublicSlot')
+    # Session keys which can serve an equality filter from an index
+    _QUERY_INDEXES = ('SessionId', 'BuildUniqueId', 'bAllowJoinInProgress')
+    # Number of query result sets kept per snapshot
+    _QUERY_CACHE_SIZE = 128
+    # Bytes of a host status token (see wire.STATUS_TOKEN_SIZE)
+    STATUS_TOKEN_SIZE = 8
+
+    # Kind of mutations given to listeners
+    ADDED = 'added'
+    REMOVED = 'removed'
+    UPDATED = 'updated'
+
+    def __init__(self, changelog_size: int = 4096):
         super().__init__()
 
-        self.hosts = []
+        # Published registry, replaced (never modified) by writers
+        self._state = RegistrySnapshot(0, SnapshotMap(),
+                                       {name: SnapshotMap() for name in DataManager._INDEXES})
+        # Serialize writers, readers never take it
+        self._lock = threading.Lock()
+        # Insertion sequence of next host
+        self._sequence = 0
         self.clients = dict()
 
+        self.snapshot_hits = 0
+        self.snapshot_misses = 0
+
+        self._listeners = []          # type: List[Callable[[str, Host], None]]
+        # (version, kind, client_ID) of last mutations
+        self._changelog = deque(maxlen=changelog_size)
+        # Versions of another registry instance mean nothing here
+        self.epoch = secrets.token_hex(8)
+
+        # Host leases, disabled until enable_leases
+        self.lease_ttl = 0.0
+        self._leases = None           # type: Optional[TimingWheel]
+        self.leases_expired = 0
+
+        # Host status tokens: token -> client_ID and client_ID -> token
+        self._statusTokens = dict()   # type: Dict[bytes, str]
+        self._tokenOf = dict()        # type: Dict[str, bytes]
+
     def init_app(self, logMain: str) -> None:
         # @TODO Add logging to methods
         self._logger = logging.getLogger(logMain + '.DataManager')
@@ -36,58 +166,397 @@ class DataManager(object):
     def unregister_client(self, session_id) -> Client:
         return self.clients.pop(session_id, None)
 
-    def add_host(self, host: HostType) -> None:
+    def add_listener(self, callback: Callable[[str, Host], None]) -> None:
+        """Call *callback(kind, host)* after each hosts mutation where kind is
+           one of ADDED, REMOVED or UPDATED. Called by the writer thread,
+           writers wait for it.
+        """
+        self._listeners.append(callback)
+
+    def enable_leases(self, ttl: float, tick: float = 1.0) -> None:
+        """Remove hosts not renewed for *ttl* seconds (0 disables leases).
+           Expiry is checked with a *tick* seconds resolution.
+        """
+        with self._lock:
+            self.lease_ttl = ttl
+            self._leases = TimingWheel(tick) if ttl > 0 else None
+            if self._leases is not None:
+                for clientID in self._state.hosts:
+                    self._leases.schedule(clientID, ttl)
+
+    def renew_lease(self, client_ID: str) -> bool:
+        """Extend lease of host *client_ID*. False if host is unknown."""
+        # Locked: a host being removed never gets its lease back
+        with self._lock:
+            if client_ID not in self._state.hosts:
+                return False
+            if self._leases is not None:
+                self._leases.schedule(client_ID, self.lease_ttl)
+            return True
+
+    def expire_leases(self, now: Optional[float] = None) -> List[Host]:
+        """Remove hosts whose lease ended before *now* (monotonic time)."""
+        leases = self._leases
+        if leases is None:
+            return []
+        expired = []
+        for clientID in leases.advance(now):
+            with self._lock:
+                # Expired keys leave the wheel, back in it when renewed since
+                if clientID in leases:
+                    continue
+                host = self._remove_host(clientID)
+            if host is not None:
+                expired.append(host)
+        self.leases_expired += len(expired)
+        return expired
+
+    def issue_status_token(self, client_ID: str) -> Optional[bytes]:
+        """Token authenticating status updates of host *client_ID* (same one
+           until the host is removed). None if host is unknown.
+        """
+        with self._lock:
+            if client_ID not in self._state.hosts:
+                return None
+            token = self._tokenOf.get(client_ID, None)
+            if token is None:
+                token = secrets.token_bytes(DataManager.STATUS_TOKEN_SIZE)
+                self._statusTokens[token] = client_ID
+                self._tokenOf[client_ID] = token
+            return token
+
+    def update_host_status(self, token: bytes, open_private: int, open_public: int) -> Optional[Host]:
+        """Open slots of the host owning status *token*. None if token is unknown."""
+        clientID = self._statusTokens.get(token, None)
+        if clientID is None:
+            return None
+        return self.set_open_connections(clientID, open_private, open_public)
+
+    @property
+    def leases(self) -> int:
+        """Number of hosts holding a lease."""
+        leases = self._leases
+        return len(leases) if leases is not None else 0
+
+    @property
+    def snapshot(self) -> RegistrySnapshot:
+        """Current registry, consistent whatever writers do meanwhile."""
+        return self._state
+
+    @property
+    def version(self) -> int:
+        """Registry version, increased after each hosts mutation."""
+        return self._state.version
+
+    @property
+    def hosts(self) -> List[Host]:
+        """Hosts in insertion order (copy, mutating it has no effect)."""
+        return list(self._state.ordered())
+
+    def add_host(self, host: HostType) -> bool:
         """Add a new host to existing list of hosts."""
-        if host not in self.hosts:
-            self.hosts.append(host)
+        with self._lock:
+            state = self._state
+            if host.client_ID in state.hosts:
+                return False
+            hosts = state.hosts.set(host.client_ID, (self._sequence, host))
+            self._sequence += 1
+            indexes = self._index(state.indexes, host.client_ID, self._index_keys(host))
+            if self._leases is not None:
+                self._leases.schedule(host.client_ID, self.lease_ttl)
+            self._publish(DataManager.ADDED, host, hosts, indexes)
+            return True
+
+    def get_host(self, client_ID: str) -> Optional[Host]:
+        return self._state.get(client_ID)
+
+    def get_hosts_by_name(self, host_name: str) -> List[Host]:
+        return self._state.lookup('hostName', host_name)
+
+    def get_hosts_by_address(self, ip_address: str) -> List[Host]:
+        return self._state.lookup('ipAddress', ip_address)
+
+    def get_host_by_session(self, session_id: str) -> Optional[Host]:
+        """Get first host advertising *session_id*."""
+        for h in self._state.lookup('SessionId', session_id):
+            return h
+        return None
 
     def remove_hosts_by_name(self, host_name: str) -> int:
-        """Remove a existing host from"""
-        oldCount = len(self.hosts)
-        self.hosts = [h for h in self.hosts if h.hostName == host_name]
-        return oldCount - len(self.hosts)
+        """Remove existing hosts based on host_name. Return number of deleted items"""
+        return self._remove_many(self.get_hosts_by_name(host_name))
 
     def remove_hosts_by_address(self, ip_address: str) -> int:
-        """Remove a existing host based on ip_address"""
-        oldCount = len(self.hosts)
-        self.hosts = [h for h in self.hosts if h.ipAddress == ip_address]
-        return oldCount - len(self.hosts)
+        """Remove existing hosts based on ip_address. Return number of deleted items"""
+        return self._remove_many(self.get_hosts_by_address(ip_address))
 
     def remove_hosts(self, host_name: str, ip_address: str) -> int:
         """Remove hosts matching host_name and ip_adress. Return number of deleted items"""
-        oldCount = len(self.hosts)
-        self.hosts = [h for h in self.hosts if (h.hostName, h.ipAddress) != (host_name, ip_address)]
-        return oldCount - len(self.hosts)
+        state = self._state
+        try:
+            byName = state.bucket('hostName', host_name)
+            byAddress = state.bucket('ipAddress', ip_address)
+        except TypeError:
+            return 0
+        # Walk the smallest bucket only
+        if len(byAddress) < len(byName):
+            byName, byAddress = byAddress, byName
+        return self._remove_many([state.get(cid) for cid in byName if cid in byAddress])
 
     def remove_host_by_ID(self, client_ID: str) -> int:
-        oldCount = len(self.hosts)
-        self.hosts = [h for h in self.hosts if h.client_ID != client_ID]
-        return oldCount - len(self.hosts)
+        with self._lock:
+            return 1 if self._remove_host(client_ID) is not None else 0
 
     def get_name_from(self, ip_address: str) -> str:
         """Get first player name based on ip adress"""
-        for name, ip, _ in self.hosts:
-            if ip == ip_address:
-                return name
+        for h in self._state.lookup('ipAddress', ip_address):
+            return h.hostName
         return ''
 
     def hosts_as_json(self) -> str:
         """Create a JSON based on hosts."""
-        result = [h.to_dict() for h in self.hosts]
+        result = [h.to_dict() for h in self._state.ordered()]
         return result
 
+    def hosts_snapshot(self) -> RawJSON:
+        """Hosts list already encoded to JSON. Built once per registry version."""
+        state = self._state
+        encoded = state._encoded
+        if encoded is None:
+            self.snapshot_misses += 1
+            # Readers racing here encode the same immutable snapshot
+            encoded = state._encoded = RawJSON.encode_from([h.to_dict() for h in state.ordered()])
+        else:
+            self.snapshot_hits += 1
+        return encoded
+
+    def query_hosts(self, query: HostQuery) -> Dict[str, Any]:
+        """One page of hosts matching *query*.
+
+           Result set of a query is sorted once per registry version, asking
+           for a page then costs the page size whatever the number of hosts.
+        """
+        state = self._state
+        entry = state._queries.get(query.key, None)
+        if entry is None:
+            ordered = sorted((query.sort_key(h), h)
+                             for h in self._candidates(state, query) if query.matches(h))
+            entry = ([k for k, _ in ordered], [h for _, h in ordered])
+            if len(state._queries) >= DataManager._QUERY_CACHE_SIZE:
+                state._queries.clear()
+            state._queries[query.key] = entry
+
+        keys, hosts = entry
+        if not query.descending:
+            start = 0 if query.cursor is None else bisect_right(keys, query.cursor)
+            end = min(start + query.limit, len(hosts))
+            page = hosts[start:end]
+            hasMore = end < len(hosts)
+        else:
+            end = len(hosts) if query.cursor is None else bisect_left(keys, query.cursor)
+            start = max(end - query.limit, 0)
+            page = hosts[start:end][::-1]
+            hasMore = start > 0
+
+        return {'version': state.version,
+                'total': len(hosts),
+                'hosts': [query.project(h) for h in page],
+                'cursor': list(query.sort_key(page[-1])) if (page and hasMore) else None}
+
+    @staticmethod
+    def _candidates(state: RegistrySnapshot, query: HostQuery) -> Iterable[Host]:
+        """Smallest set of hosts given by indexes which may match *query*."""
+        best = None
+        for field in DataManager._QUERY_INDEXES:
+            condition = query.filters.get(field, None)
+            if condition is None or 'eq' not in condition:
+                continue
+            try:
+                bucket = state.bucket(field, condition['eq'])
+            except TypeError:
+                # Unhashable value, nothing indexed under it
+                return ()
+            if best is None or len(bucket) < len(best):
+                best = bucket
+
+        condition = query.filters.get('NumOpenPublicConnections', {})
+        if condition.get('gt', None) == 0 or condition.get('gte', None) == 1:
+            bucket = state.bucket('HasOpenPublicSlot', True)
+            if best is None or len(bucket) < len(best):
+                best = bucket
+        if best is None or len(best) >= len(state.hosts):
+            return (h for _, h in state.hosts.values())
+        return (state.get(clientID) for clientID in best)
+
+    def changes_since(self, since: int, epoch: str) -> Optional[Dict[str, Any]]:
+        """Hosts added, updated and removed after version *since* of *epoch*.
+
+           Return None when *since* is older than the change log (or is not a
+           version of this registry, e.g. given before a restart), caller
+           should then send all hosts.
+        """
+        state = self._state
+        if epoch != self.epoch or since > state.version or since < 0:
+            return None
+        # Copied after the snapshot was taken: may go past its version, never short of it
+        changelog = list(self._changelog)
+        if since < state.version and (not changelog or changelog[0][0] > since + 1):
+            return None
+
+        # client_ID -> first change after since
+        firstKinds = {}
+        for version, kind, clientID in reversed(changelog):
+            if version <= since:
+                break
+            if version <= state.version:
+                firstKinds[clientID] = kind
+
+        added, updated, removed = [], [], []
+        for clientID, kind in firstKinds.items():
+            host = state.get(clientID)
+            if host is None:
+                # Added then removed is invisible to the caller
+                if kind != DataManager.ADDED:
+                    removed.append(clientID)
+            elif kind == DataManager.ADDED:
+                added.append(host.to_dict())
+            else:
+                updated.append(host.to_dict())
+
+        return {'epoch': self.epoch, 'version': state.version, 'full': False,
+                'added': added, 'updated': updated, 'removed': removed}
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        return {'version': self._state.version,
+                'hits': self.snapshot_hits,
+                'misses': self.snapshot_misses}
+
     def __contains__(self, data):
         if isinstance(data, Host):
-            return data in self.hosts
+            return data.client_ID in self._state.hosts
         else:
             return False
 
+    def __len__(self):
+        return len(self._state.hosts)
+
     def update_open_connections(self, newData: Host) -> Host:
-        for h in self.hosts:
-            if (newData == h):
-                # Update connections
-                h.session_infos['NumOpenPrivateConnections'] = newData.session_infos['NumOpenPrivateConnections']
-                h.session_infos['NumOpenPublicConnections'] = newData.session_infos['NumOpenPublicConnections']
+        return self.set_open_connections(newData.client_ID,
+                                         newData.get_session_info('NumOpenPrivateConnections'),
+                                         newData.get_session_info('NumOpenPublicConnections'))
+
+    def set_open_connections(self, client_ID: str, open_private: Any, open_public: Any) -> Optional[Host]:
+        """Update open slots of host *client_ID*. None if host is unknown.
+           Unchanged slots keep the registry version (cached lists stay valid).
+        """
+        with self._lock:
+            state = self._state
+            entry = state.hosts.get(client_ID, None)
+            if entry is None:
+                return None
+            sequence, h = entry
+
+            # An update proves the host is alive
+            if self._leases is not None:
+                self._leases.schedule(client_ID, self.lease_ttl)
+            if (h.get_session_info('NumOpenPrivateConnections') == open_private and
+                    h.get_session_info('NumOpenPublicConnections') == open_public):
                 return h
 
-        return None
+            # Update connections of a copy, readers may hold the published host
+            updated = h.copy()
+            updated.add_session_info('NumOpenPrivateConnections', open_private)
+            updated.add_session_info('NumOpenPublicConnections', open_public)
+            hosts = state.hosts.set(client_ID, (sequence, updated))
+            indexes = self._reindex(state.indexes, client_ID, self._index_keys(h), self._index_keys(updated))
+            self._publish(DataManager.UPDATED, updated, hosts, indexes)
+            return updated
+
+    def _publish(self, kind: str, host: Host, hosts: SnapshotMap, indexes: Dict[str, SnapshotMap]) -> None:
+        """Replace current snapshot then tell listeners (writer lock held)."""
+        state = RegistrySnapshot(self._state.version + 1, hosts, indexes)
+        self._changelog.append((state.version, kind, host.client_ID))
+        self._state = state
+        for callback in self._listeners:
+            callback(kind, host)
+
+    def _remove_host(self, client_ID: str) -> Optional[Host]:
+        """Remove host *client_ID*, return it (None if unknown). Writer lock held."""
+        state = self._state
+        host = state.get(client_ID)
+        if host is None:
+            return None
+        hosts = state.hosts.delete(client_ID)
+        indexes = self._unindex(state.indexes, client_ID, self._index_keys(host))
+        if self._leases is not None:
+            self._leases.cancel(client_ID)
+        token = self._tokenOf.pop(client_ID, None)
+        if token is not None:
+            del self._statusTokens[token]
+        self._publish(DataManager.REMOVED, host, hosts, indexes)
+        return host
+
+    def _remove_many(self, hosts: List[Host]) -> int:
+        count = 0
+        for h in hosts:
+            count += self.remove_host_by_ID(h.client_ID)
+        return count
+
+    @staticmethod
+    def _index_keys(host: Host):
+        """Values used to index *host* in each secondary index."""
+        openSlots = host.get_session_info('NumOpenPublicConnections')
+        return (host.hostName,
+                host.ipAddress,
+                host.get_session_info('SessionId'),
+                host.get_session_info('BuildUniqueId'),
+                host.get_session_info('bAllowJoinInProgress'),
+                # Same predicate as a query filter {'gt': 0} (see _candidates)
+                HostQuery.compare('gt', openSlots, 0))
+
+    @staticmethod
+    def _index(indexes: Dict[str, SnapshotMap], client_ID: str, keys,
+               names=_INDEXES) -> Dict[str, SnapshotMap]:
+        """Copy of *indexes* where *client_ID* is indexed under *keys* (one per index of *names*)."""
+        indexes = dict(indexes)
+        for name, value in zip(names, keys):
+            if value is None:
+                continue
+            index = indexes[name]
+            try:
+                bucket = index.get(value, _NO_BUCKET)
+            except TypeError:
+                # Unhashable value sent by client, cannot be indexed
+                continue
+            indexes[name] = index.set(value, bucket.set(client_ID, True))
+        return indexes
+
+    @staticmethod
+    def _unindex(indexes: Dict[str, SnapshotMap], client_ID: str, keys,
+                 names=_INDEXES) -> Dict[str, SnapshotMap]:
+        """Copy of *indexes* where *client_ID* is no more indexed under *keys*."""
+        indexes = dict(indexes)
+        for name, value in zip(names, keys):
+            index = indexes[name]
+            try:
+                bucket = index.get(value, None)
+            except TypeError:
+                continue
+            if bucket is None:
+                continue
+            bucket = bucket.delete(client_ID)
+            # Do not keep empty buckets around
+            indexes[name] = index.set(value, bucket) if bucket else index.delete(value)
+        return indexes
+
+    @staticmethod
+    def _reindex(indexes: Dict[str, SnapshotMap], client_ID: str, old, new) -> Dict[str, SnapshotMap]:
+        """Copy of *indexes* moving *client_ID* from *old* keys to *new* ones, only
+           indexes whose key changed are copied (buckets hold client_IDs, not hosts).
+        """
+        changed = [i for i, (a, b) in enumerate(zip(old, new)) if a != b or type(a) is not type(b)]
+        if not changed:
+            return indexes
+        names = [DataManager._INDEXES[i] for i in changed]
+        indexes = DataManager._unindex(indexes, client_ID, [old[i] for i in changed], names)
+        return DataManager._index(indexes, client_ID, [new[i] for i in changed], names)
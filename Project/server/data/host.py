@@ -1,34 +1,62 @@
 # Project/server/host.py
 
+import sys
+
 from Project.tools.misc import classproperty
 
 
+# Marks a session key never set
+_UNSET = object()
+
+
+def _intern(value):
+    """Share one copy of strings repeated between hosts (`user_infos` only)."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
 class Host(object):
 
-    """All information you always wanted about your host."""
-
-    _SESSION_KEYS = {
-        'OwningUserName',
-        'OwningUserId',
-        'BuildUniqueId',
-        'NumOpenPrivateConnections',
-        'NumPrivateConnections',
-        'NumOpenPublicConnections',
-        'NumPublicConnections',
-        'bAllowJoinInProgress',
-        'bIsLANMatch',  # @TODO should be removed because LAN should not connect to server
-        'SessionId',
-        'HostAddr'      # **PRIVATE** IP with port unlike self.ipAddress
+    """All information you always wanted about your host.
+
+       Known session keys are stored in fixed slots (no per instance dict),
+       `user_infos` keys and string values are interned and their number is
+       capped by `MAX_USER_INFOS`.
+    """
+
+    # Expected type of each session key (value kept as is if not convertible)
+    _SESSION_TYPES = {
+        'OwningUserName': str,
+        'OwningUserId': str,
+        'BuildUniqueId': int,
+        'NumOpenPrivateConnections': int,
+        'NumPrivateConnections': int,
+        'NumOpenPublicConnections': int,
+        'NumPublicConnections': int,
+        'bAllowJoinInProgress': bool,
+        'bIsLANMatch': bool,  # @TODO should be removed because LAN should not connect to server
+        'SessionId': str,
+        'HostAddr': str       # **PRIVATE** IP with port unlike self.ipAddress
     }
 
+    _SESSION_KEYS = set(_SESSION_TYPES)
+
+    # Maximal number of additional data per host
+    MAX_USER_INFOS = 32
+
+    __slots__ = (('ipAddress', 'unrealName', 'hostName', 'client_ID', '_user_infos') +
+                 tuple(_SESSION_TYPES))
+
     def __init__(self, ip_address, unreal_name, host_name, client_ID):
         """All information you always wanted about your host."""
         super().__init__()
 
-        # Aditional data
-        self.user_infos = {}
+        # Aditional data (created on first use)
+        self._user_infos = None
         # Minimal required data
-        self.session_infos = {}
+        for key in Host._SESSION_TYPES:
+            setattr(self, key, _UNSET)
 
         # Ip retrieved from socket on python side
         # Should be **PUBLIC** IP when server will be online
@@ -42,32 +70,78 @@ class Host(object):
     def AvailableKeys(cls):
         return cls._SESSION_KEYS
 
+    @property
+    def session_infos(self) -> dict:
+        """Session keys set for this host (copy)."""
+        infos = {}
+        for key in Host._SESSION_TYPES:
+            value = getattr(self, key)
+            if value is not _UNSET:
+                infos[key] = value
+        return infos
+
+    @property
+    def user_infos(self) -> dict:
+        """Additional data (copy, use `func::add_user_info` to change it)."""
+        return dict(self._user_infos) if self._user_infos else {}
+
     def add_session_info(self, key: str, value: str) -> bool:
         # Filter keys
         if key not in Host._SESSION_KEYS:
             return False
 
-        self.session_infos[key] = value
+        setattr(self, key, Host._coerce(key, value))
         return True
 
     def add_user_info(self, key: str, value: str) -> bool:
-        self.user_infos[key] = value
+        if self._user_infos is None:
+            self._user_infos = {}
+        elif key not in self._user_infos and len(self._user_infos) >= Host.MAX_USER_INFOS:
+            return False
+        self._user_infos[_intern(key)] = _intern(value)
         return True
 
+    def get_session_info(self, key: str, default=None):
+        value = getattr(self, key, _UNSET) if key in Host._SESSION_KEYS else _UNSET
+        return default if value is _UNSET else value
+
+    @staticmethod
+    def _coerce(key: str, value):
+        expected = Host._SESSION_TYPES[key]
+        if isinstance(value, expected):
+            return value
+        try:
+            if expected is int and isinstance(value, str):
+                return int(value)
+            elif expected is bool and isinstance(value, int):
+                return bool(value)
+        except ValueError:
+            pass
+        return value
+
+    def copy(self) -> 'Host':
+        """Independent copy, change it instead of a host already published."""
+        other = Host.__new__(Host)
+        for key in Host.__slots__:
+            setattr(other, key, getattr(self, key))
+        other._user_infos = dict(self._user_infos) if self._user_infos else None
+        return other
+
     def to_dict(self):
-        _dict = {}
-        for k, v in self.__dict__.items():
-            if v is not None:
-                if k in ('session_infos'):
-                    for k_2, v_2 in v.items():
-                        _dict[k_2] = v_2
-                else:
-                    _dict[k] = v
+        _dict = {'user_infos': self.user_infos}
+        for key in Host._SESSION_TYPES:
+            value = getattr(self, key)
+            if value is not _UNSET:
+                _dict[key] = value
+        for key in ('ipAddress', 'unrealName', 'hostName', 'client_ID'):
+            value = getattr(self, key)
+            if value is not None:
+                _dict[key] = value
         return _dict
 
     @classmethod
     def from_dict(cls, hostMap: dict, clientID: str):
-        defaultKeys = ('ipAddress', 'unrealName', 'hostName')
+        defaultKeys = ('ipAddress', 'unrealName', 'hostName', 'client_ID')
         newHost = cls(hostMap['ipAddress'],
                       hostMap['unrealName'],
                       hostMap['hostName'], clientID)
@@ -76,12 +150,12 @@ class Host(object):
             if (k in defaultKeys):
                 continue
             elif (k in cls._SESSION_KEYS):
-                newHost.session_infos[k] = v
+                newHost.add_session_info(k, v)
             elif (k == 'user_infos'):
                 for k2, v2 in v.items():
-                    newHost.user_infos[k2] = v2
+                    newHost.add_user_info(k2, v2)
             else:
-                newHost.user_infos[k] = v
+                newHost.add_user_info(k, v)
         return newHost
 
     def __str__(self):
@@ -92,7 +166,7 @@ class Host(object):
 
     def __eq__(self, other):
         if isinstance(other, Host):
-            return self.self.client_ID == other.self.client_ID
+            return self.client_ID == other.client_ID
         return False
 
     def IsSameData(self, other):
@@ -107,11 +181,11 @@ class Host(object):
 
 
 if __name__ == '__main__':
-    test = Host('miaous', 'souris', 'truite')
+    test = Host('miaous', 'souris', 'truite', 'sid')
     test.add_user_info('chocolat', 'oups')
     test.add_session_info('OwningUserName', 'yep')
     print(test)
 
-    test2 = Host.from_dict(test.to_dict())
+    test2 = Host.from_dict(test.to_dict(), 'sid')
     print(test2)
     print('Can construct from flat dict: ', test.IsSameData(test2))
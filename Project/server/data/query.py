@@ -0,0 +1,174 @@
+# Project/server/data/query.py
+
+import math
+
+from Project.server.data import Host
+
+# Type checking
+from typing import Any, Dict, List, Tuple
+
+
+class HostQuery(object):
+
+    """Filters, sort, pagination and projection asked by a client.
+
+       Built from the query form of OnAskHosts:
+
+           {'filters': {'BuildUniqueId': 42,
+                        'NumOpenPublicConnections': {'gt': 0}},
+            'sort': 'NumOpenPublicConnections', 'descending': True,
+            'limit': 20, 'cursor': None,
+            'fields': ['SessionId', 'hostName', 'NumOpenPublicConnections']}
+
+       Filters only apply to `Host._SESSION_KEYS`. A filter value is either
+       a plain value (equality) or a dict {operator: value}. The cursor is
+       opaque to clients: send back the one returned with previous page.
+    """
+
+    OPERATORS = {
+        'eq': lambda a, b: a == b,
+        'ne': lambda a, b: a != b,
+        'gt': lambda a, b: a > b,
+        'gte': lambda a, b: a >= b,
+        'lt': lambda a, b: a < b,
+        'lte': lambda a, b: a <= b,
+        'in': lambda a, b: a in b,
+    }
+
+    SORT_KEYS = Host._SESSION_KEYS | {'hostName', 'unrealName'}
+
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
+
+    def __init__(self, filters: Dict[str, Dict[str, Any]] = None, sort: str = None,
+                 descending: bool = False, limit: int = DEFAULT_LIMIT,
+                 cursor: Tuple = None, fields: List[str] = None):
+        """Use `func::from_dict` for data coming from a client (validation)."""
+        super().__init__()
+
+        # field -> operator -> value
+        self.filters = filters if filters else {}
+        self.sort = sort
+        self.descending = descending
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+
+        # Identify queries sharing the same result set (see DataManager.query_hosts)
+        self.key = (tuple(sorted((f, op, _freeze(v))
+                                 for f, ops in self.filters.items()
+                                 for op, v in ops.items())),
+                    self.sort)
+
+    @classmethod
+    def from_dict(cls, msg: dict) -> 'HostQuery':
+        """Build a query from a client message. Raise ValueError if malformed."""
+        if not isinstance(msg, dict):
+            raise ValueError('Query must be an object')
+
+        rawFilters = msg.get('filters', None)
+        if rawFilters is not None and not isinstance(rawFilters, dict):
+            raise ValueError('Filters must be an object')
+        filters = {}
+        for field, condition in (rawFilters or {}).items():
+            if field not in Host._SESSION_KEYS:
+                raise ValueError('Cannot filter on {0}'.format(field))
+            if not isinstance(condition, dict):
+                condition = {'eq': condition}
+            for op, value in condition.items():
+                if op not in cls.OPERATORS:
+                    raise ValueError('Unknown operator {0}'.format(op))
+                if op == 'in' and not isinstance(value, list):
+                    raise ValueError('Operator in expects a list')
+            filters[field] = condition
+
+        sort = msg.get('sort', None)
+        if sort is not None and (not isinstance(sort, str) or sort not in cls.SORT_KEYS):
+            raise ValueError('Cannot sort on {0}'.format(sort))
+
+        limit = msg.get('limit', cls.DEFAULT_LIMIT)
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit <= 0:
+            raise ValueError('Limit must be a positive integer')
+        limit = min(limit, cls.MAX_LIMIT)
+
+        descending = msg.get('descending', False)
+        if not isinstance(descending, bool):
+            raise ValueError('Descending must be a boolean')
+
+        cursor = msg.get('cursor', None)
+        if cursor is not None:
+            cursor = cls._parse_cursor(cursor)
+
+        fields = msg.get('fields', None)
+        if fields is not None:
+            if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+                raise ValueError('Fields must be a list of names')
+
+        return cls(filters, sort, descending, limit, cursor, fields)
+
+    @staticmethod
+    def _parse_cursor(cursor: Any) -> Tuple:
+        if (not isinstance(cursor, list) or len(cursor) != 3 or
+                not isinstance(cursor[2], str)):
+            raise ValueError('Invalid cursor')
+        rank, value = cursor[0], cursor[1]
+        if ((rank == 0 and isinstance(value, (int, float)) and _finite(value)) or
+                (rank == 1 and isinstance(value, str)) or
+                (rank == 2 and value == '')):
+            return (rank, value, cursor[2])
+        raise ValueError('Invalid cursor')
+
+    def matches(self, host: Host) -> bool:
+        """Check *host* against every filter."""
+        for field, condition in self.filters.items():
+            value = host.get_session_info(field)
+            for op, expected in condition.items():
+                if not HostQuery.compare(op, value, expected):
+                    return False
+        return True
+
+    @staticmethod
+    def compare(op: str, value: Any, expected: Any) -> bool:
+        """*value* *op* *expected*, False when not comparable (missing / wrong type).
+           Indexes serving a filter use it too (see DataManager._index_keys).
+        """
+        try:
+            return bool(HostQuery.OPERATORS[op](value, expected))
+        except TypeError:
+            return False
+
+    def sort_key(self, host: Host) -> Tuple:
+        """Total order used for pages (client_ID breaks ties)."""
+        if self.sort is None:
+            return (2, '', host.client_ID)
+        elif self.sort in ('hostName', 'unrealName'):
+            value = getattr(host, self.sort)
+        else:
+            value = host.get_session_info(self.sort)
+        # Never compare values of different types (nor NaN, never ordered)
+        if isinstance(value, (int, float)) and _finite(value):
+            return (0, value, host.client_ID)
+        elif isinstance(value, str):
+            return (1, value, host.client_ID)
+        return (2, '', host.client_ID)
+
+    def project(self, host: Host) -> dict:
+        """Host as dict reduced to requested fields."""
+        data = host.to_dict()
+        if self.fields is None:
+            return data
+        return {k: data[k] for k in self.fields if k in data}
+
+
+def _finite(value: Any) -> bool:
+    """False for NaN and infinite floats (ints of any size are finite)."""
+    return not isinstance(value, float) or math.isfinite(value)
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable version of a filter value."""
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    elif isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return (type(value).__name__, value)
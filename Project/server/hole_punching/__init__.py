@@ -1,3 +1,5 @@
 # Project/server/hole_punching/__init__.py
 
-from .destruck_server import DestruckUDPServer
+from .destruck_server import DestruckUDPServer, AsyncDestruckUDPServer
+
+from .workers import UDPWorkerSupervisor
@@ -0,0 +1,239 @@
+# Project/server/hole_punching/async_server.py
+
+"""
+    asyncio UDP server.
+      - One thread running an event loop, datagrams handled as they arrive
+      - Replies written through the non-blocking datagram transport
+"""
+
+
+import asyncio
+import inspect
+import socket
+import threading
+
+# Static typing checking
+from typing import Any, Set, Tuple
+
+from Project.server.hole_punching.server import RendezVousServerUDP
+from Project.server.hole_punching.outbound import OutboundQueue
+
+
+__all__ = ['AsyncRendezVousServerUDP']
+
+
+class _TransportSocket(object):
+
+    """Socket like facade of a datagram transport used by handlers.
+
+       Handlers written for `RendezVousServerUDP` only call `sendto` and
+       `getsockname`, both are mapped to the transport.
+    """
+
+    def __init__(self, transport: asyncio.DatagramTransport, sock: socket.socket):
+        self._transport = transport
+        self._sockname = sock.getsockname()
+
+    def sendto(self, data: bytes, addr: Tuple[str, int]) -> int:
+        # Never blocks, buffered by the transport if kernel buffer is full
+        self._transport.sendto(data, addr)
+        return len(data)
+
+    def getsockname(self) -> Tuple[str, int]:
+        return self._sockname
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class _RendezVousProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, server: 'AsyncRendezVousServerUDP'):
+        super().__init__()
+        self._server = server
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self._server._dispatch(data, addr)
+        # Transport reads one datagram per loop iteration, drain what is
+        # already queued to save a selector round trip per datagram
+        self._server._drain()
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors (peer unreachable) are reported here, server keeps going
+        self._server._logger.warning('Datagram error --> %s', exc)
+
+
+class AsyncRendezVousServerUDP(RendezVousServerUDP):
+
+    """
+        asyncio UDP server with the same interface as `RendezVousServerUDP`.
+          - An event loop runs on its own thread (start / stop are thread safe)
+          - `_handle_client` may be a plain method or a coroutine
+          - Stop cancels pending handlers, no self addressed datagram needed
+          - Queued messages (see `func::send`) are flushed by the loop, no
+            data thread
+
+        Subclasses of `RendezVousServerUDP` run unchanged when mixed with it:
+
+            class AsyncServer(MyServer, AsyncRendezVousServerUDP):
+                pass
+    """
+
+    # Maximal number of datagrams read at once (see `func::_drain`)
+    DRAIN_BATCH = 64
+
+    def __init__(self, encoding: str = 'utf-8', **kwargs):
+        """
+            Init server socket and data encoding used.
+            Other arguments are given to `RendezVousServerUDP`.
+        """
+        super().__init__(encoding=encoding, **kwargs)
+
+        self._loop = None           # type: Any
+        self._loopThread = None     # type: Any
+        self._transport = None      # type: Any
+        self._rawSock = self._sock
+        # Coroutine handlers still running
+        self._tasks = set()         # type: Set[asyncio.Task]
+        # A flush of queued messages is already scheduled
+        self._flushScheduled = False
+        # Coroutine handlers run after the receive buffer is reused, give them a copy
+        self._copyData = inspect.iscoroutinefunction(self._handle_client)
+
+    def start(self, host: str, port: int) -> bool:
+        """Start UDP server on its own event loop thread."""
+        try:
+            self._port = port
+            self._host = host
+            self._bind()
+        except socket.error as err:
+            self._rawSock.close()
+            self._logger.fatal('Start failed due to (code {0}) --> {1}'.format(err.args[0], str(err)), exc_info=True)
+            self._logger.debug('Socket now closed (port {0}).'.format(self._port))
+            return False
+
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._loopThread = threading.Thread(target=self._run_loop, args=(ready,),
+                                            name='UDP-Loop', daemon=True)
+        self._loopThread.start()
+        ready.wait()
+        return self._running
+
+    def stop(self) -> bool:
+        """Stop UDP server, pending handlers are cancelled."""
+        if not self._running:
+            self._logger.info('Rendez-vous server is not running')
+            return False
+        self._running = False
+        self._container.close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loopThread.join()
+        self._reset()
+        self._logger.debug('Server socket now closed (port {0}).'.format(self._port))
+        return True
+
+    def _run_loop(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._transport, _ = self._loop.run_until_complete(
+                self._loop.create_datagram_endpoint(lambda: _RendezVousProtocol(self),
+                                                    sock=self._rawSock))
+        except OSError as err:
+            self._logger.fatal('Event loop failed due to --> {0}'.format(str(err)), exc_info=True)
+            self._rawSock.close()
+            self._loop.close()
+            ready.set()
+            return
+
+        # Handlers using self._sock now write through the transport
+        self._sock = _TransportSocket(self._transport, self._rawSock)
+        self._running = True
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._shutdown()
+
+    def _shutdown(self) -> None:
+        """Cancel coroutine handlers still running then close transport and loop."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._transport.close()
+        # Let transport close callbacks run
+        self._loop.run_until_complete(asyncio.sleep(0))
+        self._loop.close()
+
+    def send(self, msg: Any, addr: Tuple[str, int], priority: int = OutboundQueue.BULK) -> bool:
+        """Queue *msg* to be sent to *addr* from the server port (thread safe).
+           Return False if dropped because the queue is full.
+        """
+        if not self._container.put(msg, addr, priority):
+            return False
+        if not self._flushScheduled and self._running:
+            self._flushScheduled = True
+            self._loop.call_soon_threadsafe(self._flush_outbound)
+        return True
+
+    def _flush_outbound(self) -> None:
+        """Send queued messages, most important first."""
+        self._flushScheduled = False
+        while True:
+            batch = self._container.get_batch(RendezVousServerUDP.SEND_BATCH, timeout=0)
+            if not batch:
+                return
+            for msg, addr in batch:
+                self._send_msg(self._sock, msg, addr)
+
+    def _drain(self) -> None:
+        """Handle datagrams already waiting in the socket buffer."""
+        recvfrom_into = self._rawSock.recvfrom_into
+        buffer = self._recvBuffer
+        view = self._recvView
+        for _ in range(AsyncRendezVousServerUDP.DRAIN_BATCH):
+            if not self._running:
+                return
+            try:
+                nbytes, addr = recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as err:
+                self._logger.warning('Datagram error --> %s', err)
+                return
+            self._dispatch(view[:nbytes], addr)
+
+    def _dispatch(self, data: Any, addr: Tuple[str, int]) -> None:
+        """Handle one datagram (bytes or memoryview) on the loop thread."""
+        # Over its rate, nothing decoded nor answered
+        if self._limiter is not None and not self._limiter.allow(addr):
+            return
+        if self._copyData and isinstance(data, memoryview):
+            data = data.tobytes()
+        try:
+            result = self._handle_client(self._sock, addr, data)
+        except Exception:
+            self._handler_failed(addr)
+            return
+
+        # Coroutine handler, run it concurrently with next datagrams
+        if result is not None and inspect.isawaitable(result):
+            task = self._loop.create_task(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.handler_errors += 1
+            if self._errorLog.sample():
+                self._logger.error('Handler failed', exc_info=task.exception())
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._loop = None
+        self._loopThread = None
+        self._transport = None
+        self._sock = self._rawSock
@@ -1,104 +1,515 @@
 # Project/destruck_server.py
 
+from Project.server import metrics
+from Project.tools.logger import get_sampler
 from Project.server.hole_punching.server import RendezVousServerUDP
+from Project.server.hole_punching.outbound import OutboundQueue
+from Project.server.hole_punching.async_server import AsyncRendezVousServerUDP
+from Project.server.hole_punching.endpoint_store import LocalEndpointStore
+from Project.server.hole_punching import wire, nat
+from Project.server.hole_punching.nat import NatClassifier, ProbeListener
+from Project.server.hole_punching.relay import UDPRelay
+from Project.server.hole_punching.rate_limit import SourceRateLimiter
+from Project.server.hole_punching.fstring import LENGTH, FStringTemplate, encode_fstring, json_string
 
+import copy
 import socket
+import struct
 import logging
 import json
 import time
 
+from collections import OrderedDict
+
 # Static typing checking
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Optional, Sequence, Callable
+
+
+# Datagrams received by type, children bound once for the hot path
+_messages = metrics.counter('udp_messages_total', 'Rendezvous datagrams received by type', ('type',))
+_REGISTER = _messages.labels('register')
+_JOIN = _messages.labels('join')
+_STRING = _messages.labels('string')
+_MALFORMED = _messages.labels('malformed')
+_UNKNOWN = _messages.labels('unknown')
+_PROBE = _messages.labels('probe')
+_STATUS = _messages.labels('status')
+# Datagrams dropped without reply, malformed ones by first failed check,
+# 'spoofed' for a Register of a session owned by another address
+_rejected = metrics.counter('udp_rejected_total', 'Rejected rendezvous datagrams by reason', ('reason',))
+_REJECTED = {reason: _rejected.labels(reason)
+             for reason in ('size', 'first_byte', 'fstring', 'json', 'fields', 'binary', 'spoofed')}
+# Joins by outcome: both sides introduced, or host endpoint unknown
+_joins = metrics.counter('udp_joins_total', 'Rendezvous joins by outcome', ('result',))
+_INTRODUCED = _joins.labels('introduced')
+_UNREGISTERED = _joins.labels('unregistered')
+# Relay requests by outcome: allocated, refused (no relay, unknown host or
+# caps reached), unauthorized (peer not introduced) or rate limited
+_relays = metrics.counter('udp_relay_requests_total', 'Relay session requests by outcome', ('result',))
+_RELAY_ALLOCATED = _relays.labels('allocated')
+_RELAY_REFUSED = _relays.labels('refused')
+_RELAY_UNAUTHORIZED = _relays.labels('unauthorized')
+_RELAY_LIMITED = _relays.labels('limited')
+# Host status datagrams by outcome
+_statuses = metrics.counter('udp_host_status_total', 'Host status datagrams by outcome', ('result',))
+_STATUS_UPDATED = _statuses.labels('updated')
+_STATUS_UNKNOWN = _statuses.labels('unknown')
 
 
 class DestruckUDPServer(RendezVousServerUDP):
 
     # Byte size used to store FString (Unreal)
     INT32_SIZE = 4
+    # Largest datagram handled, rendezvous messages are a few hundred bytes
+    MAX_MSG_SIZE = 1024
+    FSTRING_LENGTH = LENGTH
     ORIGIN_SERVER = 'UDPServer'
     ORIGIN_CLIENT = 'Client'
     ORIGIN_HOST = 'Host'
 
+    # Replies encoded once (same keys order as former json.dumps of dicts)
+    REGISTER_REPLY = FStringTemplate('{"IP": "%b", "Port": %d, "Origin": "' + ORIGIN_SERVER +
+                                     '", "Request": "Register", "Binary": ' + str(wire.VERSION) + '}')
+    JOIN_REPLY = FStringTemplate('{"Request": "Join", "IP": "%b", "Port": %d, "HostIP": %b, '
+                                 '"HostPort": %d, "Origin": "' + ORIGIN_SERVER + '"}')
+    INTRODUCE = FStringTemplate('{"Request": "Introduce", "PeerIP": "%b", "PeerPort": %d, "Origin": "' +
+                                ORIGIN_SERVER + '"}')
+    PROBE_REPLY = FStringTemplate('{"Request": "Probe", "IP": "%b", "Port": %d, "Index": %d, "Nat": "%b", '
+                                  '"Origin": "' + ORIGIN_SERVER + '"}')
+    # Other side NAT classified (see nat), ports: [first, last] or null
+    JOIN_REPLY_NAT = FStringTemplate('{"Request": "Join", "IP": "%b", "Port": %d, "HostIP": %b, '
+                                     '"HostPort": %d, "HostNat": "%b", "HostPorts": %b, "Origin": "' +
+                                     ORIGIN_SERVER + '"}')
+    # Sent to both peers, Token is null when no relay session is available
+    RELAY_REPLY = FStringTemplate('{"Request": "Relay", "Token": "%b", "RelayPort": %d, "Origin": "' +
+                                  ORIGIN_SERVER + '"}')
+    RELAY_REFUSED = encode_fstring('{"Request": "Relay", "Token": null, "RelayPort": 0, "Origin": "' +
+                                   ORIGIN_SERVER + '"}')
+    # Seconds a peer introduced by a Join may ask for a relay session of
+    # that host, at most MAX_INTRODUCTIONS remembered (oldest forgotten)
+    INTRODUCTION_TTL = 60.0
+    MAX_INTRODUCTIONS = 16384
+    # Relay requests per second from one source IP (bursts of RELAY_BURST)
+    RELAY_RATE = 0.5
+    RELAY_BURST = 4.0
+
+    INTRODUCE_NAT = FStringTemplate('{"Request": "Introduce", "PeerIP": "%b", "PeerPort": %d, '
+                                    '"PeerNat": "%b", "PeerPorts": %b, "Origin": "' + ORIGIN_SERVER + '"}')
+
     """Concrete implementation of a Rendezvous server to handle
        UDP hole punching for Unreal game Destruction.
     """
 
-    def __init__(self, encoding: str = 'utf-8'):
+    def __init__(self, encoding: str = 'utf-8', store=None, probe_ports: Sequence[int] = (),
+                 relay: Optional[UDPRelay] = None,
+                 host_status: Optional[Callable[[bytes, int, int], Any]] = None,
+                 host_lookup: Optional[Callable[[str], Any]] = None, **kwargs):
         """
             Init server socket and data encoding used.
+            *store* keeps public endpoint of registered hosts (see
+            endpoint_store). *probe_ports* are extra ports answering NAT
+            probes (see nat). *relay* forwards traffic of peers which cannot
+            punch (started and stopped with the server), given to peers
+            introduced to the host by a Join only. *host_status(token,
+            open private, open public)* applies STATUS datagrams to the hosts
+            registry, falsy result when token is unknown (e.g.
+            `DataManager.update_host_status`). *host_lookup(SessionId)*
+            gives the registry host advertising a session, None if unknown
+            (e.g. `DataManager.get_host_by_session`): only its address may
+            register the session endpoint. Other arguments are given to
+            `RendezVousServerUDP`.
         """
-        super().__init__(encoding=encoding)
+        super().__init__(encoding=encoding, **kwargs)
+
+        # Store public endpoint of a specific host (SessionId -> (ip, port))
+        self.unreal_hosts = store if store is not None else LocalEndpointStore()
+
+        # NAT classification, rendezvous port is probe index 0
+        self.probe_ports = tuple(probe_ports)
+        self.nat = NatClassifier(ports=1 + len(self.probe_ports))
+        self._probes = None         # type: Optional[ProbeListener]
+        self.relay = relay
+        self._hostStatus = host_status
+        self._hostLookup = host_lookup
+        # Relay sessions are only given to peers introduced to the host:
+        # (SessionId, peer endpoint) -> expiry (monotonic)
+        self._introduced = OrderedDict()    # type: OrderedDict[Tuple[str, Tuple[str, int]], float]
+        self._relayLimiter = SourceRateLimiter(DestruckUDPServer.RELAY_RATE, DestruckUDPServer.RELAY_BURST, 4096)
+
+        self._rejectLog = get_sampler(self._logger, 'udp.reject', logging.DEBUG)
+
+        # Answer of raw string messages never changes
+        self._receivedReply = encode_fstring(json.dumps({'Msg': 'Message received !',
+                                                         'Origin': DestruckUDPServer.ORIGIN_SERVER}),
+                                             encoding)
+
+    def start(self, host: str, port: int) -> bool:
+        """Start UDP server then probe ports, server keeps running without probes if they fail."""
+        if not super().start(host, port):
+            return False
+        if self.probe_ports:
+            # Probe thread gets its own limiter, limiters are not thread safe
+            limiter = copy.deepcopy(self._limiter)
+            self._probes = ProbeListener(self._handle_probe_datagram,
+                                         limiter.allow if limiter is not None else None)
+            try:
+                self._probes.start(host, self.probe_ports)
+            except OSError as err:
+                self._logger.error('Probe ports %s unavailable, NAT classification disabled --> %s',
+                                   self.probe_ports, err)
+                self._probes = None
+        if self.relay is not None:
+            try:
+                self.relay.start(host)
+            except OSError as err:
+                self._logger.error('Relay port %d unavailable, relay disabled --> %s', self.relay.port, err)
+                self.relay = None
+        return True
 
-        # Store informations about a specific host
-        self.unreal_hosts = {}
+    def stop(self) -> bool:
+        if self._probes is not None:
+            self._probes.stop()
+            self._probes = None
+        if self.relay is not None:
+            self.relay.stop()
+        return super().stop()
 
-    def _handle_client(self, sock: socket.socket, addr: Tuple[str, int], data: bytes):
-        self._logger.info('Receive data from {0}:{1}.'.format(addr[0], str(addr[1])))
+    def _handle_client(self, sock: socket.socket, addr: Tuple[str, int], data: Any):
+        if self._recvLog.sample():
+            self._recvLog.emit('Receive data from %s:%s.', addr[0], addr[1])
+        # Cheap checks first, junk is dropped before any decoding
+        size = len(data)
+        if size <= DestruckUDPServer.INT32_SIZE or size > DestruckUDPServer.MAX_MSG_SIZE:
+            self._reject('size', addr)
+            return
+        first = data[0]
+        # Bytes or memoryview on the receive buffer, slices below never copy
+        view = memoryview(data)
+
+        # Binary messages start with wire.MAGIC, FString ones with the high
+        # byte of their (small) length
+        if first == wire.MAGIC:
+            self._handle_binary_msg(sock, addr, view)
+            return
+        if first != 0:
+            self._reject('first_byte', addr)
+            return
 
         # Assume data comes from Unreal game instance where strings are length prefixed
-        msg = data[DestruckUDPServer.INT32_SIZE:].decode(self._encoding)
-        self._logger.debug('Receive message :: {0}.'.format(msg))
+        msg = self._read_fstring(view)
+        if msg is None:
+            self._reject('fstring', addr)
+            return
+        self._logger.debug('Receive message :: %s.', msg)
 
         # Accept JSON or raw string
         if msg[0] == '{':
-            self._handle_json_msg(sock, addr, json.loads(msg))
+            try:
+                payload = json.loads(msg)
+            except (ValueError, RecursionError):
+                self._reject('json', addr)
+                return
+            self._handle_json_msg(sock, addr, payload)
         else:
             self._handle_string_msg(sock, addr, msg)
 
+    def _reject(self, reason: str, addr: Tuple[str, int]) -> None:
+        """Count a malformed datagram, no reply nor traceback."""
+        _MALFORMED.inc()
+        _REJECTED[reason].inc()
+        if self._rejectLog.sample():
+            self._rejectLog.emit('Rejected datagram from %s:%s (%s).', addr[0], addr[1], reason)
+
+    def _read_fstring(self, view: memoryview) -> Optional[str]:
+        """
+            Decode a FString datagram: int32 length then exactly that many
+            bytes, a trailing NUL (counted by Unreal) is dropped. Only the
+            payload is decoded. Return None if malformed or empty.
+        """
+        end = len(view)
+        if end <= DestruckUDPServer.INT32_SIZE:
+            return None
+        if DestruckUDPServer.FSTRING_LENGTH.unpack_from(view)[0] != end - DestruckUDPServer.INT32_SIZE:
+            return None
+        if view[end - 1] == 0:
+            end -= 1
+        try:
+            msg = str(view[DestruckUDPServer.INT32_SIZE:end], self._encoding)
+        except UnicodeDecodeError:
+            return None
+        return msg or None
+
     def _handle_string_msg(self, sock: socket.socket, addr: Tuple[str, int], msg: str):
+        _STRING.inc()
         # Send a JSON because Unreal client only understand JSON format
-        msg_dict = {}
-        msg_dict['Msg'] = 'Message received !'
-        msg_dict['Origin'] = DestruckUDPServer.ORIGIN_SERVER
-        self._send_msg(self._sock, msg_dict, addr)
+        self._reply(sock, self._receivedReply, addr, OutboundQueue.BULK)
 
     def _handle_json_msg(self, sock: socket.socket, addr: Tuple[str, int], msg: Dict):
-        if msg['Origin'] == DestruckUDPServer.ORIGIN_CLIENT:
+        if msg.get('Request', None) == 'Probe':
+            # Sent by hosts and clients alike
+            self._handle_probe(sock, addr, msg.get('ProbeId', None), 0, False)
+        elif msg.get('Origin', None) == DestruckUDPServer.ORIGIN_CLIENT:
             # Message from Unreal client
             self._handle_unrealClient(sock, addr, msg)
-        elif msg['Origin'] == DestruckUDPServer.ORIGIN_HOST:
+        elif msg.get('Origin', None) == DestruckUDPServer.ORIGIN_HOST:
             # Message from Unreal host
             self._handle_unrealHost(sock, addr, msg)
+        else:
+            _UNKNOWN.inc()
 
     def _handle_unrealHost(self, sock: socket.socket, addr: Tuple[str, int], json_data: Dict):
         # Only do something if request is correctly defined
         if (json_data.get('Request', None) == 'Register'):
-            # Send back public informations back to Host
-            msg = {}
-            msg['IP'] = addr[0]
-            msg['Port'] = addr[1]
-            msg['Origin'] = DestruckUDPServer.ORIGIN_SERVER
-            msg['Request'] = 'Register'
-            self._send_msg(self._sock, msg, addr)
+            _REGISTER.inc()
+            # Remember host public entrypoint (shared with other workers)
+            sessionID = json_data.get('SessionId', None)
+            if isinstance(sessionID, str):
+                if not self._may_register(sessionID, addr):
+                    self._reject('spoofed', addr)
+                    return
+                self.unreal_hosts.set(sessionID, addr)
+
+            # Send back public informations back to Host, advertise the
+            # binary format (see wire)
+            msg = DestruckUDPServer.REGISTER_REPLY.render(addr[0].encode('ascii'), addr[1])
+            self._reply(sock, msg, addr)
+        else:
+            _UNKNOWN.inc()
         # @Unreal --> Update public entrypoint and sent it to TCP server
 
     def _handle_unrealClient(self, sock: socket.socket, addr: Tuple[str, int], json_data: Dict):
         # Only do something if request is correctly defined
         if (json_data.get('Request', None) == 'Join'):
+            _JOIN.inc()
+            # Public endpoint seen when the host registered its session
+            sessionID = json_data.get('SessionId', None)
+            hostAddr = self.unreal_hosts.get(sessionID) if isinstance(sessionID, str) else None
+            if hostAddr is not None:
+                _INTRODUCED.inc()
+                hostIP, hostPort = hostAddr
+                # Introduce peer to the host right away, both sides punch at once
+                peerNat = self._nat_json(addr)
+                if peerNat is None:
+                    msg = DestruckUDPServer.INTRODUCE.render(addr[0].encode('ascii'), addr[1])
+                else:
+                    msg = DestruckUDPServer.INTRODUCE_NAT.render(addr[0].encode('ascii'), addr[1], *peerNat)
+                self._reply(sock, msg, hostAddr)
+                self._remember_introduction(sessionID, addr)
+            else:
+                _UNREGISTERED.inc()
+                # Host unknown here, echo endpoint given by the client
+                hostIP = json_data.get('HostIP', None)
+                hostPort = json_data.get('HostPort', None)
+                if hostIP is None or hostPort is None:
+                    self._reject('fields', addr)
+                    return
+
             # Send public entrypoint back to sender
-            msg = {}
-            msg['Request'] = 'Join'
-            msg['IP'] = addr[0]
-            msg['Port'] = addr[1]
-            msg['HostIP'] = json_data['HostIP']
-            msg['HostPort'] = json_data['HostPort']
-            msg['Origin'] = DestruckUDPServer.ORIGIN_SERVER
+            if isinstance(hostIP, str) and type(hostPort) is int:
+                hostNat = self._nat_json((hostIP, hostPort))
+                if hostNat is None:
+                    msg = DestruckUDPServer.JOIN_REPLY.render(addr[0].encode('ascii'), addr[1],
+                                                              json_string(hostIP), hostPort)
+                else:
+                    msg = DestruckUDPServer.JOIN_REPLY_NAT.render(addr[0].encode('ascii'), addr[1],
+                                                                  json_string(hostIP), hostPort, *hostNat)
+            else:
+                # Unexpected types, echo them as they are
+                msg = {}
+                msg['Request'] = 'Join'
+                msg['IP'] = addr[0]
+                msg['Port'] = addr[1]
+                msg['HostIP'] = hostIP
+                msg['HostPort'] = hostPort
+                msg['Origin'] = DestruckUDPServer.ORIGIN_SERVER
+            self._reply(sock, msg, addr)
+        elif (json_data.get('Request', None) == 'Relay'):
+            # Punching failed, forward through the relay
+            sessionID = json_data.get('SessionId', None)
+            result = self._allocate_relay(sessionID, addr) if isinstance(sessionID, str) else None
+            if result is None:
+                self._reply(sock, DestruckUDPServer.RELAY_REFUSED, addr)
+                return
+            token, hostAddr = result
+            msg = DestruckUDPServer.RELAY_REPLY.render(token.hex().encode('ascii'), self.relay.port)
+            self._reply(sock, msg, hostAddr)
+            self._reply(sock, msg, addr)
+        else:
+            _UNKNOWN.inc()
+
+    def _handle_binary_msg(self, sock: socket.socket, addr: Tuple[str, int], data: memoryview):
+        """Binary messages (see wire), replies use the same format."""
+        msgType = wire.message_type(data)
+        try:
+            if msgType == wire.REGISTER:
+                _REGISTER.inc()
+                sessionID = wire.decode_register(data)
+                if sessionID:
+                    if not self._may_register(sessionID, addr):
+                        self._reject('spoofed', addr)
+                        return
+                    self.unreal_hosts.set(sessionID, addr)
+                self._reply(sock, wire.encode_register_reply(addr), addr)
+            elif msgType == wire.JOIN:
+                _JOIN.inc()
+                hostIP, hostPort, sessionID = wire.decode_join(data)
+                hostAddr = self.unreal_hosts.get(sessionID) if sessionID else None
+                if hostAddr is not None:
+                    _INTRODUCED.inc()
+                    # Same build on both sides, the host speaks binary too
+                    self._reply(sock, wire.encode_introduce(addr) + self._nat_trailer(addr), hostAddr)
+                    self._remember_introduction(sessionID, addr)
+                    hostIP, hostPort = socket.inet_aton(hostAddr[0]), hostAddr[1]
+                else:
+                    _UNREGISTERED.inc()
+                    hostAddr = (socket.inet_ntoa(hostIP), hostPort)
+                self._reply(sock, wire.encode_join_reply(addr, hostIP, hostPort) + self._nat_trailer(hostAddr),
+                            addr)
+            elif msgType == wire.PROBE:
+                self._handle_probe(sock, addr, wire.decode_probe(data), 0, True)
+            elif msgType == wire.RELAY:
+                result = self._allocate_relay(wire.decode_relay(data), addr)
+                if result is None:
+                    self._reply(sock, wire.encode_relay_reply(bytes(wire.RELAY_TOKEN_SIZE), 0), addr)
+                else:
+                    msg = wire.encode_relay_reply(result[0], self.relay.port)
+                    self._reply(sock, msg, result[1])
+                    self._reply(sock, msg, addr)
+            elif msgType == wire.STATUS and self._hostStatus is not None:
+                _STATUS.inc()
+                token, openPrivate, openPublic = wire.decode_status(data)
+                if self._hostStatus(token, openPrivate, openPublic):
+                    _STATUS_UPDATED.inc()
+                    state = wire.STATUS_UPDATED
+                else:
+                    _STATUS_UNKNOWN.inc()
+                    state = wire.STATUS_UNKNOWN
+                self._reply(sock, wire.encode_status_reply(state), addr, OutboundQueue.BULK)
+            else:
+                _UNKNOWN.inc()
+                self._logger.debug('Unsupported binary message from %s:%s.', *addr)
+        except (struct.error, OSError):
+            # Truncated message or non IPv4 peer
+            self._reject('binary', addr)
+
+    def _handle_probe_datagram(self, sock: socket.socket, addr: Tuple[str, int], data: memoryview,
+                               index: int) -> None:
+        """Datagram received on probe port *index* (see ProbeListener), only probes are answered."""
+        if wire.is_binary(data):
+            try:
+                if wire.message_type(data) == wire.PROBE:
+                    self._handle_probe(sock, addr, wire.decode_probe(data), index, True)
+                    return
+            except struct.error:
+                pass
+        else:
+            msg = self._read_fstring(data)
+            if msg is not None and msg[0] == '{':
+                try:
+                    probe = json.loads(msg)
+                except ValueError:
+                    probe = None
+                if isinstance(probe, dict) and probe.get('Request', None) == 'Probe':
+                    self._handle_probe(sock, addr, probe.get('ProbeId', None), index, False)
+                    return
+        self._reject('fields', addr)
+
+    def _handle_probe(self, sock: socket.socket, addr: Tuple[str, int], probe_id: Any, index: int,
+                      binary: bool) -> None:
+        """Record public endpoint of a probe and send it back with NAT kind known so far."""
+        _PROBE.inc()
+        if not isinstance(probe_id, str) or not probe_id:
+            self._reject('fields', addr)
+            return
+        info = self.nat.observe(addr, probe_id, index)
+        if binary:
+            msg = wire.encode_probe_reply(addr, index, nat.KINDS.index(info.kind))
+        else:
+            msg = DestruckUDPServer.PROBE_REPLY.render(addr[0].encode('ascii'), addr[1], index,
+                                                       info.kind.encode('ascii'))
+        self._reply(sock, msg, addr)
+
+    def _may_register(self, session_id: str, addr: Tuple[str, int]) -> bool:
+        """Whether *addr* may set the endpoint of *session_id*: only from the
+           IP of the registry host advertising it, else from the IP which
+           registered it first (port may change, NAT rebinding). Joins and
+           relay sessions go to that endpoint, SessionIds are public.
+        """
+        if self._hostLookup is not None:
+            host = self._hostLookup(session_id)
+            if host is not None:
+                return host.ipAddress == addr[0]
+        current = self.unreal_hosts.get(session_id)
+        return current is None or current[0] == addr[0]
+
+    def _remember_introduction(self, session_id: str, addr: Tuple[str, int]) -> None:
+        """Peer *addr* was introduced to the host of *session_id*, it may ask for a relay."""
+        if self.relay is None:
+            return
+        key = (session_id, addr)
+        self._introduced[key] = time.monotonic() + DestruckUDPServer.INTRODUCTION_TTL
+        self._introduced.move_to_end(key)
+        if len(self._introduced) > DestruckUDPServer.MAX_INTRODUCTIONS:
+            self._introduced.popitem(last=False)
+
+    def _allocate_relay(self, session_id: str, addr: Tuple[str, int]) -> Optional[Tuple[bytes, Tuple[str, int]]]:
+        """Relay session for peer *addr* joining *session_id*: (token, host endpoint).
+           None without relay, over the relay request rate of *addr*, when
+           *addr* was not introduced to the host by a Join (one session per
+           introduction), unknown host or relay caps reached.
+        """
+        if self.relay is None or not session_id:
+            _RELAY_REFUSED.inc()
+            return None
+        if not self._relayLimiter.allow(addr):
+            _RELAY_LIMITED.inc()
+            return None
+        key = (session_id, addr)
+        expiry = self._introduced.get(key, None)
+        if expiry is None or expiry < time.monotonic():
+            _RELAY_UNAUTHORIZED.inc()
+            return None
+        hostAddr = self.unreal_hosts.get(session_id)
+        token = self.relay.allocate(session_id, addr[0], hostAddr[0]) if hostAddr is not None else None
+        if token is None:
+            _RELAY_REFUSED.inc()
+            return None
+        del self._introduced[key]
+        _RELAY_ALLOCATED.inc()
+        return token, hostAddr
+
+    def _nat_json(self, addr: Tuple[str, int]) -> Optional[Tuple[bytes, bytes]]:
+        """NAT kind and predicted ports of *addr* for JSON templates (None if unknown)."""
+        if not self.probe_ports:
+            return None
+        prediction = self.nat.predict(addr)
+        if prediction is None:
+            return None
+        kind, first, last = prediction
+        return kind.encode('ascii'), (b'[%d, %d]' % (first, last) if first else b'null')
+
+    def _nat_trailer(self, addr: Tuple[str, int]) -> bytes:
+        """Binary NAT trailer of *addr* (empty if unknown)."""
+        if not self.probe_ports:
+            return b''
+        prediction = self.nat.predict(addr)
+        if prediction is None:
+            return b''
+        kind, first, last = prediction
+        return wire.encode_nat(nat.KINDS.index(kind), first, last)
+
+    def _reply(self, sock: socket.socket, msg: Any, addr: Tuple[str, int],
+               priority: int = OutboundQueue.CONTROL) -> None:
+        """Answer from the port *sock* received on. Server port replies are
+           queued (see `func::send`): rendezvous replies as CONTROL, ahead of
+           BULK ones (string echoes, host status). Probe ports answer at once.
+        """
+        if sock is self._sock:
+            self.send(msg, addr, priority)
+        else:
             self._send_msg(sock, msg, addr)
-            # @TODO Unreal side --> Hole punch through Host entrypoint
-
-            # Server will not receive it that way
-            # # Send peer public informations to Unreal host
-            # msg = {}
-            # msg['PeerIP'] = addr[0]
-            # msg['PeerPort'] = addr[1]
-            # msg['Origin'] = DestruckUDPServer.ORIGIN_SERVER
-            # host_addr = (json_data['HostIP'], json_data['HostPort'])
-            # # @TODO Unreal side --> Hole punch through Peer entrypoint
-            # self._send_msg(sock, msg, host_addr)
 
     def _send_msg(self, sock: socket.socket, msg: Any, addr: Tuple[str, int]) -> None:
-        template1 = 'Send message :: {0}.'
-        template2 = 'Send message to {0}:{1} using interface {2}:{3}.'
         if (isinstance(msg, str)):
             msg_bytes = self.serialized_str(msg)
         elif (isinstance(msg, dict)):
@@ -108,9 +519,11 @@ class DestruckUDPServer(RendezVousServerUDP):
 
         # Send it !
         sock.sendto(msg_bytes, addr)
-        self._logger.debug(template1.format(msg))
-        self._logger.info(template2.format(addr[0], addr[1],
-                                           *sock.getsockname()))
+        self._logger.debug('Send message :: %s.', msg)
+        # getsockname is a system call, only made when the line is written
+        if self._sendLog.sample():
+            self._sendLog.emit('Send message to %s:%s using interface %s:%s.',
+                               addr[0], addr[1], *sock.getsockname())
 
     def serialized_str(self, msg: str) -> bytes:
         """
@@ -118,11 +531,12 @@ class DestruckUDPServer(RendezVousServerUDP):
             form (length prefixed).
         """
         # String in Unreal are length prefixed
-        msg_string = msg.encode(self._encoding)
-        msg_bytes = len(msg_string).to_bytes(DestruckUDPServer.INT32_SIZE,
-                                             byteorder='big')
-        msg_bytes += msg_string
-        return msg_bytes
+        return encode_fstring(msg, self._encoding)
+
+
+class AsyncDestruckUDPServer(DestruckUDPServer, AsyncRendezVousServerUDP):
+
+    """`DestruckUDPServer` running on the asyncio engine."""
 
 
 if __name__ == '__main__':
@@ -0,0 +1,221 @@
+# Project/server/hole_punching/endpoint_store.py
+
+"""
+    Public endpoints of registered hosts, shared by rendezvous workers.
+      - LocalEndpointStore: in process LRU (single server)
+      - FileEndpointStore: SQLite file shared by worker processes
+
+    Both are bounded to *max_entries* endpoints, least recently registered
+    (or looked up, in process) ones are forgotten first.
+"""
+
+
+import logging
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+
+# Static typing checking
+from typing import Dict, Optional, Tuple
+
+from Project.server import LOG
+
+
+__all__ = ['LocalEndpointStore', 'FileEndpointStore']
+
+
+Endpoint = Tuple[str, int]
+
+
+class LocalEndpointStore(object):
+
+    """Endpoints kept in memory, only visible to the current process."""
+
+    def __init__(self, max_entries: int = 65536):
+        super().__init__()
+        self.max_entries = max_entries
+        self._endpoints = OrderedDict()     # type: OrderedDict[str, Endpoint]
+        self.evicted = 0
+
+    def set(self, key: str, endpoint: Endpoint) -> None:
+        self._endpoints[key] = (endpoint[0], endpoint[1])
+        self._endpoints.move_to_end(key)
+        if len(self._endpoints) > self.max_entries:
+            self._endpoints.popitem(last=False)
+            self.evicted += 1
+
+    def get(self, key: str) -> Optional[Endpoint]:
+        endpoint = self._endpoints.get(key, None)
+        if endpoint is not None:
+            self._endpoints.move_to_end(key)
+        return endpoint
+
+    def delete(self, key: str) -> bool:
+        return self._endpoints.pop(key, None) is not None
+
+    def __len__(self):
+        return len(self._endpoints)
+
+
+class FileEndpointStore(object):
+
+    """Endpoints kept in a SQLite file so every worker process sees them.
+
+       Stand-in for a networked store: each process opens its own
+       connections on *path*, WAL journal lets readers and a writer work
+       concurrently. Writes never wait for the file: they are buffered
+       (visible to the process at once) and written by a background thread
+       every *flush_interval* seconds in one transaction, other workers see
+       them after that. Lookups failing on a busy file answer None (host
+       unknown) instead of blocking the receive path. Rows beyond
+       *max_entries* (oldest registration first) are pruned every
+       PRUNE_EVERY written endpoints of a process.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, timeout: float = 0.05, max_entries: int = 65536,
+                 flush_interval: float = 0.02):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._timeout = timeout
+        self._logger = logging.getLogger(LOG + '.EndpointStore')
+        # Reader connection (receive path), writer one is owned by _flushLock holder
+        self._lock = threading.Lock()
+        self._conn = None       # type: Optional[sqlite3.Connection]
+        self._flushLock = threading.Lock()
+        self._writerConn = None     # type: Optional[sqlite3.Connection]
+        # key -> (ip, port, updated) not written yet, and being written
+        self._pending = dict()      # type: Dict[str, Tuple[str, int, float]]
+        self._flushing = dict()     # type: Dict[str, Tuple[str, int, float]]
+        self._pendingLock = threading.Lock()
+        self._writes = 0
+        self._stopEvent = threading.Event()
+        self._writerThread = None   # type: Optional[threading.Thread]
+        self.write_errors = 0
+
+    def _open(self, timeout: float) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('CREATE TABLE IF NOT EXISTS endpoints ('
+                     'key TEXT PRIMARY KEY, ip TEXT, port INTEGER, updated REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS endpoints_updated ON endpoints (updated)')
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily so the store can be given to a worker process
+        if self._conn is None:
+            self._conn = self._open(self._timeout)
+        return self._conn
+
+    def set(self, key: str, endpoint: Endpoint) -> None:
+        with self._pendingLock:
+            self._pending[key] = (endpoint[0], endpoint[1], time.time())
+            if self._writerThread is None:
+                # Started by the process using the store (threads do not cross processes)
+                self._writerThread = threading.Thread(target=self._writer_loop,
+                                                      name='EndpointStore-Writer', daemon=True)
+                self._writerThread.start()
+
+    def get(self, key: str) -> Optional[Endpoint]:
+        pending = self._pending.get(key, None) or self._flushing.get(key, None)
+        if pending is not None:
+            return (pending[0], pending[1])
+        try:
+            with self._lock:
+                row = self._connection().execute('SELECT ip, port FROM endpoints WHERE key = ?',
+                                                 (key,)).fetchone()
+        except sqlite3.Error:
+            # Busy file, do not hold the datagram any longer
+            return None
+        return (row[0], row[1]) if row else None
+
+    def delete(self, key: str) -> bool:
+        with self._pendingLock:
+            pending = self._pending.pop(key, None) is not None
+        self.flush()
+        with self._flushLock:
+            cursor = self._writer().execute('DELETE FROM endpoints WHERE key = ?', (key,))
+        return pending or cursor.rowcount > 0
+
+    def flush(self) -> int:
+        """Write buffered endpoints now. Return number written (kept for next flush on error)."""
+        with self._flushLock:
+            with self._pendingLock:
+                if not self._pending:
+                    return 0
+                pending, self._pending = self._pending, dict()
+                self._flushing = pending
+            rows = [(key, ip, port, updated) for key, (ip, port, updated) in pending.items()]
+            try:
+                conn = self._writer()
+                conn.execute('BEGIN')
+                try:
+                    conn.executemany('INSERT OR REPLACE INTO endpoints VALUES (?, ?, ?, ?)', rows)
+                    previous, self._writes = self._writes, self._writes + len(rows)
+                    if previous // FileEndpointStore.PRUNE_EVERY != self._writes // FileEndpointStore.PRUNE_EVERY:
+                        conn.execute('DELETE FROM endpoints WHERE updated <= (SELECT updated FROM endpoints '
+                                     'ORDER BY updated DESC LIMIT 1 OFFSET ?)', (self.max_entries,))
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            except sqlite3.Error:
+                self.write_errors += 1
+                with self._pendingLock:
+                    # Retry with next flush, unless registered again meanwhile
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                raise
+            finally:
+                self._flushing = dict()
+            return len(rows)
+
+    def _writer(self) -> sqlite3.Connection:
+        # Writes may wait for the file, they are off the receive path
+        if self._writerConn is None:
+            self._writerConn = self._open(max(self._timeout, 1.0))
+        return self._writerConn
+
+    def _writer_loop(self) -> None:
+        """Flush buffered endpoints every flush_interval. Should run on a separated thread."""
+        while not self._stopEvent.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                self._logger.warning('Endpoints not written to %s, retrying', self.path, exc_info=True)
+
+    def close(self) -> None:
+        self._stopEvent.set()
+        if self._writerThread is not None:
+            self._writerThread.join()
+        try:
+            self.flush()
+        except sqlite3.Error:
+            self._logger.error('Endpoints lost on close of %s', self.path, exc_info=True)
+        with self._flushLock:
+            if self._writerConn is not None:
+                self._writerConn.close()
+                self._writerConn = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self):
+        self.flush()
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM endpoints').fetchone()[0]
+
+    def __getstate__(self):
+        # Connections and threads cannot cross processes, reopen on first use
+        return {'path': self.path, 'timeout': self._timeout, 'max_entries': self.max_entries,
+                'flush_interval': self.flush_interval}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['timeout'], state['max_entries'], state['flush_interval'])
@@ -0,0 +1,52 @@
+# Project/server/hole_punching/fstring.py
+
+"""
+    Unreal FString serialization: big endian int32 byte length then payload.
+      - encode_fstring: one off messages
+      - FStringTemplate: replies with a fixed layout, body encoded once
+"""
+
+
+import struct
+
+from json.encoder import encode_basestring_ascii
+
+
+__all__ = ['LENGTH', 'encode_fstring', 'json_string', 'FStringTemplate']
+
+
+LENGTH = struct.Struct('!I')
+
+
+def encode_fstring(msg: str, encoding: str = 'utf-8') -> bytes:
+    """Length prefixed bytes of *msg*."""
+    body = msg.encode(encoding)
+    return LENGTH.pack(len(body)) + body
+
+
+def json_string(value: str) -> bytes:
+    """Quoted and escaped JSON string of an untrusted *value* (ASCII only)."""
+    return encode_basestring_ascii(value).encode('ascii')
+
+
+class FStringTemplate(object):
+
+    """
+        FString whose body is a bytes %-format (%b, %d placeholders) encoded
+        once. Values given to `func::render` are not escaped, untrusted
+        strings must go through `func::json_string`.
+
+        The template keeps a slot for the length prefix: a render formats
+        the whole datagram at once then writes its length in place.
+    """
+
+    __slots__ = ('_template',)
+
+    def __init__(self, template: str, encoding: str = 'utf-8'):
+        super().__init__()
+        self._template = bytearray(LENGTH.size) + template.encode(encoding)
+
+    def render(self, *args) -> bytearray:
+        data = self._template % args
+        LENGTH.pack_into(data, 0, len(data) - LENGTH.size)
+        return data
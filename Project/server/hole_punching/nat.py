@@ -0,0 +1,247 @@
+# Project/server/hole_punching/nat.py
+
+"""
+    NAT behaviour classification from rendezvous probes.
+
+    A peer sends a Probe with the same ProbeId, from the same local socket,
+    to the rendezvous port and to each probe port. The public port seen by
+    each server port tells how its NAT maps a new destination:
+      - CONE: same public port whatever the destination (hole punching works)
+      - SYMMETRIC: new public port per destination, allocated with a constant
+        delta (next port can be predicted)
+      - RANDOM: new public port per destination, no pattern (punching is
+        hopeless, use a relay)
+
+    Classifications are cached per public IP.
+"""
+
+
+import logging
+import selectors
+import socket
+import threading
+import time
+
+from collections import namedtuple, OrderedDict
+
+# Static typing checking
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from Project.server import LOG
+from Project.tools.logger import get_sampler
+
+
+__all__ = ['UNKNOWN', 'CONE', 'SYMMETRIC', 'RANDOM', 'KINDS', 'NatInfo', 'NatClassifier', 'ProbeListener']
+
+
+UNKNOWN = 'unknown'
+CONE = 'cone'
+SYMMETRIC = 'symmetric'
+RANDOM = 'random'
+# Position gives the binary code (see wire)
+KINDS = (UNKNOWN, CONE, SYMMETRIC, RANDOM)
+
+# *delta*: public port increment between two destinations (SYMMETRIC only)
+NatInfo = namedtuple('NatInfo', 'kind, delta')
+
+
+def classify(ports: Sequence[int]) -> NatInfo:
+    """NAT behaviour from public *ports* seen by successive server ports."""
+    if len(ports) < 2:
+        return NatInfo(UNKNOWN, 0)
+    deltas = [b - a for a, b in zip(ports, ports[1:])]
+    if not any(deltas):
+        return NatInfo(CONE, 0)
+    if all(d == deltas[0] for d in deltas) and deltas[0] != 0:
+        return NatInfo(SYMMETRIC, deltas[0])
+    return NatInfo(RANDOM, 0)
+
+
+class NatClassifier(object):
+
+    """
+        Record probes and keep NAT classification of public IPs.
+          - Probes are grouped by (IP, ProbeId), at most *max_entries*
+            groups waiting (LRU)
+          - Classification of an IP is cached *ttl* seconds, at most
+            *max_entries* IPs (LRU)
+          - Predicted ranges of a SYMMETRIC NAT span *window* allocations
+            (other flows of the network take ports meanwhile)
+
+        Thread safe (rendezvous and probe ports are read by different threads).
+    """
+
+    def __init__(self, ports: int = 3, ttl: float = 600.0, max_entries: int = 65536, window: int = 16,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.ports = ports
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.window = window
+        self._clock = clock
+
+        # (ip, probe ID) -> {server port index: public port}
+        self._probes = OrderedDict()        # type: OrderedDict[Tuple[str, str], Dict[int, int]]
+        # ip -> (NatInfo, classification time)
+        self._cache = OrderedDict()         # type: OrderedDict[str, Tuple[NatInfo, float]]
+        self._lock = threading.Lock()
+
+    def observe(self, addr: Tuple[str, int], probe_id: str, index: int) -> NatInfo:
+        """Record public *addr* of probe *probe_id* received on server port *index*.
+           Return classification known so far (UNKNOWN until two ports answered).
+        """
+        key = (addr[0], probe_id)
+        with self._lock:
+            seen = self._probes.get(key, None)
+            if seen is None:
+                seen = self._probes[key] = dict()
+                if len(self._probes) > self.max_entries:
+                    self._probes.popitem(last=False)
+            else:
+                self._probes.move_to_end(key)
+            seen[index] = addr[1]
+            if len(seen) < 2:
+                cached = self._cache.get(addr[0], None)
+                return cached[0] if cached is not None else NatInfo(UNKNOWN, 0)
+
+            info = classify([seen[i] for i in sorted(seen)])
+            if len(seen) >= self.ports:
+                # Complete, drop the group
+                del self._probes[key]
+            self._cache[addr[0]] = (info, self._clock())
+            self._cache.move_to_end(addr[0])
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            return info
+
+    def get(self, ip: str) -> Optional[NatInfo]:
+        """Cached classification of *ip* (None if unknown or too old)."""
+        with self._lock:
+            cached = self._cache.get(ip, None)
+            if cached is None:
+                return None
+            if self._clock() - cached[1] > self.ttl:
+                del self._cache[ip]
+                return None
+            return cached[0]
+
+    def predict(self, addr: Tuple[str, int]) -> Optional[Tuple[str, int, int]]:
+        """(kind, first port, last port) a peer at *addr* may use toward a new
+           destination. None if its NAT is not classified. Ports are 0 when
+           unpredictable (RANDOM).
+        """
+        info = self.get(addr[0])
+        if info is None or info.kind == UNKNOWN:
+            return None
+        if info.kind == CONE:
+            return CONE, addr[1], addr[1]
+        if info.kind == RANDOM:
+            return RANDOM, 0, 0
+        ends = [addr[1] + info.delta, addr[1] + info.delta * self.window]
+        return SYMMETRIC, max(1, min(ends)), min(65535, max(ends))
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class ProbeListener(object):
+
+    """
+        Extra rendezvous ports, only used by NAT probes.
+
+        One thread reads every probe socket, *handler(sock, addr, data, index)*
+        is called for each datagram (*index* 1 for the first probe port, the
+        rendezvous port being 0). *data* is a memoryview only valid until
+        the handler returns, replies must go through *sock*.
+    """
+
+    RECV_SIZE = 2048
+
+    def __init__(self, handler: Callable[[Any, Tuple[str, int], memoryview, int], None],
+                 allow: Optional[Callable[[Tuple[str, int]], bool]] = None):
+        super().__init__()
+        self._handler = handler
+        self._allow = allow
+        self._logger = logging.getLogger(LOG + '.' + 'UDPProbes')
+        # Traceback of failing probes, sampled (see Project.tools.logger.configure_sampling)
+        self._errorLog = get_sampler(self._logger, 'udp.probe_error', logging.ERROR)
+        # Datagrams whose handler raised
+        self.handler_errors = 0
+        self._selector = None       # type: Any
+        self._sockets = []          # type: List[socket.socket]
+        self._thread = None         # type: Any
+        self._running = False
+        self._wakeup = None         # type: Any
+
+    @property
+    def ports(self) -> List[int]:
+        return [s.getsockname()[1] for s in self._sockets]
+
+    def start(self, host: str, ports: Sequence[int]) -> None:
+        """Bind *ports* (0 for any free port) and start reading them."""
+        self._selector = selectors.DefaultSelector()
+        try:
+            for index, port in enumerate(ports, start=1):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+                self._sockets.append(sock)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind((host, port))
+                sock.setblocking(False)
+                self._selector.register(sock, selectors.EVENT_READ, index)
+        except OSError:
+            self._close()
+            raise
+        # Wakes up the selector on stop
+        self._wakeup = socket.socketpair()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ, 0)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._receive_loop, name='Probes', daemon=True)
+        self._thread.start()
+        self._logger.debug('Probe ports %s', self.ports)
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup[1].send(b'\0')
+        self._thread.join()
+        self._close()
+
+    def _close(self) -> None:
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+        if self._wakeup is not None:
+            for sock in self._wakeup:
+                sock.close()
+            self._wakeup = None
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+
+    def _receive_loop(self) -> None:
+        buffer = bytearray(ProbeListener.RECV_SIZE)
+        view = memoryview(buffer)
+        while self._running:
+            for key, _ in self._selector.select():
+                if key.data == 0:
+                    continue
+                sock = key.fileobj
+                while True:
+                    try:
+                        nbytes, addr = sock.recvfrom_into(buffer)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError as err:
+                        self._logger.warning('Probe datagram error --> %s', err)
+                        break
+                    if self._allow is not None and not self._allow(addr):
+                        continue
+                    try:
+                        self._handler(sock, addr, view[:nbytes], key.data)
+                    except Exception:
+                        # One bad probe must never stop the listener
+                        self.handler_errors += 1
+                        if self._errorLog.sample():
+                            self._logger.error('Probe handler failed for %s:%s', addr[0], addr[1], exc_info=True)
@@ -0,0 +1,117 @@
+# Project/server/hole_punching/outbound.py
+
+"""
+    Bounded priority queue of datagrams waiting to be sent.
+"""
+
+
+import threading
+
+from collections import deque
+
+# Static typing checking
+from typing import Any, Dict, List, Tuple
+
+
+__all__ = ['OutboundQueue']
+
+
+class OutboundQueue(object):
+
+    """
+        Bounded, thread safe, priority queue of (message, address).
+          - Lower priority value is sent first (CONTROL before BULK)
+          - Consumers block until messages are available and take many at once
+          - When full, `policy` decides what is dropped:
+              * DROP_NEW: refuse the new message
+              * SHED: drop the oldest message of the lowest priority class,
+                      only if it is not more important than the new one
+    """
+
+    CONTROL = 0
+    BULK = 1
+    PRIORITIES = (CONTROL, BULK)
+
+    DROP_NEW = 'drop_new'
+    SHED = 'shed'
+
+    def __init__(self, maxsize: int = 4096, policy: str = DROP_NEW):
+        super().__init__()
+        if policy not in (OutboundQueue.DROP_NEW, OutboundQueue.SHED):
+            raise ValueError('Unknown overflow policy {0}'.format(policy))
+
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self._queues = [deque() for _ in OutboundQueue.PRIORITIES]
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # Counters
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = [0 for _ in OutboundQueue.PRIORITIES]
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def put(self, msg: Any, addr: Tuple[str, int], priority: int = BULK) -> bool:
+        """Queue *msg* for *addr*. Return False if dropped."""
+        with self._cond:
+            if self._closed:
+                self.dropped[priority] += 1
+                return False
+            if self._size >= self.maxsize and not self._shed(priority):
+                self.dropped[priority] += 1
+                return False
+            self._queues[priority].append((msg, addr))
+            self._size += 1
+            self.enqueued += 1
+            self._cond.notify()
+        return True
+
+    def get_batch(self, max_items: int = 64, timeout: float = None) -> List[Tuple[Any, Tuple[str, int]]]:
+        """Block until at least one message is queued then take up to
+           *max_items* of them, most important first. Return an empty list
+           once closed and empty (or on timeout).
+        """
+        with self._cond:
+            if not self._size and not self._closed:
+                self._cond.wait(timeout)
+            batch = []
+            for queue in self._queues:
+                while queue and len(batch) < max_items:
+                    batch.append(queue.popleft())
+            self._size -= len(batch)
+            self.dequeued += len(batch)
+            return batch
+
+    def close(self) -> None:
+        """Wake up consumers, following `func::put` calls are refused."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        result = {'depth': self._size,
+                  'enqueued': self.enqueued,
+                  'dequeued': self.dequeued}
+        for priority, count in zip(OutboundQueue.PRIORITIES, self.dropped):
+            result['dropped_{0}'.format(priority)] = count
+        return result
+
+    def _shed(self, priority: int) -> bool:
+        """Make room for a *priority* message (lock held)."""
+        if self.policy != OutboundQueue.SHED:
+            return False
+        for victim in reversed(OutboundQueue.PRIORITIES):
+            if victim < priority:
+                break
+            if self._queues[victim]:
+                self._queues[victim].popleft()
+                self._size -= 1
+                self.dropped[victim] += 1
+                return True
+        return False
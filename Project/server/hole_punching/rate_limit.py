@@ -0,0 +1,105 @@
+# Project/server/hole_punching/rate_limit.py
+
+"""
+    Admission control of incoming datagrams, checked before any decoding.
+"""
+
+
+import time
+
+from collections import OrderedDict
+
+# Static typing checking
+from typing import Callable, Dict, Tuple
+
+
+__all__ = ['SourceRateLimiter']
+
+
+class SourceRateLimiter(object):
+
+    """
+        Token buckets deciding whether a datagram is handled or dropped.
+          - One bucket per source IP: *rate* datagrams per second, bursts of
+            *burst* datagrams (0 disables, only the global bucket is used)
+          - Buckets table is a LRU bounded to *max_sources* entries, spoofed
+            sources cannot grow memory (an evicted source starts again with
+            a full bucket)
+          - One global bucket: *global_rate* datagrams per second over all
+            sources (0 disables), bursts of one second
+
+        Not thread safe, meant to be called by the receive loop only.
+    """
+
+    def __init__(self, rate: float = 20.0, burst: float = 40.0, max_sources: int = 65536,
+                 global_rate: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        if rate < 0 or burst < 1 or max_sources < 1:
+            raise ValueError('rate must not be negative, burst and max_sources must be positive')
+        if 0 < global_rate < 1:
+            raise ValueError('global_rate must be 0 (disabled) or at least 1')
+
+        self.rate = rate
+        self.burst = burst
+        self.max_sources = max_sources
+        self.global_rate = global_rate
+        self._clock = clock
+
+        # source IP -> [tokens, last refill time]
+        self._buckets = OrderedDict()       # type: OrderedDict[str, list]
+        self._globalTokens = global_rate
+        self._globalTime = clock()
+
+        # Counters
+        self.accepted = 0
+        self.dropped_source = 0
+        self.dropped_global = 0
+        self.evicted = 0
+
+    def allow(self, addr: Tuple[str, int]) -> bool:
+        """Take a token for a datagram from *addr*. False if it must be dropped."""
+        now = self._clock()
+        bucket = None
+        if self.rate > 0:
+            buckets = self._buckets
+            bucket = buckets.get(addr[0], None)
+            if bucket is None:
+                bucket = buckets[addr[0]] = [self.burst, now]
+                if len(buckets) > self.max_sources:
+                    buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                buckets.move_to_end(addr[0])
+                tokens = bucket[0] + (now - bucket[1]) * self.rate
+                bucket[0] = tokens if tokens < self.burst else self.burst
+                bucket[1] = now
+
+            # Source check first, a flooding source does not eat global tokens
+            if bucket[0] < 1.0:
+                self.dropped_source += 1
+                return False
+
+        if self.global_rate > 0:
+            tokens = self._globalTokens + (now - self._globalTime) * self.global_rate
+            self._globalTokens = tokens if tokens < self.global_rate else self.global_rate
+            self._globalTime = now
+            if self._globalTokens < 1.0:
+                self.dropped_global += 1
+                return False
+            self._globalTokens -= 1.0
+
+        if bucket is not None:
+            bucket[0] -= 1.0
+        self.accepted += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Tracked sources and accepted / dropped / evicted counters."""
+        return {'sources': len(self._buckets),
+                'accepted': self.accepted,
+                'dropped_source': self.dropped_source,
+                'dropped_global': self.dropped_global,
+                'evicted': self.evicted}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -0,0 +1,310 @@
+# Project/server/hole_punching/relay.py
+
+"""
+    UDP relay, fallback when hole punching fails (e.g. symmetric NAT on both
+    sides).
+      - The rendezvous server allocates a session per pair of peers and
+        gives both of them its token (see `func::UDPRelay.allocate`),
+        sessions per joining peer IP and per host IP are capped
+      - Each peer binds its public endpoint to the session with a RELAY_BIND
+        datagram (see wire) sent to the relay port
+      - Every other datagram from a bound endpoint is forwarded as is to
+        the other peer: one dict lookup and one sendto per datagram
+      - Sessions idle for *timeout* seconds are reclaimed
+"""
+
+
+import logging
+import secrets
+import selectors
+import socket
+import struct
+import threading
+import time
+
+# Static typing checking
+from typing import Any, Dict, List, Optional, Tuple
+
+from Project.server import LOG
+from Project.server.hole_punching import wire
+from Project.tools.timing_wheel import TimingWheel
+
+
+__all__ = ['RelaySession', 'UDPRelay']
+
+
+Endpoint = Tuple[str, int]
+
+
+class RelaySession(object):
+
+    """Pair of peers relayed to each other, counters per direction (side 0 -> 1, 1 -> 0)."""
+
+    __slots__ = ('token', 'key', 'owners', 'endpoints', 'packets', 'bytes', 'created', 'active')
+
+    def __init__(self, token: bytes, key: Any, now: float,
+                 owners: Tuple[Optional[str], Optional[str]] = (None, None)):
+        self.token = token
+        self.key = key
+        # (source IP, host IP) the session is counted against
+        self.owners = owners
+        self.endpoints = [None, None]       # type: List[Optional[Endpoint]]
+        self.packets = [0, 0]
+        self.bytes = [0, 0]
+        self.created = now
+        self.active = now
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'token': self.token.hex(), 'key': self.key,
+                'endpoints': list(self.endpoints),
+                'packets': list(self.packets), 'bytes': list(self.bytes),
+                'age': time.monotonic() - self.created,
+                'idle': time.monotonic() - self.active}
+
+
+class UDPRelay(object):
+
+    """
+        Relay port forwarding datagrams between the two peers of a session.
+
+        One thread owns the socket and the routing table (no lock per
+        datagram). Datagrams waiting in the socket buffer are read in
+        batches of RECV_BATCH per wake up (Python exposes no recvmmsg).
+        Idle sessions are found with a timing wheel: traffic only stamps
+        the session, the wheel checks it once per *timeout*.
+    """
+
+    RECV_SIZE = 2048
+    RECV_BATCH = 256
+    # Seconds between two reclamation passes
+    TICK = 1.0
+
+    def __init__(self, port: int = 0, timeout: float = 30.0, max_sessions: int = 4096,
+                 max_per_source: int = 4, max_per_host: int = 16):
+        """Relay on *port* (0 for any free port, actual one in `port` once started).
+           At most *max_per_source* sessions per joining peer IP and
+           *max_per_host* per host IP (see `func::allocate`).
+        """
+        super().__init__()
+        self.port = port
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.max_per_source = max_per_source
+        self.max_per_host = max_per_host
+
+        self._logger = logging.getLogger(LOG + '.' + 'UDPRelay')
+        self._sock = None           # type: Any
+        self._selector = None       # type: Any
+        self._wakeup = None         # type: Any
+        self._thread = None         # type: Any
+        self._running = False
+
+        # token -> session (allocated by any thread, dict operations are atomic)
+        self._sessions = dict()     # type: Dict[bytes, RelaySession]
+        # Bound endpoint -> (session, side), relay thread only
+        self._routes = dict()       # type: Dict[Endpoint, Tuple[RelaySession, int]]
+        self._wheel = TimingWheel(UDPRelay.TICK, 64)
+        self._allocLock = threading.Lock()
+        # IP -> sessions allocated for it (under _allocLock)
+        self._perSource = dict()    # type: Dict[str, int]
+        self._perHost = dict()      # type: Dict[str, int]
+
+        # Counters of reclaimed sessions and dropped datagrams
+        self.allocated = 0
+        self.reclaimed = 0
+        self.dropped = 0
+        self._reclaimedPackets = 0
+        self._reclaimedBytes = 0
+
+    def start(self, host: str) -> None:
+        """Bind relay port on *host* and start forwarding."""
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # Room for bursts while the relay thread waits for the GIL
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            self._sock.bind((host, self.port))
+            self._sock.setblocking(False)
+        except OSError:
+            self._sock.close()
+            raise
+        self.port = self._sock.getsockname()[1]
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._sock, selectors.EVENT_READ, 1)
+        # Wakes up the selector on stop
+        self._wakeup = socket.socketpair()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ, 0)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._receive_loop, name='Relay', daemon=True)
+        self._thread.start()
+        self._logger.info('Relay up on %s:%d', host, self.port)
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup[1].send(b'\0')
+        self._thread.join()
+        self._selector.close()
+        for sock in self._wakeup:
+            sock.close()
+        self._sock.close()
+        self._routes.clear()
+        with self._allocLock:
+            self._sessions.clear()
+            self._perSource.clear()
+            self._perHost.clear()
+
+    def allocate(self, key: Any = None, source: Optional[str] = None,
+                 host: Optional[str] = None) -> Optional[bytes]:
+        """New session (tagged with *key*, e.g. SessionId) asked by peer IP
+           *source* to reach host IP *host*, return its token. None when
+           *max_sessions* are already allocated or *source* / *host* reached
+           their own cap.
+        """
+        with self._allocLock:
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            if source is not None and self._perSource.get(source, 0) >= self.max_per_source:
+                return None
+            if host is not None and self._perHost.get(host, 0) >= self.max_per_host:
+                return None
+            token = secrets.token_bytes(wire.RELAY_TOKEN_SIZE)
+            self._sessions[token] = RelaySession(token, key, time.monotonic(), (source, host))
+            _acquire(self._perSource, source)
+            _acquire(self._perHost, host)
+            self.allocated += 1
+        self._wheel.schedule(token, self.timeout)
+        return token
+
+    def session(self, token: bytes) -> Optional[RelaySession]:
+        return self._sessions.get(token, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Sessions, forwarded packets / bytes (reclaimed sessions included) and drops."""
+        sessions = list(self._sessions.values())
+        return {'sessions': len(sessions),
+                'routes': len(self._routes),
+                'allocated': self.allocated,
+                'reclaimed': self.reclaimed,
+                'dropped': self.dropped,
+                'packets': self._reclaimedPackets + sum(s.packets[0] + s.packets[1] for s in sessions),
+                'bytes': self._reclaimedBytes + sum(s.bytes[0] + s.bytes[1] for s in sessions)}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _receive_loop(self) -> None:
+        recvfrom_into = self._sock.recvfrom_into
+        sendto = self._sock.sendto
+        buffer = bytearray(UDPRelay.RECV_SIZE)
+        view = memoryview(buffer)
+        routes = self._routes
+        select = self._selector.select
+        nextReclaim = time.monotonic() + UDPRelay.TICK
+
+        while self._running:
+            select(UDPRelay.TICK)
+            # One clock read per batch, activity is only compared to timeout
+            now = time.monotonic()
+            for _ in range(UDPRelay.RECV_BATCH):
+                try:
+                    nbytes, addr = recvfrom_into(buffer)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError as err:
+                    # ICMP error of a previous send (peer gone)
+                    self._logger.debug('Relay datagram error --> %s', err)
+                    continue
+
+                route = routes.get(addr, None)
+                if route is None:
+                    self._bind(addr, view[:nbytes], now)
+                    continue
+                session, side = route
+                target = session.endpoints[side ^ 1]
+                if target is None:
+                    # Other peer not bound yet
+                    self.dropped += 1
+                    continue
+                try:
+                    sendto(view[:nbytes], target)
+                except OSError:
+                    self.dropped += 1
+                    continue
+                session.packets[side] += 1
+                session.bytes[side] += nbytes
+                session.active = now
+
+            if now >= nextReclaim:
+                self._reclaim(now)
+                nextReclaim = now + UDPRelay.TICK
+
+    def _bind(self, addr: Endpoint, data: memoryview, now: float) -> None:
+        """Datagram from an unknown endpoint, only a RELAY_BIND is accepted."""
+        try:
+            if not wire.is_binary(data) or wire.message_type(data) != wire.RELAY_BIND:
+                self.dropped += 1
+                return
+            token = wire.decode_relay_bind(data)
+        except struct.error:
+            self.dropped += 1
+            return
+        session = self._sessions.get(token, None)
+        if session is None or None not in session.endpoints:
+            # Unknown, reclaimed or complete session
+            self.dropped += 1
+            if session is None:
+                self._sock.sendto(wire.encode_relay_bind_reply(token, wire.RELAY_UNKNOWN), addr)
+            return
+
+        side = session.endpoints.index(None)
+        session.endpoints[side] = addr
+        session.active = now
+        self._routes[addr] = (session, side)
+        state = wire.RELAY_READY if None not in session.endpoints else wire.RELAY_WAITING
+        self._sock.sendto(wire.encode_relay_bind_reply(token, state), addr)
+        if state == wire.RELAY_READY:
+            # Tell first peer it can start sending
+            self._sock.sendto(wire.encode_relay_bind_reply(token, state), session.endpoints[side ^ 1])
+        self._logger.debug('Relay session %s side %d bound to %s:%s', token.hex(), side, *addr)
+
+    def _reclaim(self, now: float) -> None:
+        """Remove sessions idle for timeout, others go back in the wheel."""
+        for token in self._wheel.advance(now):
+            session = self._sessions.get(token, None)
+            if session is None:
+                continue
+            idle = now - session.active
+            if idle < self.timeout:
+                self._wheel.schedule(token, self.timeout - idle, now)
+                continue
+            for endpoint in session.endpoints:
+                if endpoint is not None:
+                    self._routes.pop(endpoint, None)
+            self._reclaimedPackets += session.packets[0] + session.packets[1]
+            self._reclaimedBytes += session.bytes[0] + session.bytes[1]
+            with self._allocLock:
+                del self._sessions[token]
+                _release(self._perSource, session.owners[0])
+                _release(self._perHost, session.owners[1])
+            self.reclaimed += 1
+            self._logger.info('Relay session %s reclaimed after %.0f s (%d / %d packets, %d / %d bytes)',
+                              token.hex(), now - session.created, session.packets[0], session.packets[1],
+                              session.bytes[0], session.bytes[1])
+
+
+def _acquire(counts: Dict[str, int], owner: Optional[str]) -> None:
+    if owner is not None:
+        counts[owner] = counts.get(owner, 0) + 1
+
+
+def _release(counts: Dict[str, int], owner: Optional[str]) -> None:
+    if owner is None:
+        return
+    if counts[owner] <= 1:
+        del counts[owner]
+    else:
+        counts[owner] -= 1
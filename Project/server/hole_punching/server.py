@@ -14,12 +14,13 @@ import threading
 import pickle
 
 
-from queue import Queue
-
 # Static typing checking
-from typing import Tuple, List, Any
+from typing import Tuple, List, Any, Dict, Optional
 
 from Project.server import LOG
+from Project.tools.logger import get_sampler
+from Project.server.hole_punching.outbound import OutboundQueue
+from Project.server.hole_punching.rate_limit import SourceRateLimiter
 
 
 __all__ = ['RendezVousServerUDP']
@@ -30,12 +31,24 @@ class RendezVousServerUDP(object):
     """
         Multi threaded UDP server.
           - One thread to handle clients reception /response
-          - One thread to send data added to message queue
+          - One thread to send data added to message queue (see `func::send`)
     """
 
-    def __init__(self, encoding: str = 'utf-8'):
+    # Maximal number of queued messages sent per wake up
+    SEND_BATCH = 64
+    # Receive buffer size, larger datagrams are truncated
+    RECV_SIZE = 4096
+
+    def __init__(self, encoding: str = 'utf-8', queue_size: int = 4096,
+                 overflow: str = OutboundQueue.DROP_NEW, reuse_port: bool = False,
+                 limiter: Optional[SourceRateLimiter] = None):
         """
             Init server socket and data encoding used.
+            Messages queued by `func::send` are bounded by *queue_size*,
+            *overflow* is the OutboundQueue policy applied when full.
+            With *reuse_port* many processes can bind the same port, the
+            kernel spreads datagrams between them (SO_REUSEPORT).
+            Datagrams refused by *limiter* are dropped before being handled.
         """
         super().__init__()
 
@@ -44,6 +57,10 @@ class RendezVousServerUDP(object):
 
         # Assign logger
         self._logger = logging.getLogger(LOG + '.' + 'UDP')
+        # Per datagram lines, sampled (see Project.tools.logger.configure_sampling)
+        self._recvLog = get_sampler(self._logger, 'udp.recv')
+        self._sendLog = get_sampler(self._logger, 'udp.send')
+        self._errorLog = get_sampler(self._logger, 'udp.error', logging.ERROR)
         self._nameT = '{0}({2})::{1}'
 
         # Store global data
@@ -57,13 +74,26 @@ class RendezVousServerUDP(object):
         self._sock = socket.socket(self._socketFamily, self._socketType, socket.IPPROTO_UDP)
         # Force reuse of a port
         self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._reusePort = reuse_port
+        if reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise ValueError('SO_REUSEPORT not supported on this platform')
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
 
         # Keep track of thread
         self._receiveThread = None      # type: Any
         self._dataThread = None         # type: Any
 
+        # Receive buffer reused for every datagram (see `func::_receive_loop`)
+        self._recvBuffer = bytearray(RendezVousServerUDP.RECV_SIZE)
+        self._recvView = memoryview(self._recvBuffer)
+        # Admission control, checked before any decoding
+        self._limiter = limiter
+        # Datagrams whose handler raised (see `func::_handler_failed`)
+        self.handler_errors = 0
+
         # Data
-        self._container = Queue()      # type: Queue[Tuple[str, Tuple[str, int]]]
+        self._container = OutboundQueue(queue_size, overflow)
         self.clients = list()          # type: List[Tuple[str, int]]
 
     def start(self, host: str, port: int) -> bool:
@@ -111,23 +141,47 @@ class RendezVousServerUDP(object):
             return True
 
     def _receive_loop(self) -> None:
-        """Wait for incoming messages. Should run on a separated thread."""
+        """
+            Wait for incoming messages. Should run on a separated thread.
+            Datagrams are read into a single preallocated buffer, handlers get
+            a memoryview on it which is only valid until they return.
+        """
+        recvfrom_into = self._sock.recvfrom_into
+        buffer = self._recvBuffer
+        view = self._recvView
+        allow = self._limiter.allow if self._limiter is not None else None
+        self._logger.debug('Waiting for connections.')
         try:
             self._running = True
             while self._running:
-                self._logger.debug('Waiting for connections.')
-                # Wait for message (max size of 4096)
-                msg, addr = self._sock.recvfrom(4096)
+                # Wait for message (max size of RECV_SIZE)
+                nbytes, addr = recvfrom_into(buffer)
+
+                # Over its rate, nothing decoded nor answered
+                if allow is not None and not allow(addr):
+                    continue
 
                 # Handle message only if server still running
                 if self._running:
-                    # Use same socket to respond to new peer
-                    self._handle_client(self._sock, addr, msg)
+                    try:
+                        # Use same socket to respond to new peer
+                        self._handle_client(self._sock, addr, view[:nbytes])
+                    except Exception:
+                        # One bad datagram must never stop the server
+                        self._handler_failed(addr)
         except socket.error as err:
             self._logger.fatal('Receive loop failed due to (code {0}) --> {1}'.format(err.args[0], str(err)), exc_info=True)
 
-    def _handle_client(self, sock: socket.socket, addr: Tuple[str, int], data: bytes):
-        self._logger.info('Receive data from {0}:{1}.'.format(addr[0], str(addr[1])))
+    def _handler_failed(self, addr: Tuple[str, int]) -> None:
+        """Count a datagram whose handler raised, traceback logged when sampled."""
+        self.handler_errors += 1
+        if self._errorLog.sample():
+            self._logger.error('Handler failed for %s:%s', addr[0], addr[1], exc_info=True)
+
+    def _handle_client(self, sock: socket.socket, addr: Tuple[str, int], data: memoryview):
+        """Handle one datagram, *data* must be copied to be kept."""
+        if self._recvLog.sample():
+            self._recvLog.emit('Receive data from %s:%s.', addr[0], addr[1])
         # Send to all other clients new client
         for client in self.clients:
             self._send_msg(self._sock, pickle.dumps(addr), client)
@@ -141,31 +195,55 @@ class RendezVousServerUDP(object):
             # Welcome new client
             self._send_msg(self._sock, b'Welcome !', addr)
 
+    @property
+    def port(self) -> int:
+        """Port of the server, the one actually bound once started."""
+        return self._port
+
+    def send(self, msg: Any, addr: Tuple[str, int], priority: int = OutboundQueue.BULK) -> bool:
+        """Queue *msg* to be sent to *addr* from the server port.
+           Return False if dropped because the queue is full.
+        """
+        return self._container.put(msg, addr, priority)
+
+    def outbound_stats(self) -> Dict[str, int]:
+        """Queue depth and enqueued / dequeued / dropped counters."""
+        return self._container.stats()
+
+    def limiter_stats(self) -> Dict[str, int]:
+        """Rate limiter counters (empty without limiter)."""
+        return self._limiter.stats() if self._limiter is not None else {}
+
     def _data_loop(self) -> None:
         """Wait for data to be sent. Should run on a separated thread."""
         self._logger.debug('Waiting for messages to be sent.')
-        with socket.socket(self._socketFamily, self._socketType, socket.IPPROTO_UDP) as s:
-            s.bind(('', 0))
-            while self._running:
-                # Reduce CPU overhead
-                time.sleep(1 / 100.0)
-                # Check container
-                if (not self._container.empty()):
-                    msg, addr = self._container.get(block=True)
-                    self._send_msg(s, msg, addr)
+        while True:
+            # Sleep until something is queued (or queue closed by stop)
+            batch = self._container.get_batch(RendezVousServerUDP.SEND_BATCH)
+            if not batch:
+                break
+            for msg, addr in batch:
+                try:
+                    # Send from server port so NAT mappings toward it are used
+                    self._send_msg(self._sock, msg, addr)
+                except socket.error as err:
+                    self._logger.warning('Send to %s:%s failed --> %s', addr[0], addr[1], err)
 
     def _send_msg(self, sock: socket.socket, msg: Any, addr: Tuple[str, int]) -> None:
         # @TODO Sent information should be different based on message received
-        template = 'Send message to {0}:{1} using interface {2}:{3}.'
         if (isinstance(msg, str)):
             sock.sendto(msg.encode(self._encoding), addr)
         else:
             sock.sendto(msg, addr)
-        self._logger.info(template.format(addr[0], addr[1],
-                                          *sock.getsockname()))
+        # getsockname is a system call, only made when the line is written
+        if self._sendLog.sample():
+            self._sendLog.emit('Send message to %s:%s using interface %s:%s.',
+                               addr[0], addr[1], *sock.getsockname())
 
     def _bind(self) -> None:
         self._sock.bind((self._host, self._port))
+        # Port picked by the system when 0 was asked (`func::_stop` sends to it)
+        self._port = self._sock.getsockname()[1]
         self._logger.debug('Socket binded (host = {0}) with port {1}.'.format(self._host, self._port))
         print("Rendez-vous Server Up and running on {0}:{1}".format(self._host, self._port))
 
@@ -176,6 +254,16 @@ class RendezVousServerUDP(object):
         """
         # Safe as assignment is atomic
         self._running = False
+        # Wake up data thread
+        self._container.close()
+        if self._reusePort:
+            # Port is shared, fake message may reach another process. Shutdown
+            # wakes up the blocking call instead (Linux, reports ENOTCONN).
+            try:
+                self._sock.shutdown(socket.SHUT_RD)
+            except socket.error:
+                pass
+            return
         # Fake message to break infinite loop waiting for a message (see _receive_loop)
         with socket.socket(self._socketFamily, self._socketType, socket.IPPROTO_UDP) as s:
             if (self._host in ('0.0.0.0', '')):
@@ -0,0 +1,258 @@
+# Project/server/hole_punching/wire.py
+
+"""
+    Binary wire format of rendezvous datagrams.
+
+    FString datagrams start with a big endian int32 length, so their first
+    byte is 0 for any realistic size. Binary datagrams start with `MAGIC`
+    followed by protocol version and message type, both formats can share
+    the same port. Every field has a fixed layout (network byte order):
+
+        header          magic:B version:B type:B
+        REGISTER        header session:32s
+        REGISTER_REPLY  header ip:4s port:H
+        JOIN            header host_ip:4s host_port:H session:32s
+        JOIN_REPLY      header ip:4s port:H host_ip:4s host_port:H
+        INTRODUCE       header peer_ip:4s peer_port:H
+        PROBE           header probe_id:32s
+        PROBE_REPLY     header ip:4s port:H index:B nat:B
+        RELAY           header session:32s
+        RELAY_REPLY     header token:8s relay_port:H
+        RELAY_BIND      header token:8s
+        RELAY_BIND_REPLY header token:8s state:B
+        STATUS          header token:8s open_private:H open_public:H
+        STATUS_REPLY    header state:B
+
+    INTRODUCE is sent by the server to a registered host when a peer joins
+    its session, at the same time as the JOIN_REPLY, so both sides punch
+    toward each other at once.
+
+    PROBE is sent to the rendezvous port and to each probe port (see nat),
+    *index* tells which port answered. Once the NAT of the other side is
+    classified, JOIN_REPLY and INTRODUCE are followed by a trailer:
+
+        NAT trailer     nat:B first_port:H last_port:H
+
+    *nat* is the position in nat.KINDS, ports the predicted range (0 if
+    unpredictable). Decoders of the former layout ignore the trailer.
+
+    RELAY asks the rendezvous server for a relay session toward the host of
+    *session*, both peers get a RELAY_REPLY. Each then sends RELAY_BIND to
+    the relay port (same IP as the rendezvous server) until state is
+    RELAY_READY, every other datagram sent there reaches the other peer.
+
+    STATUS is sent by a registered host to refresh its open slots in the
+    hosts registry, *token* is the status token given by the socket.io
+    server when the host was added. STATUS_REPLY state is STATUS_UPDATED or
+    STATUS_UNKNOWN (token expired with the host, add it again).
+
+    IPs are IPv4 (socket.inet_aton), session is the UTF-8 SessionId padded
+    with NUL bytes. Servers advertise the version they speak in the JSON
+    Register reply ('Binary' key), hosts and clients may then switch.
+"""
+
+
+import socket
+import struct
+
+# Static typing checking
+from typing import Optional, Tuple
+
+
+__all__ = ['MAGIC', 'VERSION', 'REGISTER', 'REGISTER_REPLY', 'JOIN', 'JOIN_REPLY', 'INTRODUCE',
+           'PROBE', 'PROBE_REPLY', 'RELAY', 'RELAY_REPLY', 'RELAY_BIND', 'RELAY_BIND_REPLY',
+           'STATUS', 'STATUS_REPLY',
+           'is_binary', 'message_type', 'decode_register', 'decode_join',
+           'encode_register', 'encode_register_reply', 'encode_join', 'encode_join_reply',
+           'encode_introduce', 'decode_probe', 'encode_probe', 'encode_probe_reply',
+           'encode_nat', 'decode_relay', 'encode_relay', 'encode_relay_reply', 'decode_relay_bind',
+           'encode_relay_bind', 'encode_relay_bind_reply', 'decode_status', 'encode_status',
+           'encode_status_reply', 'decode_reply']
+
+
+MAGIC = 0xDB
+VERSION = 1
+
+# Message types
+REGISTER = 1
+REGISTER_REPLY = 2
+JOIN = 3
+JOIN_REPLY = 4
+INTRODUCE = 5
+PROBE = 6
+PROBE_REPLY = 7
+RELAY = 8
+RELAY_REPLY = 9
+RELAY_BIND = 10
+RELAY_BIND_REPLY = 11
+STATUS = 12
+STATUS_REPLY = 13
+
+# Relay session states (RELAY_BIND_REPLY)
+RELAY_UNKNOWN = 0
+RELAY_WAITING = 1
+RELAY_READY = 2
+
+# Host status states (STATUS_REPLY)
+STATUS_UNKNOWN = 0
+STATUS_UPDATED = 1
+
+SESSION_SIZE = 32
+RELAY_TOKEN_SIZE = 8
+STATUS_TOKEN_SIZE = 8
+
+_HEADER = struct.Struct('!BBB')
+_REGISTER = struct.Struct('!BBB32s')
+_REGISTER_REPLY = struct.Struct('!BBB4sH')
+_JOIN = struct.Struct('!BBB4sH32s')
+_JOIN_REPLY = struct.Struct('!BBB4sH4sH')
+_INTRODUCE = _REGISTER_REPLY
+_PROBE = _REGISTER
+_PROBE_REPLY = struct.Struct('!BBB4sHBB')
+_NAT = struct.Struct('!BHH')
+_RELAY = _REGISTER
+_RELAY_REPLY = struct.Struct('!BBB8sH')
+_RELAY_BIND = struct.Struct('!BBB8s')
+_RELAY_BIND_REPLY = struct.Struct('!BBB8sB')
+_STATUS = struct.Struct('!BBB8sHH')
+_STATUS_REPLY = struct.Struct('!BBBB')
+
+_inet_aton = socket.inet_aton
+_inet_ntoa = socket.inet_ntoa
+
+
+def is_binary(data: bytes) -> bool:
+    """Check *data* is a binary message (cheap, first byte only)."""
+    return len(data) >= _HEADER.size and data[0] == MAGIC
+
+
+def message_type(data: bytes) -> Optional[int]:
+    """Type of a binary message or None if version is not supported."""
+    _, version, msgType = _HEADER.unpack_from(data)
+    return msgType if version == VERSION else None
+
+
+def _session(raw: bytes) -> str:
+    return raw.rstrip(b'\0').decode('utf-8', 'replace')
+
+
+def decode_register(data: bytes) -> str:
+    """Return SessionId of a REGISTER (struct.error if too short)."""
+    return _session(_REGISTER.unpack_from(data)[3])
+
+
+def decode_join(data: bytes) -> Tuple[bytes, int, str]:
+    """Return (packed host ip, host port, SessionId) of a JOIN."""
+    _, _, _, hostIP, hostPort, session = _JOIN.unpack_from(data)
+    return hostIP, hostPort, _session(session)
+
+
+def encode_register(session: str = '') -> bytes:
+    return _REGISTER.pack(MAGIC, VERSION, REGISTER, session.encode('utf-8'))
+
+
+def encode_register_reply(addr: Tuple[str, int]) -> bytes:
+    return _REGISTER_REPLY.pack(MAGIC, VERSION, REGISTER_REPLY, _inet_aton(addr[0]), addr[1])
+
+
+def encode_join(host_addr: Tuple[str, int], session: str = '') -> bytes:
+    return _JOIN.pack(MAGIC, VERSION, JOIN, _inet_aton(host_addr[0]), host_addr[1],
+                      session.encode('utf-8'))
+
+
+def encode_join_reply(addr: Tuple[str, int], packed_host_ip: bytes, host_port: int) -> bytes:
+    """JOIN_REPLY, host IP is given packed (as read from JOIN) to skip conversions."""
+    return _JOIN_REPLY.pack(MAGIC, VERSION, JOIN_REPLY, _inet_aton(addr[0]), addr[1],
+                            packed_host_ip, host_port)
+
+
+def encode_introduce(peer_addr: Tuple[str, int]) -> bytes:
+    return _INTRODUCE.pack(MAGIC, VERSION, INTRODUCE, _inet_aton(peer_addr[0]), peer_addr[1])
+
+
+def decode_probe(data: bytes) -> str:
+    """Return ProbeId of a PROBE (struct.error if too short)."""
+    return _session(_PROBE.unpack_from(data)[3])
+
+
+def encode_probe(probe_id: str) -> bytes:
+    return _PROBE.pack(MAGIC, VERSION, PROBE, probe_id.encode('utf-8'))
+
+
+def encode_probe_reply(addr: Tuple[str, int], index: int, nat: int) -> bytes:
+    return _PROBE_REPLY.pack(MAGIC, VERSION, PROBE_REPLY, _inet_aton(addr[0]), addr[1], index, nat)
+
+
+def encode_nat(nat: int, first_port: int, last_port: int) -> bytes:
+    """NAT trailer appended to JOIN_REPLY / INTRODUCE."""
+    return _NAT.pack(nat, first_port, last_port)
+
+
+def decode_relay(data: bytes) -> str:
+    """Return SessionId of a RELAY (struct.error if too short)."""
+    return _session(_RELAY.unpack_from(data)[3])
+
+
+def encode_relay(session: str) -> bytes:
+    return _RELAY.pack(MAGIC, VERSION, RELAY, session.encode('utf-8'))
+
+
+def encode_relay_reply(token: bytes, relay_port: int) -> bytes:
+    return _RELAY_REPLY.pack(MAGIC, VERSION, RELAY_REPLY, token, relay_port)
+
+
+def decode_relay_bind(data: bytes) -> bytes:
+    """Return token of a RELAY_BIND (struct.error if too short)."""
+    return _RELAY_BIND.unpack_from(data)[3]
+
+
+def encode_relay_bind(token: bytes) -> bytes:
+    return _RELAY_BIND.pack(MAGIC, VERSION, RELAY_BIND, token)
+
+
+def encode_relay_bind_reply(token: bytes, state: int) -> bytes:
+    return _RELAY_BIND_REPLY.pack(MAGIC, VERSION, RELAY_BIND_REPLY, token, state)
+
+
+def decode_status(data: bytes) -> Tuple[bytes, int, int]:
+    """Return (token, open private, open public) of a STATUS (struct.error if too short)."""
+    return _STATUS.unpack_from(data)[3:]
+
+
+def encode_status(token: bytes, open_private: int, open_public: int) -> bytes:
+    return _STATUS.pack(MAGIC, VERSION, STATUS, token, open_private, open_public)
+
+
+def encode_status_reply(state: int) -> bytes:
+    return _STATUS_REPLY.pack(MAGIC, VERSION, STATUS_REPLY, state)
+
+
+def decode_reply(data: bytes) -> Tuple:
+    """Decode a REGISTER_REPLY / JOIN_REPLY / INTRODUCE into ((ip, port), ...) tuples,
+       followed by (nat, first port, last port) if a NAT trailer is present.
+       PROBE_REPLY gives ((ip, port), index, nat), RELAY_REPLY (token, relay
+       port), RELAY_BIND_REPLY (token, state) and STATUS_REPLY (state,).
+    """
+    msgType = message_type(data)
+    if msgType in (REGISTER_REPLY, INTRODUCE):
+        _, _, _, ip, port = _REGISTER_REPLY.unpack_from(data)
+        result = ((_inet_ntoa(ip), port),)
+        size = _REGISTER_REPLY.size
+    elif msgType == JOIN_REPLY:
+        _, _, _, ip, port, hostIP, hostPort = _JOIN_REPLY.unpack_from(data)
+        result = ((_inet_ntoa(ip), port), (_inet_ntoa(hostIP), hostPort))
+        size = _JOIN_REPLY.size
+    elif msgType == PROBE_REPLY:
+        _, _, _, ip, port, index, nat = _PROBE_REPLY.unpack_from(data)
+        return ((_inet_ntoa(ip), port), index, nat)
+    elif msgType == RELAY_REPLY:
+        return _RELAY_REPLY.unpack_from(data)[3:]
+    elif msgType == RELAY_BIND_REPLY:
+        return _RELAY_BIND_REPLY.unpack_from(data)[3:]
+    elif msgType == STATUS_REPLY:
+        return _STATUS_REPLY.unpack_from(data)[3:]
+    else:
+        raise ValueError('Not a reply')
+    if msgType != REGISTER_REPLY and len(data) >= size + _NAT.size:
+        result += (_NAT.unpack_from(data, size),)
+    return result
@@ -0,0 +1,173 @@
+# Project/server/hole_punching/workers.py
+
+"""
+    Multi process UDP rendezvous.
+      - N worker processes bind the same port (SO_REUSEPORT), the kernel
+        spreads datagrams between them
+      - A supervisor thread restarts workers which died (exponential backoff
+        for workers dying over and over), SIGTERM stops them
+      - Registered host endpoints live in a FileEndpointStore shared by workers
+"""
+
+
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+
+# Static typing checking
+from typing import Any, Callable, Dict, List, Optional
+
+from Project.server import LOG
+from Project.server.hole_punching.destruck_server import DestruckUDPServer
+from Project.server.hole_punching.endpoint_store import FileEndpointStore
+from Project.server.hole_punching.rate_limit import SourceRateLimiter
+from Project.tools.logger import configure_sampling, sampling_config
+
+
+__all__ = ['UDPWorkerSupervisor']
+
+
+def _worker_main(host: str, port: int, factory: Callable[..., Any],
+                 store: Optional[FileEndpointStore], sampling: Dict[str, Any],
+                 limiter: Optional[SourceRateLimiter]) -> None:
+    """Body of a worker process: serve until SIGTERM."""
+    # Spawned processes start with default logging configuration
+    configure_sampling(**sampling)
+
+    # No shared synchronization primitive, a killed worker cannot leave one
+    # in a broken state
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+
+    server = factory(reuse_port=True, store=store, limiter=limiter)
+    if not server.start(host, port):
+        raise SystemExit(1)
+    try:
+        while not stopped.wait(1.0):
+            pass
+    finally:
+        server.stop()
+
+
+class UDPWorkerSupervisor(object):
+
+    """
+        Run *workers* rendezvous server processes sharing *port*.
+
+        *factory* is called in each worker with `reuse_port`, `store` and
+        `limiter` keyword arguments and must return a server (picklable
+        callable, default to `DestruckUDPServer`). *store_path* is the SQLite
+        file shared by workers (udp_endpoints_<port>.db in the temporary
+        directory if empty). Each worker gets its own copy of *limiter*,
+        limits apply per worker.
+
+        Dead workers are found every *check_interval* seconds and restarted.
+        A worker dying again within MAX_BACKOFF seconds of its restart waits
+        twice as long as the previous time (up to MAX_BACKOFF) first.
+    """
+
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, host: str, port: int, workers: int = 0,
+                 factory: Callable[..., Any] = DestruckUDPServer,
+                 store_path: str = '', check_interval: float = 1.0,
+                 limiter: Optional[SourceRateLimiter] = None):
+        super().__init__()
+
+        self._logger = logging.getLogger(LOG + '.' + 'UDPWorkers')
+        self.host = host
+        self.port = port
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.factory = factory
+        self.store = FileEndpointStore(store_path or os.path.join(tempfile.gettempdir(),
+                                                                  'udp_endpoints_{0}.db'.format(port)))
+        self.check_interval = check_interval
+        self.limiter = limiter
+
+        # Spawn keeps workers free of parent threads / sockets state
+        self._context = multiprocessing.get_context('spawn')
+        self._stopEvent = threading.Event()
+        self._processes = []        # type: List[Any]
+        # Per worker slot: deaths in a row, monotonic time of next restart, of last start
+        self._failures = []         # type: List[int]
+        self._restartAt = []        # type: List[Optional[float]]
+        self._startedAt = []        # type: List[float]
+        self._monitorThread = None  # type: Any
+        self._running = False
+        self.restarts = 0
+
+    def start(self) -> None:
+        self._running = True
+        self._processes = [self._spawn() for _ in range(self.workers)]
+        now = time.monotonic()
+        self._failures = [0] * self.workers
+        self._restartAt = [None] * self.workers      # type: List[Optional[float]]
+        self._startedAt = [now] * self.workers
+        self._monitorThread = threading.Thread(target=self._monitor_loop,
+                                               name='UDPWorkers-Monitor', daemon=True)
+        self._monitorThread.start()
+        self._logger.info('{0} UDP workers started on {1}:{2}'.format(self.workers, self.host, self.port))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._running = False
+        self._stopEvent.set()
+        if self._monitorThread is not None:
+            self._monitorThread.join()
+        for process in self._processes:
+            # Graceful stop (see _worker_main)
+            process.terminate()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                self._logger.warning('Worker {0} did not stop, kill it'.format(process.pid))
+                process.kill()
+        self._processes = []
+        self.store.close()
+
+    def alive(self) -> int:
+        """Number of worker processes running."""
+        return sum(1 for p in self._processes if p.is_alive())
+
+    def _spawn(self) -> Any:
+        process = self._context.Process(target=_worker_main,
+                                        args=(self.host, self.port, self.factory, self.store,
+                                              sampling_config(), self.limiter),
+                                        name='UDPWorker', daemon=True)
+        process.start()
+        return process
+
+    def _monitor_loop(self) -> None:
+        """Restart crashed workers. Should run on a separated thread."""
+        while self._running:
+            if self._stopEvent.wait(self.check_interval):
+                return
+            self._check_workers(time.monotonic())
+
+    def _check_workers(self, now: float) -> None:
+        """Restart workers found dead whose backoff delay elapsed."""
+        for index, process in enumerate(self._processes):
+            if process.is_alive() or not self._running:
+                continue
+            if self._restartAt[index] is None:
+                # Just found dead, one dying soon after its start backs off
+                if now - self._startedAt[index] < UDPWorkerSupervisor.MAX_BACKOFF:
+                    self._failures[index] += 1
+                else:
+                    self._failures[index] = 0
+                failures = self._failures[index]
+                delay = 0.0
+                if failures:
+                    delay = min(self.check_interval * 2 ** failures, UDPWorkerSupervisor.MAX_BACKOFF)
+                self._restartAt[index] = now + delay
+                self._logger.error('Worker {0} died (exit code {1}), restarting it in {2:.0f}s'.format(
+                    process.pid, process.exitcode, delay))
+            if now < self._restartAt[index]:
+                continue
+            self._processes[index] = self._spawn()
+            self._restartAt[index] = None
+            self._startedAt[index] = now
+            self.restarts += 1
@@ -0,0 +1,67 @@
+# Project/server/main/host_leases.py
+
+import logging
+
+from Project.server import LOG
+from Project.server.data import DataManager
+
+
+class HostLeases(object):
+
+    """Remove hosts which stopped sending heartbeats.
+
+       Each host holds a lease of *ttl* seconds renewed by its heartbeats
+       (and connection updates). Leases are kept in a timing wheel of the
+       container: checking them every *tick* seconds costs the leases due
+       in that tick, not the number of hosts.
+
+       The host socket is told with *event* when its lease expired, a game
+       still alive may then add its host again.
+    """
+
+    def __init__(self, event: str, ttl: float = 0.0, tick: float = 1.0, namespace: str = '/'):
+        super().__init__()
+
+        self.event = event
+        self.ttl = ttl
+        self.tick = tick
+        self.namespace = namespace
+
+        self._logger = logging.getLogger(LOG + '.HostLeases')
+        self._socketio = None
+        self._container = None
+        self._expired = None
+
+    def init_io(self, socketio, container: DataManager, metrics=None) -> None:
+        """Give hosts of *container* a lease and start expiring them (ttl > 0)."""
+        if self.ttl <= 0:
+            return
+        self._socketio = socketio
+        self._container = container
+        container.enable_leases(self.ttl, self.tick)
+        if metrics is not None:
+            self._expired = metrics.counter('host_leases_expired_total', 'Hosts removed because their lease expired')
+            metrics.gauge('host_leases', 'Hosts holding a lease', lambda: container.leases)
+        socketio.start_background_task(self._expire_loop)
+
+    def expire(self) -> int:
+        """Remove hosts whose lease expired. Return number of hosts removed."""
+        expired = self._container.expire_leases()
+        if not expired:
+            return 0
+        if self._expired is not None:
+            self._expired.inc(len(expired))
+        for host in expired:
+            # Each socket.io client is in the room of its own sid
+            self._socketio.emit(self.event, host.client_ID, room=host.client_ID, namespace=self.namespace)
+        self._logger.info('%d host leases expired (%d hosts left)', len(expired), len(self._container))
+        return len(expired)
+
+    def _expire_loop(self) -> None:
+        while True:
+            self._socketio.sleep(self.tick)
+            try:
+                self.expire()
+            except Exception:
+                # Never let expiry die silently
+                self._logger.exception('Host leases expiry failed')
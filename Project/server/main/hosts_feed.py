@@ -0,0 +1,138 @@
+# Project/server/main/hosts_feed.py
+
+import json
+import logging
+import threading
+
+from collections import OrderedDict
+
+from Project.server import LOG
+from Project.server.data import DataManager, Host
+from Project.tools.raw_json import RawJSON
+
+# Type checking
+from typing import Any, Dict, Tuple
+
+
+class HostsFeed(object):
+
+    """Push hosts registry changes to subscribed socket.io clients.
+
+       Subscribers join the room of every hosts or the room of a single
+       BuildUniqueId. Changes are coalesced per host during *window* seconds
+       then each room receives one event:
+
+           {'version': 12, 'added': [host, ...], 'updated': [host, ...],
+            'removed': [client_ID, ...]}
+
+       Each host is encoded once per flush whatever the number of rooms and
+       subscribers, the payload of a room is encoded once for all its members.
+
+       Changes may come from any thread (registry writers), pending ones
+       are swapped under a lock by the flushing greenlet. *version* is the
+       registry version of the last change included, a client resuming
+       from it (see `DataManager.changes_since`) misses none.
+    """
+
+    ROOM_ALL = 'hosts'
+
+    def __init__(self, event: str, window: float = 0.25, namespace: str = '/'):
+        super().__init__()
+
+        self.event = event
+        self.window = window
+        self.namespace = namespace
+
+        self._logger = logging.getLogger(LOG + '.HostsFeed')
+        self._socketio = None
+        self._container = None
+        # client_ID -> (kind, host)
+        self._pending = OrderedDict()     # type: OrderedDict[str, Tuple[str, Host]]
+        # Registry version of the last change merged in _pending
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def init_io(self, socketio, container: DataManager) -> None:
+        """Listen to *container* and start flushing changes through *socketio*."""
+        self._socketio = socketio
+        self._container = container
+        container.add_listener(self.on_change)
+        socketio.start_background_task(self._flush_loop)
+
+    @classmethod
+    def room_for(cls, build_id: Any = None) -> str:
+        if build_id is None:
+            return cls.ROOM_ALL
+        return '{0}:{1}'.format(cls.ROOM_ALL, build_id)
+
+    def on_change(self, kind: str, host: Host) -> None:
+        """Registry listener, merge *kind* with change already pending for *host*."""
+        # Called by the writer right after publishing, version is this change's
+        version = self._container.version if self._container is not None else 0
+        with self._lock:
+            self._merge(kind, host)
+            self._version = max(self._version, version)
+
+    def _merge(self, kind: str, host: Host) -> None:
+        previous = self._pending.get(host.client_ID, None)
+        if previous is None:
+            self._pending[host.client_ID] = (kind, host)
+            return
+
+        previousKind = previous[0]
+        if previousKind == DataManager.ADDED and kind == DataManager.REMOVED:
+            # Subscribers never saw it
+            del self._pending[host.client_ID]
+        elif previousKind == DataManager.ADDED:
+            self._pending[host.client_ID] = (DataManager.ADDED, host)
+        elif previousKind == DataManager.REMOVED and kind == DataManager.ADDED:
+            self._pending[host.client_ID] = (DataManager.UPDATED, host)
+        else:
+            self._pending[host.client_ID] = (kind, host)
+
+    def flush(self) -> int:
+        """Emit pending changes. Return number of rooms notified."""
+        if not self._pending:
+            return 0
+        # Swap so changes happening while emitting go to next flush
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            version = self._version
+
+        # room -> kind -> encoded items
+        rooms = {}      # type: Dict[str, Dict[str, list]]
+        for clientID, (kind, host) in pending.items():
+            if kind == DataManager.REMOVED:
+                item = json.dumps(clientID)
+            else:
+                item = json.dumps(host.to_dict(), separators=(',', ':'))
+            buildID = host.get_session_info('BuildUniqueId')
+            targets = (HostsFeed.ROOM_ALL,) if buildID is None else (HostsFeed.ROOM_ALL,
+                                                                   HostsFeed.room_for(buildID))
+            for room in targets:
+                byKind = rooms.get(room, None)
+                if byKind is None:
+                    byKind = rooms[room] = {DataManager.ADDED: [],
+                                            DataManager.UPDATED: [],
+                                            DataManager.REMOVED: []}
+                byKind[kind].append(item)
+
+        for room, byKind in rooms.items():
+            payload = RawJSON('{{"version":{0},"added":[{1}],"updated":[{2}],"removed":[{3}]}}'.format(
+                version,
+                ','.join(byKind[DataManager.ADDED]),
+                ','.join(byKind[DataManager.UPDATED]),
+                ','.join(byKind[DataManager.REMOVED])))
+            self._socketio.emit(self.event, payload, room=room, namespace=self.namespace)
+
+        self._logger.debug('Flushed %d changes to %d rooms', len(pending), len(rooms))
+        return len(rooms)
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._socketio.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                # Never let the feed die silently
+                self._logger.exception('Hosts feed flush failed')
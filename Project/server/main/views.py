@@ -2,29 +2,43 @@
 
 import logging
 
-from flask import render_template, Blueprint, request
+from flask import render_template, Blueprint, request, Response
 
 from Project.tools.socketIO_blueprint import IOBlueprint
-from Project.server.data import Host
+from Project.tools.raw_json import RawJSON
+from Project.tools.logger import get_sampler
+from Project.server.data import Host, HostQuery
 
-from flask_socketio import emit
+from flask_socketio import emit, join_room, leave_room
 
-from Project.server import container, LOG
+from Project.server import container, metrics, LOG
+from Project.server.main.hosts_feed import HostsFeed
+from Project.server.main.host_leases import HostLeases
 
 
 main_blueprint = Blueprint('main', __name__,)
 main_log = logging.getLogger(LOG)
 mainIO_blueprint = IOBlueprint('/')
 mainIO_log = logging.getLogger(LOG + '.IO')
+# Frequent events, sampled (see Project.tools.logger.configure_sampling)
+connect_log = get_sampler(mainIO_log, 'io.connect')
+askHosts_log = get_sampler(mainIO_log, 'io.ask_hosts')
 
 
 # Host events
 OnAddHost = 'OnAddHost'
+OnAddHostFailed = 'OnAddHostFailed'
 OnRemoveHost = 'OnRemoveHost'
+OnHostHeartbeat = 'OnHostHeartbeat'
+OnHostLeaseExpired = 'OnHostLeaseExpired'
+OnHostStatusToken = 'OnHostStatusToken'
 
 # Join events
 OnAskHosts = 'OnAskHosts'
 OnHostsList = 'OnHostsList'
+OnHostsPage = 'OnHostsPage'
+OnHostsDelta = 'OnHostsDelta'
+OnAskHostsFailed = 'OnAskHostsFailed'
 OnJoinHost = 'OnJoinHost'
 OnLeaveHost = 'OnLeaveHost'
 
@@ -33,22 +47,39 @@ OnUpdateHostConnection = 'OnUpdateHostConnection'
 OnUpdateHostSucceeded = 'OnUpdateHostSucceeded'
 OnUpdateHostFailed = 'OnUpdateHostFailed'
 
+# Subscription events
+OnSubscribeHosts = 'OnSubscribeHosts'
+OnUnsubscribeHosts = 'OnUnsubscribeHosts'
+OnHostsSubscribed = 'OnHostsSubscribed'
+OnHostsChanged = 'OnHostsChanged'
+
+# Push registry changes to subscribers (started by create_app)
+hosts_feed = HostsFeed(OnHostsChanged)
+# Remove hosts without heartbeat (started by create_app)
+host_leases = HostLeases(OnHostLeaseExpired)
+
 
 @main_blueprint.route('/')
 def home():
     return render_template('home.html')
 
 
+@main_blueprint.route('/metrics')
+def metrics_page():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @mainIO_blueprint.on('message')
 def on_message(msg):
     """Server side event handler for an unnamed event using String messages."""
-    mainIO_log.info('Unnamed String Event: {0} {1}'.format(msg, request.sid))
+    mainIO_log.info('Unnamed String Event: %s %s', msg, request.sid)
 
 
 @mainIO_blueprint.on('json')
 def on_json(json: dict):
     """Server side event handler for an unnamed event using JSON messages."""
-    mainIO_log.info('Unnamed JSON Event: {0} {1}'.format(str(json), request.sid))
+    mainIO_log.info('Unnamed JSON Event: %s %s', json, request.sid)
 
 
 @mainIO_blueprint.on('connect')
@@ -59,74 +90,144 @@ def on_connect():
     else:
         # If behind a proxy
         ipAddress = request.environ['HTTP_X_FORWARDED_FOR']
-        template = 'Client behind proxy (HTTP_X_REAL_IP={0}, HTTP_X_FORWARDED_FOR={1}'
-        mainIO_log.info(template.format(request.environ.get('HTTP_X_REAL_IP'),
-                                        ipAddress))
+        mainIO_log.debug('Client behind proxy (HTTP_X_REAL_IP=%s, HTTP_X_FORWARDED_FOR=%s',
+                         request.environ.get('HTTP_X_REAL_IP'), ipAddress)
 
     # Register new client with associated session ID
     client = container.register_client(request.sid, ipAddress,
                                        request.event['args'][0]['REMOTE_PORT'])
-    mainIO_log.info('Client {0} now connected {1}:{2} '.format(client.sid, client.adrr, client.port))
+    connect_log.log('Client %s now connected %s:%s ', client.sid, client.adrr, client.port)
 
 
 @mainIO_blueprint.on('disconnect')
 def on_disconnect():
     # Try removing it from host list in case client game not shutdown properly
     container.remove_host_by_ID(request.sid)
-    mainIO_log.debug('Container updated (DEL -> {0})'.format(len(container.hosts)))
+    mainIO_log.debug('Container updated (DEL -> %d)', len(container))
 
     # Unregister new client
     client = container.unregister_client(request.sid)
     if client is not None:
-        mainIO_log.info('Client {0} now disconnected {1}:{2} '.format(client.sid, client.adrr, client.port))
+        connect_log.log('Client %s now disconnected %s:%s ', client.sid, client.adrr, client.port)
 
 
 @mainIO_blueprint.on(OnAddHost)
 def on_add_host(json: dict):
     """Event send when a client start hosting."""
     json['ipAddress'] = container.clients[request.sid].adrr
-    container.add_host(Host.from_dict(json, request.sid))
-    mainIO_log.info('Container updated (ADD -> {0})'.format(len(container.hosts)))
+    if not container.add_host(Host.from_dict(json, request.sid)):
+        # Already hosting, no token for a host this event did not add
+        emit(OnAddHostFailed, json, broadcast=False, json=True)
+        mainIO_log.warning('Host %s not added %s', request.sid, json)
+        return
+    mainIO_log.info('Container updated (ADD -> %d)', len(container))
+    # Open slots may then be refreshed with STATUS datagrams (see hole_punching.wire)
+    token = container.issue_status_token(request.sid)
+    emit(OnHostStatusToken, {'token': token.hex()}, broadcast=False, json=True)
+
+
+@mainIO_blueprint.on(OnHostHeartbeat)
+def on_host_heartbeat(msg=None):
+    """Event send periodically by a host to keep its lease."""
+    if not container.renew_lease(request.sid):
+        # Lease already expired (or host never added), game should add it again
+        emit(OnHostLeaseExpired, request.sid)
 
 
 @mainIO_blueprint.on(OnAskHosts)
-def on_ask_hosts(msg: str):
-    """Event send when a client ask for hosts list."""
-    hosts = container.hosts_as_json()
+def on_ask_hosts(msg):
+    """Event send when a client ask for hosts list.
+       A dict *msg* is either a delta request {'since': version, 'epoch': epoch}
+       (both from a previous OnHostsDelta or OnHostsSubscribed) answered with
+       changes after version (or every hosts if too old or from another
+       epoch), or a query (see HostQuery) answered with one page of hosts.
+    """
+    if isinstance(msg, dict) and 'since' in msg:
+        since = msg['since']
+        epoch = msg.get('epoch', None)
+        if not isinstance(since, int) or isinstance(since, bool):
+            emit(OnAskHostsFailed, {'error': 'since must be an integer'}, broadcast=False, json=True)
+            return
+        if not isinstance(epoch, str):
+            emit(OnAskHostsFailed, {'error': 'epoch must be a string'}, broadcast=False, json=True)
+            return
+        delta = container.changes_since(since, epoch)
+        if delta is None:
+            # Cursor unknown, out of change log or from a previous server, send everything
+            delta = RawJSON.compose({'epoch': container.epoch, 'version': container.version,
+                                     'full': True, 'hosts': container.hosts_snapshot()})
+        emit(OnHostsDelta, delta, broadcast=False, json=True)
+        askHosts_log.log('%s asking for hosts since %s', request.sid, since)
+        return
+
+    if isinstance(msg, dict):
+        try:
+            query = HostQuery.from_dict(msg)
+        except ValueError as err:
+            emit(OnAskHostsFailed, {'error': str(err)}, broadcast=False, json=True)
+            mainIO_log.warning('%s sent an invalid hosts query (%s)', request.sid, err)
+            return
+        emit(OnHostsPage, container.query_hosts(query), broadcast=False, json=True)
+        askHosts_log.log('%s querying hosts', request.sid)
+        return
+
+    # Encoded once per registry version and spliced as is in the packet
+    hosts = container.hosts_snapshot()
     emit(OnHostsList, hosts, broadcast=False, json=True)
-    mainIO_log.info('{0} asking for hosts'.format(request.sid))
+    askHosts_log.log('%s asking for hosts', request.sid)
 
 
 @mainIO_blueprint.on(OnRemoveHost)
 def on_remove_host(player_name: str):
     """Event send when a client stop hosting."""
     container.remove_host_by_ID(request.sid)
-    mainIO_log.info('Container updated (DEL ({1}) -> {0})'.format(len(container.hosts),
-                                                                  player_name))
+    mainIO_log.info('Container updated (DEL (%s) -> %d)', player_name, len(container))
 
 
 @mainIO_blueprint.on(OnUpdateHostConnection)
 def on_updateConnection_host(json: dict):
-    """Update data connection informations about an host"""
-    target_host = Host.from_dict(json)
-    updatedHost = container.update_open_connections(target_host)
+    """Update data connection informations about an host (sender one)"""
+    updatedHost = None
+    if isinstance(json, dict):
+        updatedHost = container.set_open_connections(request.sid,
+                                                     json.get('NumOpenPrivateConnections', None),
+                                                     json.get('NumOpenPublicConnections', None))
     if (updatedHost):
         # Should notify other ??
         emit(OnUpdateHostSucceeded, json, broadcast=False, json=True)
-        mainIO_log.info('Host updated {0}'.format(updatedHost))
+        mainIO_log.info('Host updated %s', updatedHost)
     else:
         emit(OnUpdateHostFailed, json, broadcast=False, json=True)
-        mainIO_log.warning('Host not updated {0}'.format(target_host))
+        mainIO_log.warning('Host %s not updated %s', request.sid, json)
+
+
+@mainIO_blueprint.on(OnSubscribeHosts)
+def on_subscribe_hosts(msg=None):
+    """Receive OnHostsChanged events, only for a BuildUniqueId if *msg* gives one."""
+    buildID = msg.get('BuildUniqueId', None) if isinstance(msg, dict) else None
+    room = HostsFeed.room_for(buildID)
+    join_room(room)
+    emit(OnHostsSubscribed, {'room': room, 'epoch': container.epoch, 'version': container.version},
+         broadcast=False, json=True)
+    mainIO_log.info('%s subscribed to %s', request.sid, room)
+
+
+@mainIO_blueprint.on(OnUnsubscribeHosts)
+def on_unsubscribe_hosts(msg=None):
+    buildID = msg.get('BuildUniqueId', None) if isinstance(msg, dict) else None
+    room = HostsFeed.room_for(buildID)
+    leave_room(room)
+    mainIO_log.info('%s unsubscribed from %s', request.sid, room)
 
 
 @mainIO_blueprint.on(OnJoinHost)
 def on_client_join_host(player_name: str):
-    mainIO_log.info('Client {0} (name = {1}) has join game'.format(request.sid, player_name))
+    mainIO_log.info('Client %s (name = %s) has join game', request.sid, player_name)
 
 
 @mainIO_blueprint.on(OnLeaveHost)
 def on_client_leave_host(player_name: str):
-    mainIO_log.info('Client {0} (name = {1}) has leave game'.format(request.sid, player_name))
+    mainIO_log.info('Client %s (name = %s) has leave game', request.sid, player_name)
 
 
 # Get public ip
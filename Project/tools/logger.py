@@ -7,11 +7,25 @@
 """
 
 
+import atexit
+import gzip
+import itertools
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, RotatingFileHandler, TimedRotatingFileHandler
 
+# Static typing checking
+from typing import Any, Dict, List, Union
 
-__all__ = ['add_file_handler', 'add_file_with_rotation_handler', 'add_stream_handler', 'log_basicConfig']
+
+__all__ = ['add_file_handler', 'add_file_with_rotation_handler', 'add_stream_handler', 'log_basicConfig',
+           'add_queued_file_handler', 'BoundedQueueHandler', 'BatchQueueListener', 'BatchRotatingFileHandler',
+           'LogSampler', 'get_sampler', 'configure_sampling', 'sampling_config']
 
 
 def add_file_handler(filename: str, level: int=logging.DEBUG, filemode: str='w',
@@ -139,3 +153,328 @@ def log_basicConfig(filename: str='log.log', level: int=logging.DEBUG, filemode:
                         datefmt=datefmt,
                         filename=filename,
                         filemode=filemode)
+
+
+def _gzip_namer(name: str) -> str:
+    return name + '.gz'
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """Size rotated file handler able to write many records at once (one
+    write and one flush per batch, see :class:`BatchQueueListener`).
+
+    :param filename: Path of the file used for logging message.
+    :param maxBytes: Size triggering a rotation, 0 never rotates (default to 0).
+    :param backupCount: Number of rotated files kept (default to 4).
+    :param compress: Gzip rotated files, named *filename*.N.gz (default to False).
+    """
+
+    def __init__(self, filename: str, maxBytes: int = 0, backupCount: int = 4,
+                 compress: bool = False, encoding: str = 'utf-8', delay: bool = False):
+        super().__init__(filename, mode='a', maxBytes=maxBytes, backupCount=backupCount,
+                         encoding=encoding, delay=delay)
+        if compress:
+            self.namer = _gzip_namer
+            self.rotator = _gzip_rotator
+
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        lines = [self.format(record) + self.terminator for record in records
+                 if record.levelno >= self.level and self.filter(record)]
+        if not lines:
+            return
+        data = ''.join(lines)
+        with self.lock:
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                # Rotation checked per batch, files may exceed maxBytes by one batch
+                if self.maxBytes > 0 and self.stream.tell() + len(data) >= self.maxBytes:
+                    self.doRollover()
+                self.stream.write(data)
+                self.stream.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Queue records for a :class:`BatchQueueListener` without ever waiting
+    on I/O. When the queue is full, *overflow* decides:
+
+        * 'drop_new': drop the new record (default)
+        * 'drop_old': drop the oldest queued record
+        * 'block': wait for room (writes are no more asynchronous)
+
+    Dropped records are counted in `dropped`.
+    """
+
+    DROP_NEW = 'drop_new'
+    DROP_OLD = 'drop_old'
+    BLOCK = 'block'
+
+    def __init__(self, maxsize: int = 10000, overflow: str = DROP_NEW):
+        if overflow not in (BoundedQueueHandler.DROP_NEW, BoundedQueueHandler.DROP_OLD,
+                            BoundedQueueHandler.BLOCK):
+            raise ValueError('Unknown overflow policy {0}'.format(overflow))
+        super().__init__(queue.Queue(maxsize))
+        self.overflow = overflow
+        self.dropped = 0
+        self.listener = None    # type: Any
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge arguments now (they may change later), formatting and
+        # traceback rendering are left to the writer thread. Other handlers
+        # still get the same message from the record.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == BoundedQueueHandler.BLOCK:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == BoundedQueueHandler.DROP_OLD:
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+
+class BatchQueueListener(object):
+    """Background thread writing records of a :class:`BoundedQueueHandler`
+    queue to *handlers*, up to *batch_size* records at once. Handlers with an
+    `emit_batch` method (:class:`BatchRotatingFileHandler`) get whole batches.
+    """
+
+    _STOP = None
+
+    def __init__(self, records: queue.Queue, *handlers: logging.Handler, batch_size: int = 256):
+        super().__init__()
+        self.queue = records
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None     # type: Any
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._monitor, name='Log-Writer', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write queued records then stop the thread."""
+        if self._thread is None:
+            return
+        self.queue.put(BatchQueueListener._STOP)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            handler.flush()
+
+    def _monitor(self) -> None:
+        while True:
+            record = self.queue.get()
+            stop = record is BatchQueueListener._STOP
+            batch = [] if stop else [record]
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is BatchQueueListener._STOP:
+                    stop = True
+                else:
+                    batch.append(record)
+            if batch:
+                self._handle(batch)
+            if stop:
+                return
+
+    def _handle(self, batch: List[logging.LogRecord]) -> None:
+        for handler in self.handlers:
+            if hasattr(handler, 'emit_batch'):
+                handler.emit_batch(batch)
+                continue
+            for record in batch:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+def add_queued_file_handler(filename: str, level: int=logging.DEBUG, parent: str='',
+                            maxBytes: int=10 * 1024 * 1024, backupCount: int=4, compress: bool=True,
+                            queue_size: int=10000, overflow: str=BoundedQueueHandler.DROP_NEW,
+                            batch_size: int=256,
+                            fmt: str='', datefmt: str='') -> BoundedQueueHandler:
+    """Add a handler which will write to *filename* events according to
+    logging level from a background thread. Callers only queue records, a
+    slow disk never blocks them.
+
+    :param filename: Path of the file used for logging message.
+    :param level: Minimal logging level to write to *filename*
+                  (default to logging.DEBUG)
+    :param parent: Select where to attach the new handler.
+                   :data:`None` means to root logger (default).
+    :param maxBytes: Size triggering a rotation, 0 never rotates
+                     (default to 10 MB)
+    :param backupCount: Number of rotated files kept (default to 4)
+    :param compress: Gzip rotated files (default to True)
+    :param queue_size: Maximal number of records waiting to be written
+                       (default to 10000)
+    :param overflow: Policy when the queue is full, see :class:`BoundedQueueHandler`
+                     (default to 'drop_new')
+    :param batch_size: Maximal number of records written at once (default to 256)
+    :param fmt: Format used for message
+                (default to '%(asctime)s %(levelname)-8s: %(name)-35s %(funcName)-25s >> %(message)s')
+    :param datefmt: Format used for datetime
+                    (default '%Y-%m-%d %H:%M:%S')
+
+    .. note::
+        The returned handler can be added to other loggers, its listener
+        (`handler.listener`) is stopped at exit, writing pending records.
+    """
+    fmt = fmt if fmt else '%(asctime)s %(levelname)-8s: %(name)-35s %(funcName)-25s >> %(message)s'
+    datefmt = datefmt if datefmt else '%Y-%m-%d %H:%M:%S'
+    file_handler = BatchRotatingFileHandler(filename, maxBytes=maxBytes, backupCount=backupCount,
+                                            compress=compress)
+    file_handler.setLevel(level)
+    file_handler.setFormatter(logging.Formatter(fmt=fmt, datefmt=datefmt))
+
+    handler = BoundedQueueHandler(queue_size, overflow)
+    handler.setLevel(level)
+    handler.listener = BatchQueueListener(handler.queue, file_handler, batch_size=batch_size)
+    handler.listener.start()
+    atexit.register(handler.listener.stop)
+    # Add the handler to parent (None return root logger)
+    logging.getLogger(parent).addHandler(handler)
+
+    return handler
+
+
+class LogSampler(object):
+    """Lazy and sampled logging of a high rate category of events (one
+    line per received datagram, per socket.io request...).
+
+    Usage on a hot path, arguments are only evaluated when a line is written::
+
+        if sampler.sample():
+            sampler.emit('Receive data from %s:%s.', addr[0], addr[1])
+
+    :param logger: Logger used to write lines.
+    :param category: Name of the category (see :func:`configure_sampling`).
+    :param level: Level of sampled lines (default to logging.INFO).
+    :param every: Write 1 line every *every* events (default to 1, all of them).
+    :param interval: Seconds between summary lines counting events, 0
+                     disables them (default to 0).
+
+    .. note::
+        Counters are shared by threads without lock, summaries may be off by
+        a few events under contention.
+    """
+
+    def __init__(self, logger: logging.Logger, category: str, level: int = logging.INFO,
+                 every: int = 1, interval: float = 0.0):
+        super().__init__()
+        self.logger = logger
+        self.category = category
+        self.level = level
+        self.every = max(1, every)
+        self.interval = interval
+        # next() on itertools.count is atomic
+        self._counter = itertools.count(1)
+        self._count = 0
+        self._lastCount = 0
+        self._logged = 0
+        self._nextSummary = time.monotonic() + interval
+
+    def sample(self) -> bool:
+        """Count one event, return True if a line should be written for it."""
+        self._count = count = next(self._counter)
+        if self.interval and time.monotonic() >= self._nextSummary:
+            self._summary()
+        if count % self.every or not self.logger.isEnabledFor(self.level):
+            return False
+        self._logged += 1
+        return True
+
+    def emit(self, msg: str, *args: Any) -> None:
+        """Write a line (lazy %-style formatting)."""
+        self._write(self.level, msg, args)
+
+    def log(self, msg: str, *args: Any) -> None:
+        """`sample` then `emit`, for arguments cheap to evaluate."""
+        if self.sample():
+            self._write(self.level, msg, args)
+
+    def _summary(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._nextSummary + self.interval
+        self._nextSummary = now + self.interval
+        events = self._count - self._lastCount
+        self._lastCount = self._count
+        logged, self._logged = self._logged, 0
+        if self.logger.isEnabledFor(logging.INFO):
+            self._write(logging.INFO, '%s: %d events (%d logged) in last %.1f s',
+                        (self.category, events, logged, elapsed), depth=3)
+
+    def _write(self, level: int, msg: str, args: tuple, depth: int = 2) -> None:
+        """Log a record reporting the caller *depth* frames up, not this class
+           (Logger.log stacklevel needs Python 3.8).
+        """
+        frame = sys._getframe(depth)
+        record = self.logger.makeRecord(self.logger.name, level, frame.f_code.co_filename, frame.f_lineno,
+                                        msg, args, None, frame.f_code.co_name)
+        self.logger.handle(record)
+
+
+# Sampling rate and summary interval by category, see configure_sampling
+_sampling = {'every': {}, 'interval': 0.0}       # type: Dict[str, Any]
+_samplers = {}                                   # type: Dict[str, LogSampler]
+
+
+def get_sampler(logger: logging.Logger, category: str, level: int = logging.INFO) -> LogSampler:
+    """Return the :class:`LogSampler` of *category* (created on first call
+    with the current sampling configuration).
+    """
+    sampler = _samplers.get(category, None)
+    if sampler is None:
+        sampler = LogSampler(logger, category, level,
+                             every=_sampling['every'].get(category, 1),
+                             interval=_sampling['interval'])
+        _samplers[category] = sampler
+    return sampler
+
+
+def configure_sampling(every: Union[str, Dict[str, int]] = '', interval: float = 0.0) -> None:
+    """Set sampling of existing and future samplers.
+
+    :param every: Rate by category, as a dict or a 'category=N,...' string
+                  (e.g. 'udp.recv=100,udp.send=100'). Missing categories log everything.
+    :param interval: Seconds between summary lines, 0 disables them.
+    """
+    if isinstance(every, str):
+        rates = {}
+        for item in filter(None, (part.strip() for part in every.split(','))):
+            category, _, rate = item.partition('=')
+            rates[category.strip()] = int(rate)
+        every = rates
+    _sampling['every'] = dict(every)
+    _sampling['interval'] = interval
+    for category, sampler in _samplers.items():
+        sampler.every = max(1, _sampling['every'].get(category, 1))
+        sampler.interval = interval
+        sampler._nextSummary = time.monotonic() + interval
+
+
+def sampling_config() -> Dict[str, Any]:
+    """Current sampling configuration (keyword arguments of :func:`configure_sampling`)."""
+    return {'every': dict(_sampling['every']), 'interval': _sampling['interval']}
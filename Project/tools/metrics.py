@@ -0,0 +1,257 @@
+# Project/tools/metrics.py
+
+
+"""
+    In process metrics (counters, histograms, callback gauges) rendered in
+    Prometheus text format.
+
+    Recording only takes a lock shared with few threads: each thread updates
+    one of `_SHARDS` cells picked from its identity, cells are only summed
+    when metrics are rendered (scrape).
+"""
+
+
+import bisect
+import threading
+
+from threading import get_ident
+
+# Static typing checking
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+
+__all__ = ['MetricsRegistry', 'Counter', 'Histogram', 'LATENCY_BUCKETS']
+
+
+# Seconds, from sub millisecond handlers to slow requests
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    pairs = ['{0}="{1}"'.format(name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Cells per metric, prime so aligned thread identities spread over all of them
+_SHARDS = 31
+# Lock of each shard, shared by every metric (uncontended unless two threads
+# land on the same shard)
+_LOCKS = [threading.Lock() for _ in range(_SHARDS)]
+
+
+class _Sharded(object):
+
+    """Fixed number of cells, a thread updates the one of its identity
+       under the lock of that shard, summed on read.
+
+       Cells do not depend on threads lifetime: greenlets (one identity each
+       under eventlet) come and go without growing metrics.
+    """
+
+    def __init__(self, size: int):
+        super().__init__()
+        self._size = size
+        self._cells = [[0] * size for _ in range(_SHARDS)]      # type: List[List[float]]
+
+    def _merged(self) -> List[float]:
+        total = [0] * self._size
+        for cell in self._cells:
+            for index, value in enumerate(cell):
+                total[index] += value
+        return total
+
+
+class Counter(_Sharded):
+
+    """Monotonic counter (one label set, see `func::MetricsRegistry.counter`)."""
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1) -> None:
+        shard = get_ident() % _SHARDS
+        with _LOCKS[shard]:
+            self._cells[shard][0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._merged()[0]
+
+
+class Histogram(_Sharded):
+
+    """Distribution of observed values in cumulative *buckets* (upper bounds)."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One cell per bucket, +Inf, then sum
+        super().__init__(len(self.buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        shard = get_ident() % _SHARDS
+        with _LOCKS[shard]:
+            cell = self._cells[shard]
+            cell[index] += 1
+            cell[-1] += value
+
+    def snapshot(self) -> Tuple[List[Tuple[float, int]], float, int]:
+        """Return ([(upper bound, cumulative count)...], sum, count)."""
+        merged = self._merged()
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), merged[:-1]):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative, merged[-1], running
+
+
+class _Family(object):
+
+    """Metric name with its children, one per label values."""
+
+    def __init__(self, name: str, doc: str, kind: str, labels: Sequence[str], factory: Callable[[], Any]):
+        super().__init__()
+        self.name = name
+        self.doc = doc
+        self.kind = kind
+        self.labelnames = tuple(labels)
+        self._factory = factory
+        self._children = {}         # type: Dict[Tuple[str, ...], Any]
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = factory()
+
+    def labels(self, *values: Any) -> Any:
+        """Child bound to label *values*, keep it to skip lookups on hot paths."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key, None)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError('{0} expects labels {1}'.format(self.name, self.labelnames))
+            with self._lock:
+                child = self._children.setdefault(key, self._factory())
+        return child
+
+    # No label metrics used as their only child
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def render(self) -> Iterable[str]:
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            if self.kind == 'counter':
+                yield '{0}{1} {2}'.format(self.name, _format_labels(self.labelnames, values),
+                                          _format_value(child.value))
+                continue
+            buckets, total, count = child.snapshot()
+            for bound, cumulative in buckets:
+                le = 'le="{0}"'.format(_format_value(bound))
+                yield '{0}_bucket{1} {2}'.format(self.name, _format_labels(self.labelnames, values, le),
+                                                 cumulative)
+            labels = _format_labels(self.labelnames, values)
+            yield '{0}_sum{1} {2}'.format(self.name, labels, _format_value(total))
+            yield '{0}_count{1} {2}'.format(self.name, labels, count)
+
+
+class _Callback(object):
+
+    """Value read from *callback* at scrape time (number, or dict label values -> number)."""
+
+    def __init__(self, name: str, doc: str, kind: str, labels: Sequence[str], callback: Callable[[], Any]):
+        super().__init__()
+        self.name = name
+        self.doc = doc
+        self.kind = kind
+        self.labelnames = tuple(labels)
+        self.callback = callback
+
+    def render(self) -> Iterable[str]:
+        try:
+            value = self.callback()
+        except Exception:
+            # A failing source must not break the whole scrape
+            return
+        if not self.labelnames:
+            yield '{0} {1}'.format(self.name, _format_value(value))
+            return
+        for values, number in sorted(value.items()):
+            values = values if isinstance(values, tuple) else (values,)
+            yield '{0}{1} {2}'.format(self.name, _format_labels(self.labelnames, values),
+                                      _format_value(number))
+
+
+class MetricsRegistry(object):
+
+    """
+        Named metrics of the process.
+          - counter / histogram: recorded by code, use `labels(...)` children
+          - gauge: *callback* read at scrape time (queue depth, hosts count...)
+          - render: Prometheus text exposition format (version 0.0.4)
+
+        Declaring an existing name returns the metric already declared.
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, prefix: str = ''):
+        super().__init__()
+        self.prefix = prefix
+        self._metrics = {}          # type: Dict[str, Any]
+        self._lock = threading.Lock()
+
+    def _declare(self, name: str, build: Callable[[str], Any]) -> Any:
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name, None)
+            if metric is None:
+                metric = self._metrics[name] = build(name)
+            return metric
+
+    def counter(self, name: str, doc: str, labels: Sequence[str] = ()) -> _Family:
+        return self._declare(name, lambda n: _Family(n, doc, 'counter', labels, Counter))
+
+    def histogram(self, name: str, doc: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> _Family:
+        return self._declare(name, lambda n: _Family(n, doc, 'histogram', labels,
+                                                     lambda: Histogram(buckets)))
+
+    def gauge(self, name: str, doc: str, callback: Callable[[], Any],
+              labels: Sequence[str] = (), kind: str = 'gauge') -> _Callback:
+        """Value computed by *callback* when rendered. *kind* may be
+           'counter' for totals kept elsewhere (e.g. queue drop counters).
+        """
+        metric = self._declare(name, lambda n: _Callback(n, doc, kind, labels, callback))
+        # Latest callback wins (e.g. a new server instance)
+        metric.callback = callback
+        return metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(self.prefix + name, None)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        for name, metric in metrics:
+            lines.append('# HELP {0} {1}'.format(name, metric.doc.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE {0} {1}'.format(name, metric.kind))
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,66 @@
+# Project/tools/raw_json.py
+
+
+"""
+    Drop-in replacement of :mod:`json` able to splice already encoded JSON.
+
+    Values wrapped in :class:`RawJSON` are written as is by :func:`dumps`
+    instead of being encoded again. Give this module to
+    :class:`flask_socketio.SocketIO` (``json`` option) to emit a payload
+    serialized once and shared by every emit.
+"""
+
+
+import json
+
+
+__all__ = ['RawJSON', 'dumps', 'loads']
+
+
+loads = json.loads
+
+
+class RawJSON(str):
+
+    """A str holding an already encoded JSON document."""
+
+    __slots__ = ()
+
+    @classmethod
+    def encode_from(cls, obj) -> 'RawJSON':
+        """Encode *obj* once (compact form) and keep the result."""
+        return cls(json.dumps(obj, separators=(',', ':')))
+
+    @classmethod
+    def compose(cls, obj) -> 'RawJSON':
+        """Encode *obj* (compact form) splicing its direct RawJSON values.
+
+           Use it to nest a RawJSON deeper than :func:`dumps` looks.
+        """
+        return cls(dumps(obj, separators=(',', ':')))
+
+
+def _contains_raw(values) -> bool:
+    for v in values:
+        if isinstance(v, RawJSON):
+            return True
+    return False
+
+
+def dumps(obj, **kwargs) -> str:
+    """Same as :func:`json.dumps` but write :class:`RawJSON` values verbatim.
+
+    Only lists, tuples and dicts directly holding a :class:`RawJSON` are
+    walked, everything else is delegated to :func:`json.dumps`.
+    """
+    if isinstance(obj, RawJSON):
+        return str(obj)
+
+    itemSep, keySep = kwargs.get('separators', None) or (', ', ': ')
+
+    if isinstance(obj, (list, tuple)) and _contains_raw(obj):
+        return '[' + itemSep.join(dumps(v, **kwargs) for v in obj) + ']'
+    elif isinstance(obj, dict) and _contains_raw(obj.values()):
+        return '{' + itemSep.join(json.dumps(str(k)) + keySep + dumps(v, **kwargs)
+                                  for k, v in obj.items()) + '}'
+    return json.dumps(obj, **kwargs)
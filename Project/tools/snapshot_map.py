@@ -0,0 +1,170 @@
+# Project/tools/snapshot_map.py
+
+
+"""
+    Immutable mapping with cheap copy on write, building block of
+    read-copy-update structures (see DataManager).
+"""
+
+
+# Static typing checking
+from typing import Any, Hashable, Iterator, Tuple
+
+
+__all__ = ['SnapshotMap']
+
+
+_WIDTH = 64
+_MASK = _WIDTH - 1
+_SHIFT = 6
+_EMPTY_NODE = [None] * _WIDTH
+
+
+class SnapshotMap(object):
+
+    """Mapping never modified once built: `func::set` and `func::delete`
+       return a new map sharing storage with the previous one, so readers
+       holding a map need no lock whatever writers do.
+
+       Up to SMALL entries are kept in a dict copied on each write. Larger
+       maps are a two level trie of *_WIDTH* slots nodes (indexed by key
+       hash) ending in small dicts: a write copies two nodes and one leaf,
+       about 130 slots up to a million keys, instead of the whole map.
+       Nodes are lists (faster to copy than tuples), never changed once
+       shared.
+
+       Iteration order is not insertion order.
+    """
+
+    __slots__ = ('_data', '_size')
+
+    # Entries above which a dict becomes a trie (back to dict under SMALL / 2)
+    SMALL = 64
+
+    def __init__(self, data: Any = None, size: int = 0):
+        """Empty map (*data* / *size* are internal)."""
+        super().__init__()
+        self._data = data if data is not None else {}
+        self._size = size
+
+    @classmethod
+    def from_items(cls, items) -> 'SnapshotMap':
+        result = cls()
+        for key, value in items:
+            result = result.set(key, value)
+        return result
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        data = self._data
+        if type(data) is dict:
+            return data.get(key, default)
+        h = hash(key)
+        node = data[h & _MASK]
+        if node is None:
+            return default
+        leaf = node[(h >> _SHIFT) & _MASK]
+        if leaf is None:
+            return default
+        return leaf.get(key, default)
+
+    def set(self, key: Hashable, value: Any) -> 'SnapshotMap':
+        """New map where *key* maps to *value*."""
+        data = self._data
+        if type(data) is dict:
+            data = dict(data)
+            data[key] = value
+            if len(data) <= SnapshotMap.SMALL:
+                return SnapshotMap(data, len(data))
+            # Grow into a trie
+            result = SnapshotMap(_EMPTY_NODE, 0)
+            for k, v in data.items():
+                result = result._set_trie(k, v)
+            return result
+        return self._set_trie(key, value)
+
+    def delete(self, key: Hashable) -> 'SnapshotMap':
+        """New map without *key* (same map if *key* is missing)."""
+        data = self._data
+        if type(data) is dict:
+            if key not in data:
+                return self
+            data = dict(data)
+            del data[key]
+            return SnapshotMap(data, len(data))
+
+        h = hash(key)
+        i, j = h & _MASK, (h >> _SHIFT) & _MASK
+        node = data[i]
+        leaf = node[j] if node is not None else None
+        if leaf is None or key not in leaf:
+            return self
+        if self._size - 1 < SnapshotMap.SMALL // 2:
+            # Shrink back to a dict
+            return SnapshotMap({k: v for k, v in self.items() if k != key}, self._size - 1)
+
+        leaf = dict(leaf)
+        del leaf[key]
+        node = _replace(node, j, leaf or None)
+        root = _replace(data, i, node if any(node) else None)
+        return SnapshotMap(root, self._size - 1)
+
+    def _set_trie(self, key: Hashable, value: Any) -> 'SnapshotMap':
+        data = self._data
+        h = hash(key)
+        i, j = h & _MASK, (h >> _SHIFT) & _MASK
+        node = data[i]
+        if node is None:
+            node = _EMPTY_NODE
+        leaf = node[j]
+        if leaf is None:
+            leaf = {key: value}
+            size = self._size + 1
+        else:
+            size = self._size if key in leaf else self._size + 1
+            leaf = dict(leaf)
+            leaf[key] = value
+        return SnapshotMap(_replace(data, i, _replace(node, j, leaf)), size)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        data = self._data
+        if type(data) is dict:
+            return iter(data.items())
+        return (item for node in data if node is not None
+                for leaf in node if leaf is not None
+                for item in leaf.items())
+
+    def keys(self) -> Iterator[Hashable]:
+        return (k for k, _ in self.items())
+
+    def values(self) -> Iterator[Any]:
+        data = self._data
+        if type(data) is dict:
+            return iter(data.values())
+        return (v for node in data if node is not None
+                for leaf in node if leaf is not None
+                for v in leaf.values())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return self.keys()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __repr__(self):
+        return 'SnapshotMap({0!r})'.format(dict(self.items()))
+
+
+_MISSING = object()
+
+
+def _replace(slots: list, index: int, value: Any) -> list:
+    """Copy of node *slots* where *index* is *value*."""
+    slots = slots[:]
+    slots[index] = value
+    return slots
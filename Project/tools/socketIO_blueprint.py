@@ -1,5 +1,7 @@
 # Project/tools/socketIO_blueprint.py
 
+import time
+
 
 class IOBlueprint:
 
@@ -13,15 +15,38 @@ class IOBlueprint:
             if not callable(wrappedFunc):
                 raise ValueError('Handle must wrap a callable')
 
-            def wrap(io):
+            def wrap(io, metrics=None):
+                if metrics is None:
+                    @io.on(key, namespace=self.namespace)
+                    def wrapped(*args, **kwargs):
+                        return wrappedFunc(*args, **kwargs)
+                    return io
+
+                # Children bound once, recording is cheap (see Project.tools.metrics)
+                calls = metrics.counter('socketio_events_total', 'Socket.io events handled',
+                                        ('event',)).labels(key)
+                errors = metrics.counter('socketio_event_errors_total', 'Socket.io handlers which raised',
+                                         ('event',)).labels(key)
+                latency = metrics.histogram('socketio_event_seconds', 'Socket.io handlers duration',
+                                            ('event',)).labels(key)
+
                 @io.on(key, namespace=self.namespace)
-                def wrapped(*args, **kwargs):
-                    return wrappedFunc(*args, **kwargs)
+                def timed(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return wrappedFunc(*args, **kwargs)
+                    except Exception:
+                        errors.inc()
+                        raise
+                    finally:
+                        calls.inc()
+                        latency.observe(time.perf_counter() - start)
                 return io
             self._handlers.append(wrap)
         return wrapper
 
-    def init_io(self, io):
+    def init_io(self, io, metrics=None):
+        """Register handlers on *io*, timed and counted in *metrics* (MetricsRegistry) if given."""
         for handler in self._handlers:
-            handler(io)
+            handler(io, metrics)
         return io
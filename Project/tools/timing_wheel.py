@@ -0,0 +1,105 @@
+# Project/tools/timing_wheel.py
+
+
+"""
+    Hashed timing wheel: many timers, O(1) schedule / cancel.
+"""
+
+
+import threading
+import time
+
+# Static typing checking
+from typing import Dict, Hashable, List, Optional, Set
+
+
+__all__ = ['TimingWheel']
+
+
+class TimingWheel(object):
+
+    """Expire keys after a delay, with a resolution of *tick* seconds.
+
+       Keys live in one of *slots* buckets (deadline tick modulo slots).
+       Each tick visits one bucket only, keys due in a later rotation stay
+       in it. Rescheduling a key (lease renewal) only updates its deadline,
+       the key moves to its new bucket when the old one is visited.
+
+       Cost: O(1) to schedule, reschedule or cancel. Advancing one tick
+       costs the size of one bucket, about len(wheel) / slots keys.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512):
+        super().__init__()
+        if tick <= 0 or slots <= 0:
+            raise ValueError('tick and slots must be positive')
+        self.tick = tick
+        self.slots = slots
+
+        self._buckets = [set() for _ in range(slots)]     # type: List[Set[Hashable]]
+        # key -> deadline tick
+        self._deadlines = dict()                          # type: Dict[Hashable, int]
+        self._start = time.monotonic()
+        # Last tick processed
+        self._current = 0
+        self._lock = threading.Lock()
+
+    def _tick_of(self, when: float) -> int:
+        return int((when - self._start) / self.tick)
+
+    def schedule(self, key: Hashable, delay: float, now: Optional[float] = None) -> None:
+        """Expire *key* in *delay* seconds (replace a previous deadline)."""
+        now = time.monotonic() if now is None else now
+        # Round up, a key never expires early
+        deadline = max(self._tick_of(now + delay) + 1, self._current + 1)
+        with self._lock:
+            previous = self._deadlines.get(key, None)
+            self._deadlines[key] = deadline
+            if previous is None or deadline < previous:
+                self._buckets[deadline % self.slots].add(key)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Forget *key*, its bucket entry is dropped when visited."""
+        with self._lock:
+            return self._deadlines.pop(key, None) is not None
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Process ticks elapsed until *now*, return expired keys."""
+        target = self._tick_of(time.monotonic() if now is None else now)
+        expired = []
+        with self._lock:
+            # Buckets are revisited every `slots` ticks, no need to walk more
+            first = max(self._current + 1, target - self.slots + 1)
+            for tick in range(first, target + 1):
+                bucket = self._buckets[tick % self.slots]
+                if not bucket:
+                    continue
+                keep = set()
+                for key in bucket:
+                    deadline = self._deadlines.get(key, None)
+                    if deadline is None:
+                        # Cancelled
+                        continue
+                    if deadline <= target:
+                        del self._deadlines[key]
+                        expired.append(key)
+                    elif deadline % self.slots == tick % self.slots:
+                        # Due in a later rotation
+                        keep.add(key)
+                    else:
+                        # Rescheduled since, move to its bucket
+                        self._buckets[deadline % self.slots].add(key)
+                self._buckets[tick % self.slots] = keep
+            self._current = max(self._current, target)
+        return expired
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """Monotonic time *key* expires at (None if not scheduled)."""
+        tick = self._deadlines.get(key, None)
+        return None if tick is None else self._start + tick * self.tick
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
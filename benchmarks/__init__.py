@@ -0,0 +1,7 @@
+# benchmarks/__init__.py
+
+"""
+    Standalone benchmarks. Run them from the project root, e.g.
+
+        python -m benchmarks.registry
+"""
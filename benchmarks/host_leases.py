@@ -0,0 +1,87 @@
+# benchmarks/host_leases.py
+
+"""
+    Lease expiry: timing wheel against a scan of every lease per tick.
+
+    *leases* leases of 60 to 120 seconds are created, 5% of them are renewed
+    each tick (heartbeats), then one tick is processed per simulated second
+    until every lease expired. Reported per method: microseconds per tick
+    (mean and worst) and per renewal.
+
+        python -m benchmarks.host_leases [--leases 100000] [--ticks 150]
+"""
+
+import argparse
+import random
+import time
+
+from Project.tools.timing_wheel import TimingWheel
+
+
+class ScanLeases(object):
+
+    """Former approach: deadline per key, every deadline checked each tick."""
+
+    def __init__(self):
+        self._start = time.monotonic()
+        self._deadlines = {}
+
+    def schedule(self, key, delay, now=None):
+        self._deadlines[key] = (time.monotonic() if now is None else now) + delay
+
+    def advance(self, now=None):
+        now = time.monotonic() if now is None else now
+        expired = [k for k, deadline in self._deadlines.items() if deadline <= now]
+        for key in expired:
+            del self._deadlines[key]
+        return expired
+
+
+def run(factory, leases: int, ticks: int, seed: int) -> dict:
+    rand = random.Random(seed)
+    store = factory()
+    start = store._start
+    for key in range(leases):
+        store.schedule(key, rand.uniform(60, 120), now=start)
+
+    tickSeconds, worst, renewSeconds, renewed, expired = 0.0, 0.0, 0.0, 0, 0
+    alive = list(range(leases))
+    for tick in range(1, ticks + 1):
+        now = start + tick
+        # Heartbeats, alive keys only
+        beats = rand.sample(alive, min(len(alive), leases // 20)) if tick < ticks // 2 else []
+        begin = time.perf_counter()
+        for key in beats:
+            store.schedule(key, 60, now=now)
+        renewSeconds += time.perf_counter() - begin
+        renewed += len(beats)
+
+        begin = time.perf_counter()
+        gone = store.advance(now)
+        spent = time.perf_counter() - begin
+        tickSeconds += spent
+        worst = max(worst, spent)
+        expired += len(gone)
+        if gone:
+            gone = set(gone)
+            alive = [k for k in alive if k not in gone]
+
+    return {'method': factory.__name__,
+            'tick_us': tickSeconds * 1e6 / ticks,
+            'worst_us': worst * 1e6,
+            'renew_us': renewSeconds * 1e6 / max(renewed, 1),
+            'expired': expired}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leases', type=int, default=100000)
+    parser.add_argument('--ticks', type=int, default=150)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print('{0:>12} {1:>10} {2:>10} {3:>9} {4:>8}'.format('method', 'us/tick', 'worst us', 'us/renew', 'expired'))
+    for factory in (ScanLeases, TimingWheel):
+        res = run(factory, args.leases, args.ticks, args.seed)
+        print('{method:>12} {tick_us:>10.0f} {worst_us:>10.0f} {renew_us:>9.2f} {expired:>8}'.format(**res))
@@ -0,0 +1,95 @@
+# benchmarks/host_memory.py
+
+"""
+    Bytes retained per host: :class:`Host` (slots, interned user_infos)
+    against the former layout (instance dict holding two free-form dicts).
+
+    Hosts are built from freshly decoded JSON like OnAddHost does, so repeated
+    strings are distinct objects unless interned.
+
+        python -m benchmarks.host_memory [--sizes 10000 100000]
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from Project.server.data import Host
+
+
+class DictHost(object):
+
+    """Former Host layout, kept here as reference."""
+
+    def __init__(self, ip_address, unreal_name, host_name, client_ID):
+        super().__init__()
+        self.user_infos = {}
+        self.session_infos = {}
+        self.ipAddress = ip_address
+        self.unrealName = unreal_name
+        self.hostName = host_name
+        self.client_ID = client_ID
+
+    @classmethod
+    def from_dict(cls, hostMap: dict, clientID: str):
+        defaultKeys = ('ipAddress', 'unrealName', 'hostName')
+        newHost = cls(hostMap['ipAddress'],
+                      hostMap['unrealName'],
+                      hostMap['hostName'], clientID)
+        for k, v in hostMap.items():
+            if (k in defaultKeys):
+                continue
+            elif (k in Host._SESSION_KEYS):
+                newHost.session_infos[k] = v
+            else:
+                newHost.user_infos[k] = v
+        return newHost
+
+
+def payload(index: int) -> str:
+    return json.dumps({
+        'ipAddress': '82.64.{0}.{1}'.format(index // 256 % 256, index % 256),
+        'unrealName': 'DESKTOP-{0:06d}'.format(index),
+        'hostName': 'Player_{0}'.format(index),
+        'OwningUserName': 'Player_{0}'.format(index),
+        'OwningUserId': '{0:032x}'.format(index),
+        'BuildUniqueId': 4242,
+        'NumOpenPrivateConnections': 0,
+        'NumPrivateConnections': 0,
+        'NumOpenPublicConnections': index % 8,
+        'NumPublicConnections': 8,
+        'bAllowJoinInProgress': True,
+        'bIsLANMatch': False,
+        'SessionId': '{0:032X}'.format(index),
+        'HostAddr': '192.168.1.{0}:7777'.format(index % 256),
+        'MapName': 'Desert',
+        'GameMode': 'Deathmatch',
+        'Region': 'EU',
+    })
+
+
+def bytes_per_host(cls, size: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    hosts = [cls.from_dict(json.loads(payload(i)), 'sid_{0:020d}'.format(i))
+             for i in range(size)]
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del hosts
+    return retained / size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print('{0:>8} {1:>12} {2:>12} {3:>8}'.format('hosts', 'former (B)', 'Host (B)', 'ratio'))
+    for size in args.sizes:
+        former = bytes_per_host(DictHost, size)
+        compact = bytes_per_host(Host, size)
+        print('{0:>8} {1:>12.0f} {2:>12.0f} {3:>8.2f}'.format(size, former, compact, compact / former))
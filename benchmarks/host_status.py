@@ -0,0 +1,77 @@
+# benchmarks/host_status.py
+
+"""
+    Server cost of refreshing the open slots of a host.
+
+      - socketio: OnUpdateHostConnection packet decoded as socket.io does
+        ('42' + JSON array), registry updated, OnUpdateHostSucceeded
+        acknowledgement encoded
+      - status: STATUS datagram decoded (see wire), registry updated through
+        the status token, STATUS_REPLY encoded
+
+    Every host is updated in turn, its open public slots alternating
+    between 4 and 3 (registry version bumped each time). Sockets are left
+    out: both paths then add one receive and one send, engine.io framing
+    and the websocket frame are not counted either.
+
+        python -m benchmarks.host_status [--hosts 5000] [--updates 100000]
+"""
+
+import argparse
+import json
+
+from benchmarks.registry import make_host, timed
+from Project.server.data import DataManager
+from Project.server.hole_punching import wire
+
+
+def socketio_update(manager: DataManager):
+    def update(item):
+        clientID, packet = item
+        event, data = json.loads(packet[2:])
+        if manager.set_open_connections(clientID, data.get('NumOpenPrivateConnections', None),
+                                        data.get('NumOpenPublicConnections', None)):
+            return '42' + json.dumps(['OnUpdateHostSucceeded', data])
+        return '42' + json.dumps(['OnUpdateHostFailed', data])
+    return update
+
+
+def status_update(manager: DataManager):
+    def update(datagram):
+        token, openPrivate, openPublic = wire.decode_status(datagram)
+        if manager.update_host_status(token, openPrivate, openPublic):
+            return wire.encode_status_reply(wire.STATUS_UPDATED)
+        return wire.encode_status_reply(wire.STATUS_UNKNOWN)
+    return update
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=5000)
+    parser.add_argument('--updates', type=int, default=100000)
+    args = parser.parse_args()
+
+    manager = DataManager()
+    tokens = []
+    for i in range(args.hosts):
+        host = make_host(i)
+        manager.add_host(host)
+        tokens.append((host.client_ID, manager.issue_status_token(host.client_ID)))
+
+    packets, datagrams = [], []
+    for i in range(args.updates):
+        clientID, token = tokens[i % len(tokens)]
+        openPublic = 4 - (i // len(tokens)) % 2
+        packets.append((clientID, '42' + json.dumps([
+            'OnUpdateHostConnection', {'NumOpenPrivateConnections': 0,
+                                       'NumOpenPublicConnections': openPublic}])))
+        datagrams.append(wire.encode_status(token, 0, openPublic))
+
+    print('{0:>10} {1:>10} {2:>8} {3:>8}'.format('path', 'us / upd', 'bytes', 'changes'))
+    for name, func, items, size in (
+            ('socketio', socketio_update(manager), packets, len(packets[0][1])),
+            ('status', status_update(manager), datagrams, len(datagrams[0]))):
+        before = manager.version
+        cost = timed(func, items)
+        print('{0:>10} {1:>10.2f} {2:>8} {3:>8}'.format(name, cost, size, manager.version - before))
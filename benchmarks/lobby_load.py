@@ -0,0 +1,363 @@
+# benchmarks/lobby_load.py
+
+"""
+    Socket.io lobby under load: hosts registration and browsing.
+
+    The application from create_app('testing') runs in a child process
+    (eventlet). For each host count, host connections are added until the
+    registry holds that many hosts (OnAddHost), then browsing clients time
+    round trips over real websocket connections:
+
+        ask_all    OnAskHosts ''               -> OnHostsList
+        ask_page   OnAskHosts {'limit': 50}    -> OnHostsPage
+        ask_delta  OnAskHosts {'since': v, 'epoch': e} -> OnHostsDelta
+        update     OnUpdateHostConnection      -> OnUpdateHostSucceeded (from hosts)
+
+    Server side, per step: CPU time per request and resident memory (/proc,
+    Linux), mean handler time per event (/metrics). Registry and encoding
+    costs at the same host count are timed in this process, so the columns
+    show which one bends the curve:
+
+        snapshot   rebuild of the encoded hosts list after a change
+        page       query_hosts of one 50 hosts page
+        encode     socket.io packet of the hosts list
+
+    Needs the python-socketio client (websocket-client package).
+
+        python -m benchmarks.lobby_load [--hosts 100 500 1000 2000] [--browsers 8]
+                                        [--requests 20] [--pools 4] [-o result.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+
+# Static typing checking
+from typing import Any, Dict, List, Optional
+
+from benchmarks.registry import make_host
+from benchmarks.udp_engines import free_port
+
+
+EVENT_TIMEOUT = 10.0
+
+
+def _serve(port: int) -> None:
+    """Body of the server process."""
+    from Project.server import create_app
+    app, socketio, udpServer = create_app('testing')
+    try:
+        socketio.run(app, host='127.0.0.1', port=port, log_output=False)
+    finally:
+        udpServer.stop()
+
+
+def host_payload(index: int) -> Dict[str, Any]:
+    return {'unrealName': 'Unreal_{0}'.format(index), 'hostName': 'Player_{0}'.format(index),
+            'SessionId': 'session_{0}'.format(index), 'BuildUniqueId': index % 4,
+            'NumOpenPublicConnections': 4, 'NumOpenPrivateConnections': 0,
+            'NumPublicConnections': 4, 'NumPrivateConnections': 0,
+            'bAllowJoinInProgress': True, 'OwningUserName': 'Player_{0}'.format(index)}
+
+
+class Peer(object):
+
+    """A websocket connection waiting for one reply event at a time."""
+
+    def __init__(self, url: str, events: List[str]):
+        import socketio
+
+        super().__init__()
+        self._replies = queue.Queue()       # type: queue.Queue
+        self.sio = socketio.Client(reconnection=False)
+        for event in events:
+            self.sio.on(event, self._receiver(event))
+        self.sio.connect(url, transports=['websocket'])
+
+    def _receiver(self, event: str):
+        def receive(data=None):
+            self._replies.put((event, data))
+        return receive
+
+    def request(self, event: str, payload: Any, expected: str) -> Optional[Dict[str, Any]]:
+        """Round trip of *event*, None if *expected* did not come back in time."""
+        start = time.perf_counter()
+        self.sio.emit(event, payload)
+        try:
+            reply, data = self._replies.get(timeout=EVENT_TIMEOUT)
+        except queue.Empty:
+            return None
+        seconds = time.perf_counter() - start
+        if reply != expected:
+            return None
+        return {'seconds': seconds, 'data': data}
+
+    def close(self) -> None:
+        self.sio.disconnect()
+
+
+def _host_pool(url: str, commands: Any) -> None:
+    """Body of a process owning host connections, driven through *commands* (Pipe)."""
+    hosts = []      # type: List[Peer]
+    while True:
+        command, arg = commands.recv()
+        if command == 'add':
+            for index in arg:
+                peer = Peer(url, ['OnUpdateHostSucceeded', 'OnUpdateHostFailed'])
+                peer.sio.emit('OnAddHost', host_payload(index))
+                hosts.append(peer)
+            commands.send(len(hosts))
+        elif command == 'update':
+            seconds, failed = [], 0
+            for peer in hosts[:arg]:
+                result = peer.request('OnUpdateHostConnection',
+                                      {'NumOpenPublicConnections': 3, 'NumOpenPrivateConnections': 0},
+                                      'OnUpdateHostSucceeded')
+                if result is None:
+                    failed += 1
+                else:
+                    seconds.append(result['seconds'])
+            commands.send((seconds, failed))
+        elif command == 'stop':
+            start = time.perf_counter()
+            for peer in hosts:
+                peer.sio.emit('OnRemoveHost', '')
+                peer.close()
+            commands.send(time.perf_counter() - start)
+            return
+
+
+def process_stats(pid: int) -> Dict[str, float]:
+    """CPU seconds and resident MB of *pid* (empty if /proc is missing)."""
+    try:
+        with open('/proc/{0}/stat'.format(pid)) as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/{0}/status'.format(pid)) as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    except (OSError, StopIteration):
+        return {}
+    ticks = os.sysconf('SC_CLK_TCK')
+    return {'cpu': (int(fields[11]) + int(fields[12])) / ticks, 'rss_mb': rss / 1024.0}
+
+
+_SAMPLE = re.compile(r'^destruck_(\w+?)(?:\{event="(\w+)"\})? ([0-9.eE+-]+)$')
+
+
+def scrape(url: str) -> Dict[str, float]:
+    """Flat view of /metrics: 'hosts', 'socketio_event_seconds_sum:OnAskHosts'..."""
+    with urllib.request.urlopen(url + '/metrics', timeout=EVENT_TIMEOUT) as response:
+        text = response.read().decode('utf-8')
+    result = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            name, event, value = match.groups()
+            result[name + (':' + event if event else '')] = float(value)
+    return result
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] * 1e3
+
+
+def offline_costs(count: int, repeat: int = 20) -> Dict[str, float]:
+    """Registry and encoding costs (ms) with *count* hosts, in this process."""
+    from Project.server.data import DataManager, HostQuery
+    from Project.tools import raw_json
+
+    container = DataManager()
+    for index in range(count):
+        container.add_host(make_host(index))
+    target = make_host(0)
+
+    snapshot = encode = page = 0.0
+    for _ in range(repeat):
+        # A change invalidates the cached snapshot
+        container.update_open_connections(target)
+        start = time.perf_counter()
+        hosts = container.hosts_snapshot()
+        snapshot += time.perf_counter() - start
+
+        start = time.perf_counter()
+        raw_json.dumps(['OnHostsList', hosts])
+        encode += time.perf_counter() - start
+
+        start = time.perf_counter()
+        container.query_hosts(HostQuery(limit=50))
+        page += time.perf_counter() - start
+    return {'snapshot_ms': snapshot * 1e3 / repeat, 'encode_ms': encode * 1e3 / repeat,
+            'page_ms': page * 1e3 / repeat, 'payload_kb': len(hosts) / 1024.0}
+
+
+def measure(browsers: List[Peer], requests: int, since: int, epoch: str) -> Dict[str, List[float]]:
+    """Every browser sends *requests* of each kind concurrently."""
+    kinds = {'ask_all': ('', 'OnHostsList'),
+             'ask_page': ({'limit': 50}, 'OnHostsPage'),
+             'ask_delta': ({'since': since, 'epoch': epoch}, 'OnHostsDelta')}
+    samples = {kind: [] for kind in kinds}      # type: Dict[str, List[float]]
+    failures = {kind: 0 for kind in kinds}
+    lock = threading.Lock()
+
+    def browse(peer: Peer) -> None:
+        for _ in range(requests):
+            for kind, (payload, expected) in kinds.items():
+                result = peer.request('OnAskHosts', payload, expected)
+                with lock:
+                    if result is None:
+                        failures[kind] += 1
+                    else:
+                        samples[kind].append(result['seconds'])
+
+    threads = [threading.Thread(target=browse, args=(peer,)) for peer in browsers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    samples['failures'] = failures
+    return samples
+
+
+def run(steps: List[int], browserCount: int, requests: int, pools: int) -> List[Dict[str, Any]]:
+    port = free_port()
+    url = 'http://127.0.0.1:{0}'.format(port)
+    context = multiprocessing.get_context('spawn')
+    server = context.Process(target=_serve, args=(port,), daemon=True)
+    server.start()
+
+    # Wait for the HTTP side
+    deadline = time.time() + 30
+    while True:
+        try:
+            scrape(url)
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise RuntimeError('Server did not start')
+            time.sleep(0.2)
+
+    pipes = []
+    for _ in range(pools):
+        parent, child = context.Pipe()
+        context.Process(target=_host_pool, args=(url, child), daemon=True).start()
+        pipes.append(parent)
+
+    browsers = [Peer(url, ['OnHostsList', 'OnHostsPage', 'OnHostsDelta', 'OnAskHostsFailed'])
+                for _ in range(browserCount)]
+    # Registry epoch, given with every delta
+    epoch = browsers[0].request('OnAskHosts', {'since': 0, 'epoch': ''}, 'OnHostsDelta')['data']['epoch']
+    results = []
+    registered = 0
+    try:
+        for target in steps:
+            # Spread new hosts over pools then wait for the registry
+            start = time.perf_counter()
+            indexes = list(range(registered, target))
+            for position, pipe in enumerate(pipes):
+                pipe.send(('add', indexes[position::pools]))
+            for pipe in pipes:
+                pipe.recv()
+            while scrape(url).get('hosts', 0) < target:
+                time.sleep(0.05)
+            addSeconds = time.perf_counter() - start
+            registered = target
+
+            before = scrape(url)
+            usage = process_stats(server.pid)
+            start = time.perf_counter()
+            samples = measure(browsers, requests, int(before.get('registry_version', 0)) - 1, epoch)
+            for pipe in pipes:
+                pipe.send(('update', max(1, requests * browserCount // pools)))
+            updates, updateFailures = [], 0
+            for pipe in pipes:
+                seconds, failed = pipe.recv()
+                updates.extend(seconds)
+                updateFailures += failed
+            elapsed = time.perf_counter() - start
+            after = scrape(url)
+            usageAfter = process_stats(server.pid)
+
+            handled = sum(len(v) for k, v in samples.items() if k != 'failures') + len(updates)
+            row = {'hosts': target,
+                   'add_hosts_per_s': len(indexes) / addSeconds if indexes else 0.0,
+                   'requests_per_s': handled / elapsed,
+                   'failures': dict(samples['failures'], update=updateFailures)}
+            for kind in ('ask_all', 'ask_page', 'ask_delta'):
+                row[kind + '_p50_ms'] = percentile(samples[kind], 0.50)
+                row[kind + '_p99_ms'] = percentile(samples[kind], 0.99)
+            row['update_p50_ms'] = percentile(updates, 0.50)
+            row['update_p99_ms'] = percentile(updates, 0.99)
+            # Server side handler time (includes packet encoding)
+            for event in ('OnAskHosts', 'OnUpdateHostConnection'):
+                count = (after.get('socketio_event_seconds_count:' + event, 0) -
+                         before.get('socketio_event_seconds_count:' + event, 0))
+                total = (after.get('socketio_event_seconds_sum:' + event, 0) -
+                         before.get('socketio_event_seconds_sum:' + event, 0))
+                row[event + '_handler_ms'] = total * 1e3 / count if count else float('nan')
+            if usage and usageAfter:
+                row['server_cpu_ms_per_request'] = (usageAfter['cpu'] - usage['cpu']) * 1e3 / max(handled, 1)
+                row['server_rss_mb'] = usageAfter['rss_mb']
+            row.update(offline_costs(target))
+            results.append(row)
+            print_row(row, header=len(results) == 1)
+
+        # Disconnect storm
+        start = time.perf_counter()
+        for pipe in pipes:
+            pipe.send(('stop', None))
+        for pipe in pipes:
+            pipe.recv()
+        results.append({'disconnect_all_s': time.perf_counter() - start})
+    finally:
+        for peer in browsers:
+            peer.close()
+        server.terminate()
+        server.join(10)
+    return results
+
+
+COLUMNS = (('hosts', '{:>7}'), ('ask_all_p50_ms', '{:>9.2f}'), ('ask_all_p99_ms', '{:>9.2f}'),
+           ('ask_page_p50_ms', '{:>9.2f}'), ('ask_delta_p50_ms', '{:>9.2f}'), ('update_p50_ms', '{:>9.2f}'),
+           ('OnAskHosts_handler_ms', '{:>9.3f}'), ('server_cpu_ms_per_request', '{:>9.3f}'),
+           ('server_rss_mb', '{:>8.1f}'), ('snapshot_ms', '{:>9.3f}'), ('page_ms', '{:>8.3f}'),
+           ('encode_ms', '{:>8.3f}'), ('payload_kb', '{:>8.1f}'))
+HEADERS = ('hosts', 'all p50', 'all p99', 'page p50', 'delta p50', 'upd p50',
+           'ask srv', 'cpu/req', 'rss MB', 'snapshot', 'page', 'encode', 'kB')
+
+
+def print_row(row: Dict[str, Any], header: bool = False) -> None:
+    columns = [(name, key, fmt) for name, (key, fmt) in zip(HEADERS, COLUMNS) if key in row]
+    if header:
+        print(' '.join('{0:>{1}}'.format(name, len(fmt.format(0))) for name, _, fmt in columns))
+    print(' '.join(fmt.format(row[key]) for _, key, fmt in columns))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, nargs='+', default=[100, 500, 1000, 2000])
+    parser.add_argument('--browsers', type=int, default=8, help='browsing connections')
+    parser.add_argument('--requests', type=int, default=20, help='requests of each kind per browser and step')
+    parser.add_argument('--pools', type=int, default=4, help='processes owning host connections')
+    parser.add_argument('--offline', action='store_true', help='only registry / encoding costs')
+    parser.add_argument('-o', '--output', default='', help='JSON result file')
+    args = parser.parse_args()
+
+    if args.offline:
+        rows = []
+        for count in args.hosts:
+            rows.append(dict(offline_costs(count), hosts=count))
+            print_row(rows[-1], header=len(rows) == 1)
+    else:
+        rows = run(sorted(args.hosts), args.browsers, args.requests, args.pools)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
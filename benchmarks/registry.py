@@ -0,0 +1,89 @@
+# benchmarks/registry.py
+
+"""
+    Per-operation cost of :class:`DataManager` host registry.
+
+    For each population size the registry is filled with fake hosts then
+    add / lookup / update / remove are timed on a fixed number of operations.
+    Cost per operation should stay flat from 100 to 100k hosts.
+
+        python -m benchmarks.registry [--sizes 100 1000 10000 100000] [--ops 2000]
+"""
+
+import argparse
+import gc
+import time
+
+from Project.server.data import DataManager, Host, HostQuery
+
+
+def make_host(index: int) -> Host:
+    host = Host('10.0.{0}.{1}'.format(index // 256 % 256, index % 256),
+                'Unreal_{0}'.format(index), 'Player_{0}'.format(index),
+                'sid_{0}'.format(index))
+    host.add_session_info('SessionId', 'session_{0}'.format(index))
+    host.add_session_info('BuildUniqueId', index % 4)
+    host.add_session_info('NumOpenPrivateConnections', 0)
+    host.add_session_info('NumOpenPublicConnections', 4)
+    return host
+
+
+def timed(func, items) -> float:
+    """Return mean cost in micro seconds of *func* applied to *items*."""
+    # Keep garbage collector pauses out of the measure
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        return (time.perf_counter() - start) * 1e6 / len(items)
+    finally:
+        gc.enable()
+
+
+def run(size: int, ops: int) -> dict:
+    manager = DataManager()
+    for i in range(size):
+        manager.add_host(make_host(i))
+
+    # New hosts appended past the current population
+    extra = [make_host(size + i) for i in range(ops)]
+    extraIDs = [h.client_ID for h in extra]
+    updates = []
+    for h in extra:
+        newData = make_host(int(h.client_ID[4:]))
+        newData.add_session_info('NumOpenPublicConnections', 3)
+        updates.append(newData)
+
+    result = dict(size=size)
+    result['add'] = timed(manager.add_host, extra)
+    result['get'] = timed(manager.get_host, extraIDs)
+    result['by_name'] = timed(manager.get_hosts_by_name, [h.hostName for h in extra])
+    result['by_session'] = timed(manager.get_host_by_session,
+                                 [h.get_session_info('SessionId') for h in extra])
+    result['update'] = timed(manager.update_open_connections, updates)
+    result['remove_ID'] = timed(manager.remove_host_by_ID, extraIDs)
+    assert len(manager) == size
+
+    # Pages of 20 hosts, result set sorted once (first call) then reused
+    query = HostQuery.from_dict({'filters': {'BuildUniqueId': 1,
+                                             'NumOpenPublicConnections': {'gt': 0}},
+                                 'sort': 'hostName', 'limit': 20})
+    manager.query_hosts(query)
+    result['query_page'] = timed(manager.query_hosts, [query] * ops)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+
+    columns = ('add', 'get', 'by_name', 'by_session', 'update', 'remove_ID', 'query_page')
+    print('{0:>8} '.format('hosts') + ' '.join('{0:>10}'.format(c) for c in columns) + '  (us / op)')
+    for size in args.sizes:
+        res = run(size, args.ops)
+        print('{0:>8} '.format(size) + ' '.join('{0:>10.3f}'.format(res[c]) for c in columns))
@@ -0,0 +1,118 @@
+# benchmarks/registry_rcu.py
+
+"""
+    Hosts registry under mixed thread and greenlet load, as in the server:
+    socket.io handlers run on eventlet greenlets while the UDP server
+    updates hosts from OS threads.
+
+      - --writers OS threads refresh open slots of random hosts (status
+        tokens) and every --churn writes remove then add a host again
+      - --readers greenlets of the main thread loop over registry reads
+        (get_host, query_hosts, changes_since, hosts_snapshot), yielding to
+        each other between two reads
+
+    Reports writes per second, read latency percentiles per kind of read
+    and reads which raised (a reader seeing a registry half way through a
+    mutation).
+
+        python -m benchmarks.registry_rcu [--hosts 5000] [--writers 2] [--readers 50] [--duration 5]
+"""
+
+import argparse
+import random
+import threading
+import time
+
+import eventlet
+
+from benchmarks.lobby_load import percentile
+from benchmarks.registry import make_host
+from Project.server.data import DataManager, HostQuery
+
+
+READS = ('get_host', 'query_hosts', 'changes_since', 'hosts_snapshot')
+
+
+def writer(manager: DataManager, tokens: list, churn: int, stop: threading.Event, counts: list) -> None:
+    rand = random.Random()
+    writes = 0
+    while not stop.is_set():
+        index = rand.randrange(len(tokens))
+        if churn and writes % churn == 0:
+            clientID = 'sid_{0}'.format(index)
+            manager.remove_host_by_ID(clientID)
+            manager.add_host(make_host(index))
+            tokens[index] = manager.issue_status_token(clientID)
+            writes += 2
+        elif manager.update_host_status(tokens[index], rand.randrange(2), rand.randrange(5)):
+            writes += 1
+    counts.append(writes)
+
+
+def reader(manager: DataManager, hosts: int, end: float, latencies: dict, errors: list) -> None:
+    rand = random.Random()
+    query = HostQuery.from_dict({'filters': {'BuildUniqueId': 1, 'NumOpenPublicConnections': {'gt': 0}},
+                                 'sort': 'hostName', 'limit': 20})
+    while time.perf_counter() < end:
+        kind = rand.choice(READS)
+        start = time.perf_counter()
+        try:
+            if kind == 'get_host':
+                manager.get_host('sid_{0}'.format(rand.randrange(hosts)))
+            elif kind == 'query_hosts':
+                manager.query_hosts(query)
+            elif kind == 'changes_since':
+                manager.changes_since(max(manager.version - 50, 0), manager.epoch)
+            else:
+                manager.hosts_snapshot()
+        except Exception as err:
+            errors.append(repr(err))
+        latencies[kind].append(time.perf_counter() - start)
+        # Let other greenlets run, as a socket.io handler would between events
+        eventlet.sleep(0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=5000)
+    parser.add_argument('--writers', type=int, default=2, help='writer OS threads')
+    parser.add_argument('--readers', type=int, default=50, help='reader greenlets')
+    parser.add_argument('--churn', type=int, default=50, help='writes between a host removal / addition, 0 never')
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    manager = DataManager()
+    tokens = []
+    for i in range(args.hosts):
+        manager.add_host(make_host(i))
+        tokens.append(manager.issue_status_token('sid_{0}'.format(i)))
+
+    stop = threading.Event()
+    counts = []
+    threads = [threading.Thread(target=writer, args=(manager, tokens, args.churn, stop, counts))
+               for _ in range(args.writers)]
+    latencies = {kind: [] for kind in READS}
+    errors = []
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    pool = eventlet.GreenPool(args.readers)
+    for _ in range(args.readers):
+        pool.spawn(reader, manager, args.hosts, start + args.duration, latencies, errors)
+    pool.waitall()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print('{0} hosts, {1} writer threads, {2} reader greenlets, {3:.1f} s'.format(
+        args.hosts, args.writers, args.readers, elapsed))
+    print('writes {0:.0f} / s, registry version {1}'.format(sum(counts) / elapsed, manager.version))
+    print('{0:>15} {1:>9} {2:>9} {3:>9}'.format('read', 'count', 'p50 ms', 'p99 ms'))
+    for kind in READS:
+        print('{0:>15} {1:>9} {2:>9.3f} {3:>9.3f}'.format(kind, len(latencies[kind]),
+                                                          percentile(latencies[kind], 0.5),
+                                                          percentile(latencies[kind], 0.99)))
+    print('reads failed: {0}{1}'.format(len(errors), ' ({0})'.format(errors[0]) if errors else ''))
@@ -0,0 +1,90 @@
+# benchmarks/reply_encoding.py
+
+"""
+    Reply construction cost: former dict + json.dumps + concatenation
+    against pre-encoded replies and FString templates.
+
+        python -m benchmarks.reply_encoding [--count 200000]
+"""
+
+import argparse
+import json
+import timeit
+
+from Project.server.hole_punching import DestruckUDPServer
+from Project.server.hole_punching.fstring import json_string
+
+
+CLIENT = ('203.0.113.7', 61000)
+HOST = ('198.51.100.20', 7777)
+
+
+def legacy_fstring(msg: str) -> bytes:
+    """Former `DestruckUDPServer.serialized_str`."""
+    msg_string = msg.encode('utf-8')
+    msg_bytes = len(msg_string).to_bytes(4, byteorder='big')
+    msg_bytes += msg_string
+    return msg_bytes
+
+
+def legacy_received() -> bytes:
+    msg_dict = {}
+    msg_dict['Msg'] = 'Message received !'
+    msg_dict['Origin'] = 'UDPServer'
+    return legacy_fstring(json.dumps(msg_dict))
+
+
+def legacy_register() -> bytes:
+    msg = {}
+    msg['IP'] = CLIENT[0]
+    msg['Port'] = CLIENT[1]
+    msg['Origin'] = 'UDPServer'
+    msg['Request'] = 'Register'
+    msg['Binary'] = 1
+    return legacy_fstring(json.dumps(msg))
+
+
+def legacy_join() -> bytes:
+    msg = {}
+    msg['Request'] = 'Join'
+    msg['IP'] = CLIENT[0]
+    msg['Port'] = CLIENT[1]
+    msg['HostIP'] = HOST[0]
+    msg['HostPort'] = HOST[1]
+    msg['Origin'] = 'UDPServer'
+    return legacy_fstring(json.dumps(msg))
+
+
+def make_current():
+    server = DestruckUDPServer()
+    server._sock.close()
+    received = server._receivedReply
+
+    def current_received() -> bytes:
+        return received
+
+    def current_register() -> bytes:
+        return DestruckUDPServer.REGISTER_REPLY.render(CLIENT[0].encode('ascii'), CLIENT[1])
+
+    def current_join() -> bytes:
+        return DestruckUDPServer.JOIN_REPLY.render(CLIENT[0].encode('ascii'), CLIENT[1],
+                                                   json_string(HOST[0]), HOST[1])
+
+    return current_received, current_register, current_join
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200000)
+    args = parser.parse_args()
+
+    print('{0:>10} {1:>10} {2:>10} {3:>8}'.format('reply', 'before us', 'after us', 'speedup'))
+    pairs = zip(('received', 'register', 'join'),
+                (legacy_received, legacy_register, legacy_join), make_current())
+    for name, before, after in pairs:
+        # Same bytes on the wire
+        assert before() == after(), name
+        beforeUs = timeit.timeit(before, number=args.count) * 1e6 / args.count
+        afterUs = timeit.timeit(after, number=args.count) * 1e6 / args.count
+        print('{0:>10} {1:>10.2f} {2:>10.2f} {3:>7.1f}x'.format(name, beforeUs, afterUs, beforeUs / afterUs))
@@ -0,0 +1,106 @@
+# benchmarks/udp_engines.py
+
+"""
+    Threaded against asyncio rendezvous engine.
+
+    A client process keeps *window* Register requests in flight against a
+    local server and counts replies. Reported per engine: replies per second,
+    server CPU time and context switches (server process only, context
+    switches need the Unix only resource module).
+
+        python -m benchmarks.udp_engines [--count 50000] [--window 64]
+"""
+
+import argparse
+import json
+import multiprocessing
+import socket
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows: CPU time from time.process_time, no context switches
+    resource = None
+
+from Project.server.hole_punching import DestruckUDPServer, AsyncDestruckUDPServer
+
+
+REGISTER = json.dumps({'Origin': 'Host', 'Request': 'Register'}).encode()
+REGISTER = len(REGISTER).to_bytes(4, byteorder='big') + REGISTER
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def flood(port: int, count: int, window: int, result) -> None:
+    """Send *count* requests keeping *window* in flight, store (replies, seconds)."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(0.5)
+        server = ('127.0.0.1', port)
+        sent = received = 0
+        start = time.perf_counter()
+        while sent < min(window, count):
+            sock.sendto(REGISTER, server)
+            sent += 1
+        while received < sent:
+            try:
+                sock.recvfrom(4096)
+            except socket.timeout:
+                # Lost datagrams, stop waiting for them
+                break
+            received += 1
+            if sent < count:
+                sock.sendto(REGISTER, server)
+                sent += 1
+        result.put((received, time.perf_counter() - start))
+
+
+def usage():
+    """CPU seconds and context switches of this process (None without resource)."""
+    if resource is None:
+        return time.process_time(), None
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    return rusage.ru_utime + rusage.ru_stime, rusage.ru_nvcsw + rusage.ru_nivcsw
+
+
+def run(server_cls, count: int, window: int) -> dict:
+    port = free_port()
+    server = server_cls()
+    server.start('127.0.0.1', port)
+    try:
+        result = multiprocessing.Queue()
+        cpuBefore, switchesBefore = usage()
+        client = multiprocessing.Process(target=flood, args=(port, count, window, result))
+        client.start()
+        received, seconds = result.get()
+        client.join()
+        cpuAfter, switchesAfter = usage()
+    finally:
+        server.stop()
+
+    switches = switchesAfter - switchesBefore if resource is not None else float('nan')
+    cpu = cpuAfter - cpuBefore
+    return {'engine': server_cls.__name__,
+            'replies': received,
+            'pps': received / seconds,
+            'cpu_us_per_packet': cpu * 1e6 / max(received, 1),
+            'ctx_switches_per_1k': switches * 1000.0 / max(received, 1)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=50000)
+    parser.add_argument('--window', type=int, default=64)
+    args = parser.parse_args()
+
+    print('{0:>24} {1:>9} {2:>10} {3:>12} {4:>14}'.format(
+        'engine', 'replies', 'pps', 'cpu us/pkt', 'ctx sw / 1k'))
+    for cls in (DestruckUDPServer, AsyncDestruckUDPServer):
+        res = run(cls, args.count, args.window)
+        print('{engine:>24} {replies:>9} {pps:>10.0f} {cpu_us_per_packet:>12.1f} '
+              '{ctx_switches_per_1k:>14.1f}'.format(**res))
@@ -0,0 +1,98 @@
+# benchmarks/udp_receive.py
+
+"""
+    Receive path: recvfrom + bytes slicing against recvfrom_into + memoryview.
+
+    Batches of FString datagrams are sent on loopback then read and decoded
+    with each method (receive, length prefix, payload decode). Reported per
+    method: microseconds per packet and bytes allocated while handling a
+    packet (tracemalloc peak of a trace started for each packet).
+
+        python -m benchmarks.udp_receive [--count 200000] [--batch 256]
+"""
+
+import argparse
+import json
+import socket
+import struct
+import time
+import tracemalloc
+
+from benchmarks.udp_engines import free_port
+
+
+PAYLOAD = json.dumps({'Origin': 'Host', 'Request': 'Register',
+                      'SessionId': '0123456789ABCDEF0123456789ABCDEF'}).encode()
+PACKET = len(PAYLOAD).to_bytes(4, byteorder='big') + PAYLOAD
+LENGTH = struct.Struct('!I')
+# Preallocated once, as the servers do
+BUFFER = bytearray(4096)
+VIEW = memoryview(BUFFER)
+
+
+def copy_path(sock: socket.socket, count: int) -> None:
+    """Former path: new bytes per datagram and per slice."""
+    for _ in range(count):
+        data, addr = sock.recvfrom(4096)
+        msg = data[4:].decode('utf-8')
+
+
+def view_path(sock: socket.socket, count: int) -> None:
+    """Preallocated buffer, validated prefix, decode the payload only."""
+    buffer = BUFFER
+    view = VIEW
+    for _ in range(count):
+        nbytes, addr = sock.recvfrom_into(buffer)
+        if LENGTH.unpack_from(buffer)[0] == nbytes - 4:
+            msg = str(view[4:nbytes], 'utf-8')
+
+
+def run(method, count: int, batch: int) -> dict:
+    port = free_port()
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind(('127.0.0.1', port))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = ('127.0.0.1', port)
+
+    # Timing, datagrams are queued before each timed batch
+    seconds = 0.0
+    done = 0
+    while done < count:
+        for _ in range(batch):
+            sender.sendto(PACKET, target)
+        start = time.perf_counter()
+        method(receiver, batch)
+        seconds += time.perf_counter() - start
+        done += batch
+
+    # Transient allocations, one packet at a time
+    allocated = 0
+    for _ in range(batch):
+        sender.sendto(PACKET, target)
+    for _ in range(batch):
+        # Fresh trace per packet, peak only counts its allocations
+        # (tracemalloc.reset_peak needs Python 3.9)
+        tracemalloc.start()
+        method(receiver, 1)
+        allocated += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    sender.close()
+    receiver.close()
+    return {'method': method.__name__,
+            'us': seconds * 1e6 / done,
+            'bytes': allocated / batch}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=256)
+    args = parser.parse_args()
+
+    print('{0:>10} {1:>8} {2:>16}'.format('method', 'us/pkt', 'peak bytes/pkt'))
+    for method in (copy_path, view_path):
+        res = run(method, args.count, args.batch)
+        print('{method:>10} {us:>8.2f} {bytes:>16.0f}'.format(**res))
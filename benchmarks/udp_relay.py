@@ -0,0 +1,129 @@
+# benchmarks/udp_relay.py
+
+"""
+    UDP relay: sustained forwarded packets per second and added latency.
+
+    A relay runs in a child process on loopback, two peer sockets bind to a
+    session then:
+      - throughput: peer A sends windows of --window datagrams, peer B reads
+        them back, during --duration seconds
+      - latency: ping-pong A -> B -> A through the relay against the same
+        ping-pong sent directly, added one way latency is half the difference
+
+        python -m benchmarks.udp_relay [--duration 5] [--size 200] [--window 64]
+"""
+
+import argparse
+import multiprocessing
+import socket
+import time
+
+
+def percentile(values, p: float) -> float:
+    """*p* percentile of sorted *values*."""
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def _serve(ready, stop) -> None:
+    from Project.server.hole_punching.relay import UDPRelay
+
+    relay = UDPRelay(0)
+    relay.start('127.0.0.1')
+    ready.send((relay.port, relay.allocate('bench')))
+    stop.wait()
+    ready.send(relay.stats())
+    relay.stop()
+
+
+def _peer() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(1.0)
+    return sock
+
+
+def bind(peers, relay, token) -> None:
+    from Project.server.hole_punching import wire
+
+    for peer in peers:
+        peer.sendto(wire.encode_relay_bind(token), relay)
+        peer.recv(64)
+    # First peer is told once the second one bound
+    peers[0].recv(64)
+
+
+def throughput(sender, receiver, target, duration: float, size: int, window: int) -> dict:
+    payload = b'x' * size
+    receiver.settimeout(0.05)
+    sent = received = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        for _ in range(window):
+            sender.sendto(payload, target)
+        sent += window
+        got = 0
+        while got < window:
+            try:
+                receiver.recv(2048)
+            except socket.timeout:
+                break
+            got += 1
+        received += got
+    elapsed = time.perf_counter() - start
+    receiver.settimeout(1.0)
+    return {'sent': sent, 'received': received, 'pps': received / elapsed,
+            'mbps': received * size * 8 / elapsed / 1e6, 'loss': (sent - received) / sent}
+
+
+def ping_pong(a, b, a_target, b_target, count: int, size: int):
+    payload = b'p' * size
+    rtts = []
+    for _ in range(count):
+        start = time.perf_counter()
+        a.sendto(payload, a_target)
+        b.recv(2048)
+        b.sendto(payload, b_target)
+        a.recv(2048)
+        rtts.append(time.perf_counter() - start)
+    return sorted(rtts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--size', type=int, default=200, help='datagram payload bytes')
+    parser.add_argument('--window', type=int, default=64, help='datagrams sent before reading them back')
+    parser.add_argument('--pings', type=int, default=5000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    stop = context.Event()
+    server = context.Process(target=_serve, args=(child, stop), daemon=True)
+    server.start()
+    port, token = parent.recv()
+    relay = ('127.0.0.1', port)
+
+    a, b = _peer(), _peer()
+    try:
+        bind([a, b], relay, token)
+        result = throughput(a, b, relay, args.duration, args.size, args.window)
+        print('forwarded {pps:.0f} pkt/s ({mbps:.1f} Mbit/s), loss {loss:.2%}'.format(**result))
+
+        direct = ping_pong(a, b, b.getsockname(), a.getsockname(), args.pings, args.size)
+        relayed = ping_pong(a, b, relay, relay, args.pings, args.size)
+        print('{0:>8} {1:>10} {2:>10}'.format('', 'p50 us', 'p99 us'))
+        for name, rtts in (('direct', direct), ('relayed', relayed)):
+            print('{0:>8} {1:>10.1f} {2:>10.1f}'.format(name, percentile(rtts, 50) * 1e6,
+                                                        percentile(rtts, 99) * 1e6))
+        print('added one way latency p50 {0:.1f} us'.format(
+            (percentile(relayed, 50) - percentile(direct, 50)) / 2 * 1e6))
+    finally:
+        stop.set()
+        print('relay', parent.recv())
+        server.join()
+        a.close()
+        b.close()
@@ -0,0 +1,78 @@
+# benchmarks/udp_workers.py
+
+"""
+    Rendezvous throughput against number of SO_REUSEPORT worker processes.
+
+    For each worker count, *clients* processes (distinct source ports so the
+    kernel spreads them between workers) keep *window* Register requests in
+    flight. Reported: aggregated replies per second.
+
+        python -m benchmarks.udp_workers [--workers 1 2 4] [--clients 8] [--count 20000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+from Project.server.hole_punching import UDPWorkerSupervisor
+
+from benchmarks.udp_engines import REGISTER, flood, free_port
+
+
+def wait_ready(port: int, timeout: float = 30.0) -> None:
+    """Wait until a worker answers on *port*."""
+    deadline = time.time() + timeout
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(0.2)
+        while time.time() < deadline:
+            sock.sendto(REGISTER, ('127.0.0.1', port))
+            try:
+                sock.recvfrom(4096)
+                return
+            except socket.timeout:
+                continue
+    raise RuntimeError('Workers not ready')
+
+
+def run(workers: int, clients: int, count: int, window: int) -> dict:
+    port = free_port()
+    storePath = os.path.join(tempfile.mkdtemp(), 'endpoints.db')
+    supervisor = UDPWorkerSupervisor('127.0.0.1', port, workers=workers, store_path=storePath)
+    supervisor.start()
+    try:
+        wait_ready(port)
+        # Let every worker finish binding
+        time.sleep(1.0)
+        result = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=flood, args=(port, count, window, result))
+                     for _ in range(clients)]
+        for p in processes:
+            p.start()
+        outcomes = [result.get() for _ in processes]
+        for p in processes:
+            p.join()
+    finally:
+        supervisor.stop()
+
+    replies = sum(r for r, _ in outcomes)
+    seconds = max(s for _, s in outcomes)
+    return {'workers': workers, 'replies': replies, 'pps': replies / seconds}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--count', type=int, default=20000, help='requests per client')
+    parser.add_argument('--window', type=int, default=32)
+    args = parser.parse_args()
+
+    print('cpus: {0}'.format(os.cpu_count()))
+    print('{0:>8} {1:>10} {2:>10}'.format('workers', 'replies', 'pps'))
+    for workers in args.workers:
+        res = run(workers, args.clients, args.count, args.window)
+        print('{workers:>8} {replies:>10} {pps:>10.0f}'.format(**res))
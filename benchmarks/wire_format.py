@@ -0,0 +1,86 @@
+# benchmarks/wire_format.py
+
+"""
+    JSON (FString) against binary rendezvous messages.
+
+    Messages go through `DestruckUDPServer._handle_client` with a fake socket
+    (no network): parsing, dispatch, reply encoding and queueing, replies
+    taken from the outbound queue as the data thread does. Reported per message:
+    request / reply size and microseconds per message.
+
+        python -m benchmarks.wire_format [--count 100000]
+"""
+
+import argparse
+import json
+import time
+
+from Project.server.hole_punching import DestruckUDPServer
+from Project.server.hole_punching import wire
+
+
+CLIENT = ('203.0.113.7', 61000)
+HOST = ('198.51.100.20', 7777)
+SESSION = '0123456789ABCDEF0123456789ABCDEF'
+
+
+class FakeSocket(object):
+
+    """Keep the last datagram sent."""
+
+    def __init__(self):
+        self.last = b''
+
+    def sendto(self, data: bytes, addr) -> int:
+        self.last = data
+        return len(data)
+
+    def getsockname(self):
+        return ('0.0.0.0', 5000)
+
+    def close(self):
+        pass
+
+
+def fstring(obj: dict) -> bytes:
+    data = json.dumps(obj).encode()
+    return len(data).to_bytes(4, byteorder='big') + data
+
+
+MESSAGES = [
+    ('Register', 'json', fstring({'Origin': 'Host', 'Request': 'Register', 'SessionId': SESSION})),
+    ('Register', 'binary', wire.encode_register(SESSION)),
+    ('Join', 'json', fstring({'Origin': 'Client', 'Request': 'Join', 'HostIP': HOST[0],
+                              'HostPort': HOST[1], 'SessionId': SESSION})),
+    ('Join', 'binary', wire.encode_join(HOST, SESSION)),
+]
+
+
+def run(name: str, fmt: str, data: bytes, count: int) -> dict:
+    server = DestruckUDPServer()
+    server._sock.close()
+    sock = server._sock = FakeSocket()
+    handle = server._handle_client
+    get_batch = server._container.get_batch
+    send = server._send_msg
+    start = time.perf_counter()
+    for _ in range(count):
+        handle(sock, CLIENT, data)
+        for msg, addr in get_batch(DestruckUDPServer.SEND_BATCH, timeout=0):
+            send(sock, msg, addr)
+    seconds = time.perf_counter() - start
+    return {'message': name, 'format': fmt,
+            'request': len(data), 'reply': len(sock.last),
+            'us': seconds * 1e6 / count}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    print('{0:>10} {1:>8} {2:>9} {3:>7} {4:>8}'.format('message', 'format', 'request', 'reply', 'us/msg'))
+    for name, fmt, data in MESSAGES:
+        res = run(name, fmt, data, args.count)
+        print('{message:>10} {format:>8} {request:>9} {reply:>7} {us:>8.2f}'.format(**res))
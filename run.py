@@ -2,7 +2,7 @@ import os
 import logging
 
 from Project.server import create_app
-from Project.tools.logger import add_file_handler, add_stream_handler
+from Project.tools.logger import add_queued_file_handler, add_stream_handler
 
 from werkzeug.serving import is_running_from_reloader
 
@@ -19,9 +19,9 @@ if __name__ == "__main__":
     # Keep stream handler for Werkzeug
     logging.getLogger().setLevel(log_level)
 
-    # Init logging for UDP / TCP server
-    file_handler = add_file_handler('DestruckServer.log', parent='DestruckServer',
-                                    level=log_level, filemode='a')
+    # Init logging for UDP / TCP server, file written from a background thread
+    file_handler = add_queued_file_handler('DestruckServer.log', parent='DestruckServer',
+                                           level=log_level)
     stream_handler = add_stream_handler(parent='DestruckServer', level=log_level)
 
     # Only stream my logs but store https server logs (werkzeug)
@@ -0,0 +1,94 @@
+# tests/test_bad_input.py
+
+import socket
+import unittest
+
+from Project.server.hole_punching import DestruckUDPServer, AsyncDestruckUDPServer, wire
+from Project.server.hole_punching import destruck_server
+from Project.server.hole_punching.fstring import LENGTH, encode_fstring
+
+
+CLIENT = ('203.0.113.7', 61000)
+REGISTER = encode_fstring('{"Origin": "Host", "Request": "Register", "SessionId": "session"}')
+
+
+class MalformedDatagramTest(unittest.TestCase):
+
+    """Each malformed datagram is dropped without reply and counted by reason."""
+
+    def setUp(self):
+        self.server = DestruckUDPServer()
+        self.addCleanup(self.server._sock.close)
+
+    def assertRejected(self, data, reason):
+        before = destruck_server._REJECTED[reason].value
+        self.server._handle_client(self.server._sock, CLIENT, data)
+        self.assertEqual(self.server._container.get_batch(timeout=0), [])
+        self.assertEqual(destruck_server._REJECTED[reason].value, before + 1)
+
+    def test_size(self):
+        self.assertRejected(b'\x00\x00\x00', 'size')
+        self.assertRejected(encode_fstring('x' * DestruckUDPServer.MAX_MSG_SIZE), 'size')
+
+    def test_first_byte(self):
+        self.assertRejected(b'GET / HTTP/1.1\r\n', 'first_byte')
+
+    def test_fstring(self):
+        # Length prefix not matching the datagram size
+        self.assertRejected(LENGTH.pack(50) + b'{"Request": "Register"}', 'fstring')
+        self.assertRejected(encode_fstring(''), 'size')
+        self.assertRejected(LENGTH.pack(2) + b'\xff\xfe', 'fstring')
+
+    def test_json(self):
+        self.assertRejected(encode_fstring('{"Request": '), 'json')
+        self.assertRejected(encode_fstring('{"Request": "Register",}'), 'json')
+
+    def test_fields(self):
+        # Join of an unknown session without host endpoint
+        self.assertRejected(encode_fstring('{"Origin": "Client", "Request": "Join", "SessionId": 3}'), 'fields')
+        self.assertRejected(encode_fstring('{"Request": "Probe", "ProbeId": ""}'), 'fields')
+
+    def test_binary(self):
+        self.assertRejected(wire.encode_join(('10.0.0.1', 1), 'session')[:-1], 'binary')
+
+    def test_unexpected_json_is_ignored(self):
+        for msg in ('{"Origin": "Host", "Request": "Unknown"}', '{"Origin": 1}'):
+            with self.subTest(msg=msg):
+                self.server._handle_client(self.server._sock, CLIENT, encode_fstring(msg))
+                self.assertEqual(self.server._container.get_batch(timeout=0), [])
+
+
+class FailingStringServer(DestruckUDPServer):
+
+    def _handle_string_msg(self, sock, addr, msg):
+        raise RuntimeError('handler bug')
+
+
+class AsyncFailingStringServer(FailingStringServer, AsyncDestruckUDPServer):
+    pass
+
+
+class HandlerFailureTest(unittest.TestCase):
+
+    """A handler which raises drops its datagram, the server keeps answering."""
+
+    def _check(self, factory):
+        server = factory()
+        self.assertTrue(server.start('127.0.0.1', 0))
+        self.addCleanup(server.stop)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.settimeout(2.0)
+            client.sendto(encode_fstring('boom'), ('127.0.0.1', server.port))
+            client.sendto(REGISTER, ('127.0.0.1', server.port))
+            self.assertIn(b'"Request": "Register"', client.recv(2048))
+        self.assertEqual(server.handler_errors, 1)
+
+    def test_thread_engine(self):
+        self._check(FailingStringServer)
+
+    def test_asyncio_engine(self):
+        self._check(AsyncFailingStringServer)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+# tests/test_data_manager.py
+
+import json
+import time
+import unittest
+
+from Project.server.data import DataManager, Host
+
+
+def make_host(index: int) -> Host:
+    host = Host('10.0.0.{0}'.format(index), 'Unreal', 'Player_{0}'.format(index), 'sid_{0}'.format(index))
+    host.add_session_info('SessionId', 'session_{0}'.format(index))
+    return host
+
+
+class IndexTest(unittest.TestCase):
+
+    """Secondary indexes follow every add, update and removal."""
+
+    def setUp(self):
+        self.manager = DataManager()
+
+    def indexed(self, name, value) -> list:
+        return sorted(h.client_ID for h in self.manager.snapshot.lookup(name, value))
+
+    def test_add(self):
+        first, second = make_host(1), make_host(2)
+        second.hostName = first.hostName
+        self.manager.add_host(first)
+        self.manager.add_host(second)
+        self.assertEqual(self.indexed('hostName', 'Player_1'), ['sid_1', 'sid_2'])
+        self.assertEqual(self.indexed('ipAddress', '10.0.0.2'), ['sid_2'])
+        self.assertEqual(self.manager.get_host_by_session('session_2').client_ID, 'sid_2')
+        self.assertEqual([h.client_ID for h in self.manager.get_hosts_by_name('Player_1')], ['sid_1', 'sid_2'])
+
+    def test_update_moves_open_slot(self):
+        self.manager.add_host(make_host(1))
+        self.assertEqual(self.indexed('HasOpenPublicSlot', True), [])
+        self.manager.set_open_connections('sid_1', 0, 2)
+        self.assertEqual(self.indexed('HasOpenPublicSlot', True), ['sid_1'])
+        self.assertEqual(self.indexed('HasOpenPublicSlot', False), [])
+        self.manager.set_open_connections('sid_1', 0, 0)
+        self.assertEqual(self.indexed('HasOpenPublicSlot', True), [])
+        self.assertEqual(self.indexed('HasOpenPublicSlot', False), ['sid_1'])
+        # Keys the update did not touch are unchanged
+        self.assertEqual(self.indexed('SessionId', 'session_1'), ['sid_1'])
+
+    def test_remove_drops_empty_buckets(self):
+        self.manager.add_host(make_host(1))
+        self.manager.add_host(make_host(2))
+        self.assertEqual(self.manager.remove_hosts_by_address('10.0.0.1'), 1)
+        self.assertEqual(self.indexed('ipAddress', '10.0.0.1'), [])
+        self.assertNotIn('Player_1', self.manager.snapshot.indexes['hostName'])
+        self.assertEqual(self.manager.remove_hosts('Player_2', '10.0.0.2'), 1)
+        for name, index in self.manager.snapshot.indexes.items():
+            with self.subTest(index=name):
+                self.assertEqual(len(index), 0)
+
+    def test_unhashable_value_not_indexed(self):
+        host = make_host(1)
+        host.add_session_info('SessionId', ['not', 'hashable'])
+        self.assertTrue(self.manager.add_host(host))
+        self.assertEqual(self.manager.snapshot.lookup('SessionId', ['not', 'hashable']), [])
+        self.assertEqual(self.manager.remove_host_by_ID('sid_1'), 1)
+
+    def test_older_snapshot_unchanged(self):
+        self.manager.add_host(make_host(1))
+        before = self.manager.snapshot
+        self.manager.remove_host_by_ID('sid_1')
+        self.assertEqual([h.client_ID for h in before.lookup('SessionId', 'session_1')], ['sid_1'])
+
+
+class HostsSnapshotTest(unittest.TestCase):
+
+    """Encoded hosts list built once per registry version."""
+
+    def setUp(self):
+        self.manager = DataManager()
+        self.manager.add_host(make_host(1))
+
+    def test_cached_per_version(self):
+        first = self.manager.hosts_snapshot()
+        self.assertIs(self.manager.hosts_snapshot(), first)
+        self.assertEqual(self.manager.snapshot_stats(), {'version': 1, 'hits': 1, 'misses': 1})
+        self.assertEqual([h['client_ID'] for h in json.loads(first)], ['sid_1'])
+
+    def test_mutation_rebuilds(self):
+        first = self.manager.hosts_snapshot()
+        self.manager.add_host(make_host(2))
+        second = self.manager.hosts_snapshot()
+        self.assertIsNot(second, first)
+        self.assertEqual([h['client_ID'] for h in json.loads(second)], ['sid_1', 'sid_2'])
+        self.assertEqual(self.manager.snapshot_stats()['misses'], 2)
+
+    def test_unchanged_update_keeps_cache(self):
+        self.manager.set_open_connections('sid_1', 0, 2)
+        first = self.manager.hosts_snapshot()
+        # Same slots, same version
+        self.manager.set_open_connections('sid_1', 0, 2)
+        self.assertIs(self.manager.hosts_snapshot(), first)
+
+
+class ChangesSinceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = DataManager(changelog_size=4)
+
+    def test_delta(self):
+        self.manager.add_host(make_host(1))
+        self.manager.add_host(make_host(2))
+        since = self.manager.version
+        self.manager.set_open_connections('sid_1', 0, 2)
+        self.manager.remove_host_by_ID('sid_2')
+        self.manager.add_host(make_host(3))
+
+        delta = self.manager.changes_since(since, self.manager.epoch)
+        self.assertEqual(delta['version'], self.manager.version)
+        self.assertEqual(delta['epoch'], self.manager.epoch)
+        self.assertFalse(delta['full'])
+        self.assertEqual([h['client_ID'] for h in delta['added']], ['sid_3'])
+        self.assertEqual([h['client_ID'] for h in delta['updated']], ['sid_1'])
+        self.assertEqual(delta['removed'], ['sid_2'])
+
+    def test_added_then_removed_is_invisible(self):
+        since = self.manager.version
+        self.manager.add_host(make_host(1))
+        self.manager.remove_host_by_ID('sid_1')
+        delta = self.manager.changes_since(since, self.manager.epoch)
+        self.assertEqual((delta['added'], delta['updated'], delta['removed']), ([], [], []))
+
+    def test_up_to_date(self):
+        self.manager.add_host(make_host(1))
+        delta = self.manager.changes_since(self.manager.version, self.manager.epoch)
+        self.assertEqual((delta['added'], delta['removed']), ([], []))
+
+    def test_changelog_overflow(self):
+        for index in range(6):
+            self.manager.add_host(make_host(index))
+        # Versions 1 and 2 fell out of the 4 entries change log
+        self.assertIsNone(self.manager.changes_since(1, self.manager.epoch))
+        self.assertIsNotNone(self.manager.changes_since(2, self.manager.epoch))
+
+    def test_unknown_cursor(self):
+        self.manager.add_host(make_host(1))
+        for since in (-1, self.manager.version + 1):
+            with self.subTest(since=since):
+                self.assertIsNone(self.manager.changes_since(since, self.manager.epoch))
+
+    def test_other_epoch(self):
+        # Version of a registry before a restart
+        previous = DataManager()
+        self.manager.add_host(make_host(1))
+        self.assertNotEqual(previous.epoch, self.manager.epoch)
+        self.assertIsNone(self.manager.changes_since(0, previous.epoch))
+
+
+class LeaseTest(unittest.TestCase):
+
+    TTL = 10.0
+
+    def setUp(self):
+        self.manager = DataManager()
+        self.manager.enable_leases(LeaseTest.TTL, tick=1.0)
+        self.manager.add_host(make_host(1))
+        self.manager.add_host(make_host(2))
+
+    def test_expired_hosts_removed(self):
+        now = time.monotonic()
+        self.assertEqual(self.manager.expire_leases(now + LeaseTest.TTL / 2), [])
+        expired = self.manager.expire_leases(now + LeaseTest.TTL * 2)
+        self.assertEqual(sorted(h.client_ID for h in expired), ['sid_1', 'sid_2'])
+        self.assertEqual((len(self.manager), self.manager.leases, self.manager.leases_expired), (0, 0, 2))
+
+    def test_renew_after_advance_keeps_host(self):
+        leases = self.manager._leases
+        advance = leases.advance
+
+        def racing_advance(now=None):
+            expired = advance(now)
+            # Heartbeat handled between the wheel tick and the removal
+            self.manager.renew_lease('sid_1')
+            return expired
+
+        leases.advance = racing_advance
+        expired = self.manager.expire_leases(time.monotonic() + LeaseTest.TTL * 2)
+        self.assertEqual([h.client_ID for h in expired], ['sid_2'])
+        self.assertIsNotNone(self.manager.get_host('sid_1'))
+        self.assertIn('sid_1', leases)
+
+    def test_removed_host_leaves_no_lease(self):
+        self.manager.remove_host_by_ID('sid_1')
+        self.assertFalse(self.manager.renew_lease('sid_1'))
+        self.assertNotIn('sid_1', self.manager._leases)
+        self.assertEqual(self.manager.leases, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
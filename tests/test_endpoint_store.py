@@ -0,0 +1,99 @@
+# tests/test_endpoint_store.py
+
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from Project.server.hole_punching import endpoint_store
+from Project.server.hole_punching.endpoint_store import FileEndpointStore, LocalEndpointStore
+
+
+HOST = ('198.51.100.20', 7777)
+
+
+class LocalEndpointStoreTest(unittest.TestCase):
+
+    def test_least_recent_forgotten(self):
+        store = LocalEndpointStore(max_entries=2)
+        store.set('a', HOST)
+        store.set('b', HOST)
+        store.get('a')
+        store.set('c', HOST)
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.get('a'), HOST)
+        self.assertEqual(store.evicted, 1)
+
+
+class FileEndpointStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'endpoints.db')
+
+    def store(self, **kwargs) -> FileEndpointStore:
+        # Flushed by hand unless a test waits for the writer thread
+        kwargs.setdefault('flush_interval', 60.0)
+        store = FileEndpointStore(self.path, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_round_trip(self):
+        store = self.store()
+        store.set('session', HOST)
+        # Visible to the process before being written
+        self.assertEqual(store.get('session'), HOST)
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(store.get('session'), HOST)
+        self.assertIsNone(store.get('unknown'))
+        self.assertTrue(store.delete('session'))
+        self.assertFalse(store.delete('session'))
+        self.assertIsNone(store.get('session'))
+
+    def test_other_process_sees_flushed_endpoints(self):
+        writer = self.store()
+        # What a worker process gets (see workers)
+        reader = pickle.loads(pickle.dumps(writer))
+        self.addCleanup(reader.close)
+        writer.set('session', HOST)
+        self.assertIsNone(reader.get('session'))
+        writer.flush()
+        self.assertEqual(reader.get('session'), HOST)
+        self.assertEqual(len(reader), 1)
+
+    def test_writer_thread_flushes(self):
+        store = self.store(flush_interval=0.01)
+        reader = FileEndpointStore(self.path)
+        self.addCleanup(reader.close)
+        store.set('session', HOST)
+        for _ in range(200):
+            if reader.get('session') is not None:
+                break
+            store._stopEvent.wait(0.01)
+        self.assertEqual(reader.get('session'), HOST)
+
+    def test_close_writes_pending(self):
+        store = FileEndpointStore(self.path, flush_interval=60.0)
+        store.set('session', HOST)
+        store.close()
+        self.assertEqual(self.store().get('session'), HOST)
+
+    def test_pruning_keeps_most_recent(self):
+        store = self.store(max_entries=3)
+        with mock.patch.object(FileEndpointStore, 'PRUNE_EVERY', 4), \
+                mock.patch.object(endpoint_store.time, 'time', side_effect=itertools.count(1.0)):
+            for index in range(4):
+                store.set('session_{0}'.format(index), HOST)
+                store.flush()
+        self.assertEqual(len(store), 3)
+        self.assertIsNone(store.get('session_0'))
+        self.assertEqual(store.get('session_3'), HOST)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+# tests/test_fstring.py
+
+import json
+import unittest
+
+from Project.server.hole_punching.fstring import LENGTH, FStringTemplate, encode_fstring, json_string
+
+
+class FStringTest(unittest.TestCase):
+
+    def test_length_prefix(self):
+        data = encode_fstring('héllo')
+        self.assertEqual(LENGTH.unpack_from(data)[0], len('héllo'.encode('utf-8')))
+        self.assertEqual(data[LENGTH.size:].decode('utf-8'), 'héllo')
+
+    def test_template_matches_encode_fstring(self):
+        template = FStringTemplate('{"IP": "%b", "Port": %d, "Name": %b}')
+        data = template.render(b'10.0.0.1', 7777, json_string('a "quoted" é'))
+        expected = encode_fstring(json.dumps({'IP': '10.0.0.1', 'Port': 7777, 'Name': 'a "quoted" é'}))
+        self.assertEqual(bytes(data), expected)
+        self.assertEqual(json.loads(bytes(data[LENGTH.size:]).decode('ascii'))['Name'], 'a "quoted" é')
+
+    def test_renders_are_independent(self):
+        template = FStringTemplate('{"Port": %d}')
+        first = template.render(1)
+        second = template.render(65535)
+        self.assertEqual(bytes(first), encode_fstring('{"Port": 1}'))
+        self.assertEqual(bytes(second), encode_fstring('{"Port": 65535}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# tests/test_host.py
+
+import sys
+import unittest
+
+from Project.server.data import Host
+
+
+def runtime_str(value: str) -> str:
+    """Distinct str object equal to *value* (never the interned one)."""
+    return ''.join(list(value))
+
+
+class HostTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        host = Host('10.0.0.1', 'Unreal', 'Player', 'sid')
+        host.add_session_info('BuildUniqueId', '3')
+        host.add_session_info('bAllowJoinInProgress', 1)
+        host.add_user_info('Map', 'Arena')
+        other = Host.from_dict(host.to_dict(), 'sid')
+        self.assertTrue(host.IsSameData(other))
+        self.assertEqual(other.get_session_info('BuildUniqueId'), 3)
+        self.assertIs(other.get_session_info('bAllowJoinInProgress'), True)
+
+    def test_unknown_session_key_refused(self):
+        host = Host('10.0.0.1', 'Unreal', 'Player', 'sid')
+        self.assertFalse(host.add_session_info('NotAKey', 1))
+        self.assertIsNone(host.get_session_info('NotAKey'))
+
+    def test_only_user_infos_are_interned(self):
+        host = Host('10.0.0.1', 'Unreal', 'Player', 'sid')
+        session = runtime_str('session_unique_to_this_test')
+        host.add_session_info('SessionId', session)
+        self.assertIs(host.get_session_info('SessionId'), session)
+
+        value = runtime_str('Arena_shared_by_hosts')
+        host.add_user_info(runtime_str('Map'), value)
+        stored = host.user_infos['Map']
+        self.assertIs(stored, sys.intern(runtime_str('Arena_shared_by_hosts')))
+
+    def test_user_infos_are_capped(self):
+        host = Host('10.0.0.1', 'Unreal', 'Player', 'sid')
+        for i in range(Host.MAX_USER_INFOS):
+            self.assertTrue(host.add_user_info('key_{0}'.format(i), i))
+        self.assertFalse(host.add_user_info('one_more', 0))
+        # Replacing an existing key is still allowed
+        self.assertTrue(host.add_user_info('key_0', 'new'))
+
+    def test_copy_is_independent(self):
+        host = Host('10.0.0.1', 'Unreal', 'Player', 'sid')
+        host.add_user_info('Map', 'Arena')
+        other = host.copy()
+        other.add_user_info('Map', 'Desert')
+        other.add_session_info('NumOpenPublicConnections', 2)
+        self.assertEqual(host.user_infos['Map'], 'Arena')
+        self.assertIsNone(host.get_session_info('NumOpenPublicConnections'))
+
+
+if __name__ == '__main__':
+    unittest.main()
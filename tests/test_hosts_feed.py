@@ -0,0 +1,84 @@
+# tests/test_hosts_feed.py
+
+import json
+import unittest
+
+from Project.server.data import DataManager, Host
+from Project.server.main.hosts_feed import HostsFeed
+
+
+class FakeSocketIO(object):
+
+    """Record emits, never run the flushing task (flushed by hand)."""
+
+    def __init__(self):
+        self.emitted = []
+
+    def start_background_task(self, target, *args, **kwargs):
+        pass
+
+    def emit(self, event, payload, room=None, namespace=None):
+        self.emitted.append((event, room, json.loads(payload)))
+
+
+def make_host(index: int) -> Host:
+    host = Host('10.0.0.{0}'.format(index), 'Unreal', 'Player_{0}'.format(index), 'sid_{0}'.format(index))
+    host.add_session_info('BuildUniqueId', 7)
+    return host
+
+
+class HostsFeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.socketio = FakeSocketIO()
+        self.manager = DataManager()
+        self.feed = HostsFeed('OnHostsChanged', window=0)
+        self.feed.init_io(self.socketio, self.manager)
+
+    def test_changes_are_coalesced_per_room(self):
+        self.manager.add_host(make_host(1))
+        self.manager.set_open_connections('sid_1', 0, 2)
+        self.assertEqual(self.feed.flush(), 2)
+        rooms = {room: payload for _, room, payload in self.socketio.emitted}
+        self.assertEqual(set(rooms), {HostsFeed.ROOM_ALL, HostsFeed.room_for(7)})
+        payload = rooms[HostsFeed.ROOM_ALL]
+        self.assertEqual([h['client_ID'] for h in payload['added']], ['sid_1'])
+        self.assertEqual(payload['updated'], [])
+        self.assertEqual(payload['version'], self.manager.version)
+
+    def test_version_kept_when_last_host_leaves(self):
+        self.manager.add_host(make_host(1))
+        self.feed.flush()
+        self.manager.remove_host_by_ID('sid_1')
+        self.assertEqual(len(self.manager), 0)
+        self.feed.flush()
+        payload = self.socketio.emitted[-1][2]
+        self.assertEqual(payload['removed'], ['sid_1'])
+        self.assertEqual(payload['version'], self.manager.version)
+        self.assertGreater(payload['version'], 0)
+
+    def test_change_during_flush_goes_to_next_version(self):
+        manager = self.manager
+
+        class RacingHost(Host):
+            # Another writer commits while the flush encodes this host
+            def to_dict(self):
+                if 'sid_2' not in manager.snapshot.hosts:
+                    manager.add_host(make_host(2))
+                return super().to_dict()
+
+        host = RacingHost('10.0.0.1', 'Unreal', 'Player_1', 'sid_1')
+        manager.add_host(host)
+        self.feed.flush()
+        first = self.socketio.emitted[-1][2]
+        self.assertEqual([h['client_ID'] for h in first['added']], ['sid_1'])
+        self.assertEqual(first['version'], 1)
+
+        self.feed.flush()
+        second = self.socketio.emitted[-1][2]
+        self.assertEqual([h['client_ID'] for h in second['added']], ['sid_2'])
+        self.assertEqual(second['version'], manager.version)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# tests/test_logger.py
+
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from Project.tools.logger import LogSampler, BatchRotatingFileHandler, BoundedQueueHandler, BatchQueueListener
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LogSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('tests.sampler')
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.handler = ListHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_records_report_the_caller(self):
+        sampler = LogSampler(self.logger, 'tests', logging.INFO)
+        if sampler.sample():
+            sampler.emit('value %d', 1)
+        sampler.log('value %d', 2)
+
+        self.assertEqual([r.getMessage() for r in self.handler.records], ['value 1', 'value 2'])
+        for record in self.handler.records:
+            self.assertEqual(record.funcName, 'test_records_report_the_caller')
+            self.assertEqual(record.pathname, __file__)
+
+    def test_one_line_every_n_events(self):
+        sampler = LogSampler(self.logger, 'tests', logging.INFO, every=10)
+        for i in range(100):
+            sampler.log('event %d', i)
+        self.assertEqual(len(self.handler.records), 10)
+
+    def test_disabled_level_writes_nothing(self):
+        self.logger.setLevel(logging.WARNING)
+        sampler = LogSampler(self.logger, 'tests', logging.DEBUG)
+        sampler.log('hidden')
+        self.assertFalse(sampler.sample())
+        self.assertEqual(self.handler.records, [])
+
+    def test_summary_line(self):
+        sampler = LogSampler(self.logger, 'tests', logging.DEBUG, every=1000, interval=1e-9)
+        sampler.sample()
+        summaries = [r for r in self.handler.records if 'events' in r.getMessage()]
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0].funcName, 'test_summary_line')
+
+
+def make_record(msg: str, *args, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord('tests', level, __file__, 1, msg, args, None)
+
+
+class BatchRotatingFileHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'server.log')
+
+    def handler(self, **kwargs) -> BatchRotatingFileHandler:
+        handler = BatchRotatingFileHandler(self.path, **kwargs)
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_batch_written_at_once(self):
+        handler = self.handler()
+        handler.setLevel(logging.INFO)
+        handler.emit_batch([make_record('first'), make_record('hidden', level=logging.DEBUG),
+                            make_record('second')])
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'first\nsecond\n')
+
+    def test_rotation_per_batch(self):
+        handler = self.handler(maxBytes=30, backupCount=2)
+        handler.emit_batch([make_record('a' * 9), make_record('b' * 9)])
+        # Would exceed maxBytes: rotated before writing
+        handler.emit_batch([make_record('c' * 9)])
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'c' * 9 + '\n')
+        with open(self.path + '.1') as f:
+            self.assertEqual(f.read(), 'a' * 9 + '\n' + 'b' * 9 + '\n')
+
+    def test_rotated_files_compressed(self):
+        handler = self.handler(maxBytes=15, backupCount=2, compress=True)
+        for letter in 'abc':
+            handler.emit_batch([make_record(letter * 9)])
+        with gzip.open(self.path + '.1.gz', 'rt') as f:
+            self.assertEqual(f.read(), 'b' * 9 + '\n')
+        with gzip.open(self.path + '.2.gz', 'rt') as f:
+            self.assertEqual(f.read(), 'a' * 9 + '\n')
+        self.assertFalse(os.path.exists(self.path + '.1'))
+
+
+class BoundedQueueHandlerTest(unittest.TestCase):
+
+    def queued(self, handler: BoundedQueueHandler) -> list:
+        return [handler.queue.get_nowait().msg for _ in range(handler.queue.qsize())]
+
+    def test_drop_new(self):
+        handler = BoundedQueueHandler(maxsize=2)
+        for i in range(4):
+            handler.handle(make_record('record %d', i))
+        self.assertEqual(self.queued(handler), ['record 0', 'record 1'])
+        self.assertEqual(handler.dropped, 2)
+
+    def test_drop_old(self):
+        handler = BoundedQueueHandler(maxsize=2, overflow=BoundedQueueHandler.DROP_OLD)
+        for i in range(4):
+            handler.handle(make_record('record %d', i))
+        self.assertEqual(self.queued(handler), ['record 2', 'record 3'])
+        self.assertEqual(handler.dropped, 2)
+
+    def test_block_waits_for_room(self):
+        handler = BoundedQueueHandler(maxsize=1, overflow=BoundedQueueHandler.BLOCK)
+        handler.handle(make_record('first'))
+        writer = threading.Thread(target=handler.handle, args=(make_record('second'),))
+        writer.start()
+        writer.join(0.05)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(handler.queue.get(timeout=1).msg, 'first')
+        writer.join(1)
+        self.assertEqual(self.queued(handler), ['second'])
+        self.assertEqual(handler.dropped, 0)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            BoundedQueueHandler(overflow='drop_all')
+
+    def test_listener_writes_queued_records(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'server.log')
+        fileHandler = BatchRotatingFileHandler(path)
+        self.addCleanup(fileHandler.close)
+        handler = BoundedQueueHandler()
+        listener = BatchQueueListener(handler.queue, fileHandler, batch_size=2)
+        listener.start()
+        for i in range(5):
+            handler.handle(make_record('record %d', i))
+        listener.stop()
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines(), ['record {0}'.format(i) for i in range(5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
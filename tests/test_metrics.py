@@ -0,0 +1,55 @@
+# tests/test_metrics.py
+
+import threading
+import unittest
+
+from Project.tools.metrics import Counter, Histogram, MetricsRegistry
+
+
+class ShardedTest(unittest.TestCase):
+
+    def test_no_lost_update_across_threads(self):
+        counter = Counter()
+
+        def work():
+            for _ in range(10000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.value, 80000)
+
+    def test_cells_do_not_grow_with_threads(self):
+        counter = Counter()
+        cells = len(counter._cells)
+        for _ in range(100):
+            thread = threading.Thread(target=counter.inc)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(counter._cells), cells)
+        self.assertEqual(counter.value, 100)
+
+    def test_histogram_snapshot(self):
+        histogram = Histogram(buckets=(1, 10))
+        for value in (0.5, 5, 50):
+            histogram.observe(value)
+        buckets, total, count = histogram.snapshot()
+        self.assertEqual(buckets, [(1, 1), (10, 2), (float('inf'), 3)])
+        self.assertEqual((total, count), (55.5, 3))
+
+
+class RegistryTest(unittest.TestCase):
+
+    def test_render(self):
+        registry = MetricsRegistry('test_')
+        registry.counter('hits_total', 'Hits', ('kind',)).labels('a"b').inc(2)
+        text = registry.render()
+        self.assertIn('# TYPE test_hits_total counter', text)
+        self.assertIn('test_hits_total{kind="a\\"b"} 2', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# tests/test_nat.py
+
+import socket
+import threading
+import unittest
+
+from Project.server.hole_punching import nat
+from Project.server.hole_punching.nat import NatClassifier, NatInfo, ProbeListener
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def test_kinds(self):
+        self.assertEqual(nat.classify([4000]), NatInfo(nat.UNKNOWN, 0))
+        self.assertEqual(nat.classify([4000, 4000, 4000]), NatInfo(nat.CONE, 0))
+        self.assertEqual(nat.classify([4000, 4002, 4004]), NatInfo(nat.SYMMETRIC, 2))
+        self.assertEqual(nat.classify([4000, 4002, 4009]), NatInfo(nat.RANDOM, 0))
+
+
+class NatClassifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.classifier = NatClassifier(ports=3, ttl=10.0, window=4, clock=lambda: self.now)
+
+    def test_unknown_until_two_ports(self):
+        self.assertEqual(self.classifier.observe(('10.0.0.1', 4000), 'probe', 0).kind, nat.UNKNOWN)
+        self.assertIsNone(self.classifier.predict(('10.0.0.1', 4000)))
+        self.assertEqual(self.classifier.observe(('10.0.0.1', 4000), 'probe', 1).kind, nat.CONE)
+        self.assertEqual(self.classifier.predict(('10.0.0.1', 5000)), (nat.CONE, 5000, 5000))
+
+    def test_symmetric_prediction(self):
+        for index, port in enumerate((4000, 4001, 4002)):
+            info = self.classifier.observe(('10.0.0.2', port), 'probe', index)
+        self.assertEqual(info, NatInfo(nat.SYMMETRIC, 1))
+        self.assertEqual(self.classifier.predict(('10.0.0.2', 6000)), (nat.SYMMETRIC, 6001, 6004))
+
+    def test_random_and_expiry(self):
+        self.classifier.observe(('10.0.0.3', 4000), 'probe', 0)
+        self.classifier.observe(('10.0.0.3', 4100), 'probe', 1)
+        self.classifier.observe(('10.0.0.3', 4105), 'probe', 2)
+        self.assertEqual(self.classifier.predict(('10.0.0.3', 6000)), (nat.RANDOM, 0, 0))
+        self.now = 11.0
+        self.assertIsNone(self.classifier.get('10.0.0.3'))
+
+    def test_probe_groups_are_bounded(self):
+        classifier = NatClassifier(max_entries=2)
+        for i in range(5):
+            classifier.observe(('10.0.0.4', 4000), 'probe_{0}'.format(i), 0)
+        self.assertEqual(len(classifier._probes), 2)
+
+
+class ProbeListenerTest(unittest.TestCase):
+
+    def test_failing_handler_is_counted_and_listener_keeps_running(self):
+        handled = threading.Event()
+
+        def handler(sock, addr, data, index):
+            if bytes(data) == b'bad':
+                raise ValueError('bad probe')
+            handled.set()
+            sock.sendto(b'ok', addr)
+
+        listener = ProbeListener(handler)
+        listener.start('127.0.0.1', [0])
+        self.addCleanup(listener.stop)
+        target = ('127.0.0.1', listener.ports[0])
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as peer:
+            peer.settimeout(2.0)
+            peer.sendto(b'bad', target)
+            peer.sendto(b'good', target)
+            self.assertEqual(peer.recv(64), b'ok')
+        self.assertTrue(handled.is_set())
+        self.assertEqual(listener.handler_errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# tests/test_outbound.py
+
+import unittest
+
+from Project.server.hole_punching import DestruckUDPServer, wire
+from Project.server.hole_punching.fstring import encode_fstring
+from Project.server.hole_punching.outbound import OutboundQueue
+
+
+CLIENT = ('203.0.113.7', 61000)
+
+
+class OutboundQueueTest(unittest.TestCase):
+
+    def test_control_sent_before_bulk(self):
+        queue = OutboundQueue()
+        queue.put(b'bulk1', CLIENT, OutboundQueue.BULK)
+        queue.put(b'control', CLIENT, OutboundQueue.CONTROL)
+        queue.put(b'bulk2', CLIENT, OutboundQueue.BULK)
+        self.assertEqual([msg for msg, _ in queue.get_batch(timeout=0)], [b'control', b'bulk1', b'bulk2'])
+
+    def test_drop_new_when_full(self):
+        queue = OutboundQueue(maxsize=1)
+        self.assertTrue(queue.put(b'bulk', CLIENT, OutboundQueue.BULK))
+        self.assertFalse(queue.put(b'control', CLIENT, OutboundQueue.CONTROL))
+        self.assertEqual(queue.stats()['dropped_0'], 1)
+
+    def test_shed_drops_oldest_bulk_for_control(self):
+        queue = OutboundQueue(maxsize=2, policy=OutboundQueue.SHED)
+        queue.put(b'bulk1', CLIENT, OutboundQueue.BULK)
+        queue.put(b'bulk2', CLIENT, OutboundQueue.BULK)
+        self.assertTrue(queue.put(b'control', CLIENT, OutboundQueue.CONTROL))
+        # Bulk never sheds control
+        queue.get_batch(timeout=0)
+        queue.put(b'control1', CLIENT, OutboundQueue.CONTROL)
+        queue.put(b'control2', CLIENT, OutboundQueue.CONTROL)
+        self.assertFalse(queue.put(b'bulk3', CLIENT, OutboundQueue.BULK))
+        stats = queue.stats()
+        self.assertEqual((stats['dropped_0'], stats['dropped_1']), (0, 2))
+
+    def test_closed_queue_refuses_and_wakes_up(self):
+        queue = OutboundQueue()
+        queue.close()
+        self.assertFalse(queue.put(b'late', CLIENT))
+        self.assertEqual(queue.get_batch(), [])
+
+
+class ServerRepliesTest(unittest.TestCase):
+
+    """Replies are queued by class, server not started (nothing sent)."""
+
+    def setUp(self):
+        self.server = DestruckUDPServer()
+
+    def tearDown(self):
+        self.server._sock.close()
+
+    def test_rendezvous_reply_overtakes_bulk(self):
+        sock = self.server._sock
+        # String echo then host register, both answered from the server port
+        self.server._handle_client(sock, CLIENT, encode_fstring('hello'))
+        self.server._handle_client(sock, CLIENT, wire.encode_register('session'))
+        batch = self.server._container.get_batch(timeout=0)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(wire.message_type(batch[0][0]), wire.REGISTER_REPLY)
+        self.assertIn(b'Message received', batch[1][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
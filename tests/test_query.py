@@ -0,0 +1,84 @@
+# tests/test_query.py
+
+import unittest
+
+from Project.server.data import DataManager, Host, HostQuery
+
+
+def make_host(index: int) -> Host:
+    host = Host('10.0.0.{0}'.format(index), 'Unreal_{0}'.format(index),
+                'Player_{0}'.format(index), 'sid_{0}'.format(index))
+    host.add_session_info('SessionId', 'session_{0}'.format(index))
+    host.add_session_info('BuildUniqueId', index % 2)
+    host.add_session_info('NumOpenPublicConnections', index % 3)
+    return host
+
+
+class HostQueryValidationTest(unittest.TestCase):
+
+    def test_malformed_queries_raise_value_error(self):
+        for msg in ([], 'query', None,
+                    {'filters': [1]}, {'filters': 'BuildUniqueId'},
+                    {'filters': {'unknown': 1}},
+                    {'filters': {'BuildUniqueId': {'like': 1}}},
+                    {'filters': {'BuildUniqueId': {'in': 1}}},
+                    {'sort': ['x']}, {'sort': {'a': 1}}, {'sort': 3}, {'sort': 'unknown'},
+                    {'limit': '10'}, {'limit': 0}, {'limit': True}, {'limit': 1.5},
+                    {'descending': 'yes'}, {'descending': 1},
+                    {'cursor': 'abc'}, {'cursor': [0, 'x', 'sid']}, {'cursor': [0, 1, 2]},
+                    {'cursor': [0, float('nan'), 'sid']}, {'cursor': [0, float('inf'), 'sid']},
+                    {'cursor': [0, float('-inf'), 'sid']},
+                    {'fields': 'hostName'}, {'fields': [1]}):
+            with self.subTest(msg=msg):
+                with self.assertRaises(ValueError):
+                    HostQuery.from_dict(msg)
+
+    def test_limit_is_capped(self):
+        self.assertEqual(HostQuery.from_dict({'limit': 10 ** 6}).limit, HostQuery.MAX_LIMIT)
+
+
+class QueryHostsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = DataManager()
+        for i in range(10):
+            self.manager.add_host(make_host(i))
+
+    def test_filter_and_sort(self):
+        query = HostQuery.from_dict({'filters': {'BuildUniqueId': 0, 'NumOpenPublicConnections': {'gt': 0}},
+                                     'sort': 'hostName', 'fields': ['hostName']})
+        result = self.manager.query_hosts(query)
+        self.assertEqual([h['hostName'] for h in result['hosts']], ['Player_2', 'Player_4', 'Player_8'])
+        self.assertEqual(result['total'], 3)
+        self.assertIsNone(result['cursor'])
+
+    def test_pages_follow_cursor(self):
+        names = []
+        msg = {'sort': 'hostName', 'limit': 4}
+        while True:
+            result = self.manager.query_hosts(HostQuery.from_dict(msg))
+            names.extend(h['hostName'] for h in result['hosts'])
+            if result['cursor'] is None:
+                break
+            msg['cursor'] = result['cursor']
+        self.assertEqual(names, sorted('Player_{0}'.format(i) for i in range(10)))
+
+    def test_open_slot_index_matches_filter(self):
+        for index, slots in ((10, 0.5), (11, 2.5), (12, True), (13, '3'), (14, float('nan'))):
+            host = make_host(index)
+            host.add_session_info('NumOpenPublicConnections', slots)
+            self.manager.add_host(host)
+        for condition in ({'gt': 0}, {'gte': 1}):
+            with self.subTest(condition=condition):
+                query = HostQuery.from_dict({'filters': {'NumOpenPublicConnections': condition},
+                                             'limit': HostQuery.MAX_LIMIT})
+                # Served from the HasOpenPublicSlot index, same hosts as a full scan
+                expected = sorted(h.client_ID for h in self.manager.hosts if query.matches(h))
+                result = self.manager.query_hosts(query)
+                self.assertEqual(sorted(h['client_ID'] for h in result['hosts']), expected)
+        indexed = [h.client_ID for h in self.manager.snapshot.lookup('HasOpenPublicSlot', True)]
+        self.assertIn('sid_10', indexed)
+
+
+if __name__ == '__main__':
+    unittest.main()
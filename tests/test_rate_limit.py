@@ -0,0 +1,74 @@
+# tests/test_rate_limit.py
+
+import socket
+import unittest
+
+from Project.server.hole_punching import DestruckUDPServer
+from Project.server.hole_punching.fstring import encode_fstring
+from Project.server.hole_punching.rate_limit import SourceRateLimiter
+
+
+A = ('10.0.0.1', 4000)
+B = ('10.0.0.2', 4000)
+
+
+class SourceRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+
+    def limiter(self, **kwargs) -> SourceRateLimiter:
+        return SourceRateLimiter(clock=lambda: self.now, **kwargs)
+
+    def test_burst_then_refill(self):
+        limiter = self.limiter(rate=2.0, burst=3.0)
+        self.assertEqual([limiter.allow(A) for _ in range(4)], [True, True, True, False])
+        # Other sources have their own bucket
+        self.assertTrue(limiter.allow(B))
+        self.now = 0.5
+        self.assertEqual([limiter.allow(A) for _ in range(2)], [True, False])
+        self.assertEqual(limiter.stats()['dropped_source'], 2)
+
+    def test_global_ceiling(self):
+        limiter = self.limiter(rate=100.0, burst=100.0, global_rate=2.0)
+        self.assertEqual([limiter.allow(A), limiter.allow(B), limiter.allow(A)], [True, True, False])
+        self.assertEqual(limiter.stats()['dropped_global'], 1)
+
+    def test_rate_zero_keeps_global_ceiling_only(self):
+        limiter = self.limiter(rate=0, global_rate=3.0)
+        self.assertEqual([limiter.allow(A) for _ in range(4)], [True, True, True, False])
+        self.assertEqual(len(limiter), 0)
+
+    def test_sources_table_is_bounded(self):
+        limiter = self.limiter(max_sources=2)
+        for i in range(5):
+            limiter.allow(('10.0.1.{0}'.format(i), 4000))
+        self.assertEqual(len(limiter), 2)
+        self.assertEqual(limiter.stats()['evicted'], 3)
+
+    def test_invalid_settings(self):
+        for kwargs in ({'rate': -1}, {'burst': 0.5}, {'max_sources': 0}, {'global_rate': 0.5}):
+            with self.subTest(**kwargs):
+                with self.assertRaises(ValueError):
+                    SourceRateLimiter(**kwargs)
+
+
+class ServerRateLimitTest(unittest.TestCase):
+
+    def test_datagrams_over_rate_get_no_reply(self):
+        server = DestruckUDPServer(limiter=SourceRateLimiter(rate=0.001, burst=1.0))
+        self.assertTrue(server.start('127.0.0.1', 0))
+        self.addCleanup(server.stop)
+        register = encode_fstring('{"Origin": "Host", "Request": "Register"}')
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.settimeout(0.5)
+            client.sendto(register, ('127.0.0.1', server.port))
+            client.sendto(register, ('127.0.0.1', server.port))
+            self.assertIn(b'"Request": "Register"', client.recv(2048))
+            with self.assertRaises(socket.timeout):
+                client.recv(2048)
+        self.assertEqual(server.limiter_stats()['dropped_source'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
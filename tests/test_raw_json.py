@@ -0,0 +1,42 @@
+# tests/test_raw_json.py
+
+import json
+import unittest
+
+from Project.tools import raw_json
+from Project.tools.raw_json import RawJSON
+
+
+class RawJSONTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hosts = RawJSON.encode_from([{'hostName': 'Player', 'NumOpenPublicConnections': 2}])
+
+    def test_spliced_verbatim(self):
+        self.assertEqual(self.hosts, '[{"hostName":"Player","NumOpenPublicConnections":2}]')
+        self.assertEqual(raw_json.dumps(self.hosts), self.hosts)
+        # Socket.io packet: [event, payload]
+        packet = raw_json.dumps(['OnHostsList', self.hosts], separators=(',', ':'))
+        self.assertEqual(packet, '["OnHostsList",' + self.hosts + ']')
+        self.assertEqual(json.loads(packet)[1], json.loads(self.hosts))
+
+    def test_dict_values_spliced(self):
+        encoded = raw_json.dumps({'version': 3, 'hosts': self.hosts})
+        self.assertEqual(encoded, '{"version": 3, "hosts": ' + self.hosts + '}')
+
+    def test_compose_nests_deeper(self):
+        delta = RawJSON.compose({'full': True, 'hosts': self.hosts})
+        self.assertIsInstance(delta, RawJSON)
+        packet = raw_json.dumps(['OnHostsDelta', delta])
+        self.assertEqual(json.loads(packet), ['OnHostsDelta', {'full': True, 'hosts': json.loads(self.hosts)}])
+
+    def test_plain_values_same_as_json(self):
+        for obj in ({'a': [1, 'b', None]}, ['x', {'y': 1.5}], 'text', 3):
+            with self.subTest(obj=obj):
+                self.assertEqual(raw_json.dumps(obj), json.dumps(obj))
+                self.assertEqual(raw_json.dumps(obj, separators=(',', ':')),
+                                 json.dumps(obj, separators=(',', ':')))
+
+
+if __name__ == '__main__':
+    unittest.main()
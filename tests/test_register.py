@@ -0,0 +1,73 @@
+# tests/test_register.py
+
+import unittest
+
+from Project.server.data import Host
+from Project.server.data.data_manager import DataManager
+from Project.server.hole_punching import DestruckUDPServer, wire
+from Project.server.hole_punching import destruck_server
+from Project.server.hole_punching.fstring import encode_fstring
+
+
+HOST = ('198.51.100.20', 7777)
+ATTACKER = ('203.0.113.66', 7777)
+SESSION = '0123456789ABCDEF0123456789ABCDEF'
+REGISTER = encode_fstring('{"Origin": "Host", "Request": "Register", "SessionId": "' + SESSION + '"}')
+
+
+class SpoofedRegisterTest(unittest.TestCase):
+
+    """Register of a session from another address never moves its endpoint."""
+
+    def make_server(self, **kwargs) -> DestruckUDPServer:
+        server = DestruckUDPServer(**kwargs)
+        self.addCleanup(server._sock.close)
+        return server
+
+    def handle(self, server, addr, data):
+        server._handle_client(server._sock, addr, data)
+        return server._container.get_batch(timeout=0)
+
+    def assertSpoofRejected(self, server, data):
+        before = destruck_server._REJECTED['spoofed'].value
+        self.assertEqual(self.handle(server, ATTACKER, data), [])
+        self.assertEqual(destruck_server._REJECTED['spoofed'].value, before + 1)
+        self.assertEqual(server.unreal_hosts.get(SESSION), HOST)
+
+    def test_first_address_keeps_session(self):
+        server = self.make_server()
+        for data in (REGISTER, wire.encode_register(SESSION)):
+            with self.subTest(binary=wire.is_binary(data)):
+                self.assertEqual(len(self.handle(server, HOST, data)), 1)
+                self.assertSpoofRejected(server, data)
+        # Same IP from another port (NAT rebinding) is the host
+        rebound = (HOST[0], 7778)
+        self.assertEqual(len(self.handle(server, rebound, REGISTER)), 1)
+        self.assertEqual(server.unreal_hosts.get(SESSION), rebound)
+
+    def test_registry_host_address_required(self):
+        container = DataManager()
+        host = Host(HOST[0], 'Unreal', 'Player', 'sid')
+        host.add_session_info('SessionId', SESSION)
+        container.add_host(host)
+        server = self.make_server(host_lookup=container.get_host_by_session)
+
+        # Registry knows the session: rejected even before the host registers
+        before = destruck_server._REJECTED['spoofed'].value
+        self.assertEqual(self.handle(server, ATTACKER, wire.encode_register(SESSION)), [])
+        self.assertEqual(destruck_server._REJECTED['spoofed'].value, before + 1)
+        self.assertIsNone(server.unreal_hosts.get(SESSION))
+
+        self.assertEqual(len(self.handle(server, HOST, REGISTER)), 1)
+        self.assertSpoofRejected(server, REGISTER)
+
+    def test_join_goes_to_registered_host(self):
+        server = self.make_server()
+        self.handle(server, HOST, wire.encode_register(SESSION))
+        self.handle(server, ATTACKER, wire.encode_register(SESSION))
+        replies = self.handle(server, ('192.0.2.1', 4000), wire.encode_join(('0.0.0.0', 0), SESSION))
+        self.assertEqual([a for _, a in replies], [HOST, ('192.0.2.1', 4000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# tests/test_relay.py
+
+import socket
+import time
+import unittest
+
+from Project.server.hole_punching import DestruckUDPServer, wire
+from Project.server.hole_punching.fstring import encode_fstring
+from Project.server.hole_punching.relay import UDPRelay
+
+
+HOST = ('198.51.100.20', 7777)
+PEER = ('203.0.113.7', 61000)
+SESSION = 'session'
+
+
+class UDPRelayAllocationTest(unittest.TestCase):
+
+    def test_caps_per_source_and_host(self):
+        relay = UDPRelay(max_sessions=10, max_per_source=2, max_per_host=3)
+        self.assertIsNotNone(relay.allocate(SESSION, '10.0.0.1', '10.0.1.1'))
+        self.assertIsNotNone(relay.allocate(SESSION, '10.0.0.1', '10.0.1.1'))
+        # Source cap
+        self.assertIsNone(relay.allocate(SESSION, '10.0.0.1', '10.0.1.1'))
+        self.assertIsNotNone(relay.allocate(SESSION, '10.0.0.2', '10.0.1.1'))
+        # Host cap
+        self.assertIsNone(relay.allocate(SESSION, '10.0.0.3', '10.0.1.1'))
+        self.assertIsNotNone(relay.allocate(SESSION, '10.0.0.3', '10.0.1.2'))
+
+    def test_reclaim_releases_caps(self):
+        relay = UDPRelay(timeout=1.0, max_per_source=1)
+        token = relay.allocate(SESSION, '10.0.0.1', '10.0.1.1')
+        self.assertIsNone(relay.allocate(SESSION, '10.0.0.1', '10.0.1.1'))
+        relay._reclaim(time.monotonic() + 10 * UDPRelay.TICK)
+        self.assertIsNone(relay.session(token))
+        self.assertIsNotNone(relay.allocate(SESSION, '10.0.0.1', '10.0.1.1'))
+
+    def test_global_cap(self):
+        relay = UDPRelay(max_sessions=1)
+        self.assertIsNotNone(relay.allocate())
+        self.assertIsNone(relay.allocate())
+
+
+class UDPRelayForwardTest(unittest.TestCase):
+
+    def test_bound_peers_reach_each_other(self):
+        relay = UDPRelay(0)
+        relay.start('127.0.0.1')
+        self.addCleanup(relay.stop)
+        target = ('127.0.0.1', relay.port)
+        token = relay.allocate(SESSION)
+
+        peers = []
+        for _ in range(2):
+            peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            peer.bind(('127.0.0.1', 0))
+            peer.settimeout(2.0)
+            self.addCleanup(peer.close)
+            peers.append(peer)
+
+        peers[0].sendto(wire.encode_relay_bind(token), target)
+        self.assertEqual(peers[0].recv(64), wire.encode_relay_bind_reply(token, wire.RELAY_WAITING))
+        peers[1].sendto(wire.encode_relay_bind(token), target)
+        self.assertEqual(peers[1].recv(64), wire.encode_relay_bind_reply(token, wire.RELAY_READY))
+        self.assertEqual(peers[0].recv(64), wire.encode_relay_bind_reply(token, wire.RELAY_READY))
+
+        peers[0].sendto(b'ping', target)
+        self.assertEqual(peers[1].recv(64), b'ping')
+        peers[1].sendto(b'pong', target)
+        self.assertEqual(peers[0].recv(64), b'pong')
+
+    def test_unknown_token(self):
+        relay = UDPRelay(0)
+        relay.start('127.0.0.1')
+        self.addCleanup(relay.stop)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as peer:
+            peer.settimeout(2.0)
+            token = bytes(wire.RELAY_TOKEN_SIZE)
+            peer.sendto(wire.encode_relay_bind(token), ('127.0.0.1', relay.port))
+            self.assertEqual(peer.recv(64), wire.encode_relay_bind_reply(token, wire.RELAY_UNKNOWN))
+
+
+class ServerRelayRequestTest(unittest.TestCase):
+
+    """Relay requests handled by a server never started, replies read from its queue."""
+
+    def setUp(self):
+        self.server = DestruckUDPServer(relay=UDPRelay(0))
+        self.addCleanup(self.server._sock.close)
+        self.handle(HOST, wire.encode_register(SESSION))
+        self.replies()
+
+    def handle(self, addr, data):
+        self.server._handle_client(self.server._sock, addr, data)
+
+    def replies(self):
+        return self.server._container.get_batch(timeout=0)
+
+    def test_refused_without_join(self):
+        self.handle(PEER, wire.encode_relay(SESSION))
+        self.assertEqual(self.replies(), [(wire.encode_relay_reply(bytes(wire.RELAY_TOKEN_SIZE), 0), PEER)])
+        self.assertEqual(len(self.server.relay), 0)
+
+    def test_one_session_per_introduction(self):
+        self.handle(PEER, wire.encode_join(('0.0.0.0', 0), SESSION))
+        self.replies()
+        self.handle(PEER, wire.encode_relay(SESSION))
+        replies = self.replies()
+        self.assertEqual([addr for _, addr in replies], [HOST, PEER])
+        self.assertEqual(len(self.server.relay), 1)
+
+        # Introduction used, asking again is refused and the host is left alone
+        self.handle(PEER, wire.encode_relay(SESSION))
+        self.assertEqual([addr for _, addr in self.replies()], [PEER])
+        self.assertEqual(len(self.server.relay), 1)
+
+    def test_json_join_then_relay(self):
+        self.handle(PEER, encode_fstring('{"Origin": "Client", "Request": "Join", "SessionId": "session"}'))
+        self.replies()
+        self.handle(PEER, encode_fstring('{"Origin": "Client", "Request": "Relay", "SessionId": "session"}'))
+        replies = self.replies()
+        self.assertEqual([addr for _, addr in replies], [HOST, PEER])
+        self.assertIn(b'"Token": "', replies[0][0])
+
+    def test_requests_are_rate_limited(self):
+        refused = wire.encode_relay_reply(bytes(wire.RELAY_TOKEN_SIZE), 0)
+        for _ in range(int(DestruckUDPServer.RELAY_BURST)):
+            self.handle(PEER, wire.encode_relay(SESSION))
+        self.assertEqual(len(self.replies()), int(DestruckUDPServer.RELAY_BURST))
+        # Over the rate, even an introduced peer is refused
+        self.handle(PEER, wire.encode_join(('0.0.0.0', 0), SESSION))
+        self.replies()
+        self.handle(PEER, wire.encode_relay(SESSION))
+        self.assertEqual(self.replies(), [(refused, PEER)])
+        self.assertEqual(len(self.server.relay), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
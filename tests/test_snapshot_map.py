@@ -0,0 +1,140 @@
+# tests/test_snapshot_map.py
+
+import threading
+import unittest
+
+from Project.server.data import DataManager, Host
+from Project.tools.snapshot_map import SnapshotMap
+
+
+class CollidingKey(object):
+
+    """Keys sharing one hash, hence one trie leaf."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and other.name == self.name
+
+
+class SnapshotMapTest(unittest.TestCase):
+
+    def test_grow_and_shrink(self):
+        count = SnapshotMap.SMALL * 4
+        maps = [SnapshotMap()]
+        for i in range(count):
+            maps.append(maps[-1].set(i, str(i)))
+        full = maps[-1]
+        self.assertIsInstance(full._data, list)
+        self.assertEqual(len(full), count)
+        self.assertEqual(sorted(full.keys()), list(range(count)))
+        self.assertTrue(all(full.get(i) == str(i) for i in range(count)))
+        # Every intermediate map kept its own content
+        self.assertEqual(len(maps[SnapshotMap.SMALL]), SnapshotMap.SMALL)
+        self.assertIsInstance(maps[SnapshotMap.SMALL]._data, dict)
+        self.assertNotIn(SnapshotMap.SMALL, maps[SnapshotMap.SMALL])
+
+        shrunk = full
+        for i in range(count - SnapshotMap.SMALL // 2 + 1):
+            shrunk = shrunk.delete(i)
+        self.assertIsInstance(shrunk._data, dict)
+        self.assertEqual(sorted(shrunk.keys()), list(range(count - SnapshotMap.SMALL // 2 + 1, count)))
+        self.assertEqual(len(full), count)
+
+    def test_replace_and_missing(self):
+        data = SnapshotMap.from_items((i, i) for i in range(SnapshotMap.SMALL * 2))
+        replaced = data.set(3, 'three')
+        self.assertEqual((len(replaced), replaced.get(3), data.get(3)), (len(data), 'three', 3))
+        self.assertIs(data.delete('missing'), data)
+        self.assertIsNone(data.get('missing'))
+        self.assertEqual(data.get('missing', 0), 0)
+
+    def test_colliding_keys(self):
+        data = SnapshotMap.from_items((i, i) for i in range(SnapshotMap.SMALL * 2))
+        keys = [CollidingKey(str(i)) for i in range(5)]
+        for key in keys:
+            data = data.set(key, key.name)
+        self.assertEqual([data.get(k) for k in keys], [k.name for k in keys])
+        data = data.delete(keys[2])
+        self.assertNotIn(keys[2], data)
+        self.assertEqual(data.get(keys[3]), '3')
+        self.assertEqual(len(data), SnapshotMap.SMALL * 2 + 4)
+
+
+class ConcurrentReadersTest(unittest.TestCase):
+
+    """Readers never see a half applied write while a writer keeps going."""
+
+    WRITES = 3000
+
+    def run_readers(self, read, write) -> list:
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    read()
+                except AssertionError as err:
+                    errors.append(err)
+                    return
+
+        readers = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in readers:
+            thread.start()
+        try:
+            write()
+        finally:
+            stop.set()
+            for thread in readers:
+                thread.join()
+        return errors
+
+    def test_snapshot_map(self):
+        holder = [SnapshotMap()]
+
+        def write():
+            # Grows over SMALL then shrinks back to a dict, again and again
+            for _ in range(ConcurrentReadersTest.WRITES // 300):
+                for i in range(150):
+                    holder[0] = holder[0].set(i, i)
+                for i in range(150):
+                    holder[0] = holder[0].delete(i)
+
+        def read():
+            snapshot = holder[0]
+            items = sorted(snapshot.items())
+            assert len(items) == len(snapshot), 'size differs from content'
+            assert all(k == v for k, v in items), 'value of another key'
+            assert sorted(snapshot.items()) == items, 'snapshot changed'
+
+        self.assertEqual(self.run_readers(read, write), [])
+
+    def test_registry(self):
+        manager = DataManager()
+
+        def write():
+            for i in range(ConcurrentReadersTest.WRITES):
+                host = Host('10.0.0.1', 'Unreal', 'Player', 'sid_{0}'.format(i % 150))
+                host.add_session_info('SessionId', 'session_{0}'.format(i % 150))
+                if not manager.add_host(host):
+                    manager.remove_host_by_ID(host.client_ID)
+
+        def read():
+            snapshot = manager.snapshot
+            hosts = set(snapshot.hosts)
+            assert set(snapshot.indexes['ipAddress'].get('10.0.0.1', ())) == hosts, 'index out of sync'
+            for clientID in hosts:
+                session = snapshot.get(clientID).get_session_info('SessionId')
+                assert set(snapshot.bucket('SessionId', session)) == {clientID}, 'session index out of sync'
+            assert set(snapshot.hosts) == hosts, 'snapshot changed'
+
+        self.assertEqual(self.run_readers(read, write), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# tests/test_timing_wheel.py
+
+import unittest
+
+from Project.tools.timing_wheel import TimingWheel
+
+
+class TimingWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.wheel = TimingWheel(tick=1.0, slots=8)
+        # Ticks are counted from the wheel creation
+        self.start = self.wheel._start
+
+    def advance(self, seconds: float) -> list:
+        return sorted(self.wheel.advance(self.start + seconds))
+
+    def test_expire_after_delay(self):
+        self.wheel.schedule('a', 2.0, self.start)
+        self.wheel.schedule('b', 5.0, self.start)
+        # Never early
+        self.assertEqual(self.advance(2.5), [])
+        self.assertEqual(self.advance(3.0), ['a'])
+        self.assertEqual(self.advance(6.0), ['b'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_reschedule_extends(self):
+        self.wheel.schedule('a', 2.0, self.start)
+        self.wheel.schedule('a', 6.0, self.start + 1.0)
+        self.assertEqual(self.advance(4.0), [])
+        self.assertIn('a', self.wheel)
+        self.assertEqual(self.advance(8.0), ['a'])
+
+    def test_cancel(self):
+        self.wheel.schedule('a', 2.0, self.start)
+        self.assertTrue(self.wheel.cancel('a'))
+        self.assertFalse(self.wheel.cancel('a'))
+        self.assertEqual(self.advance(10.0), [])
+
+    def test_later_rotation(self):
+        # Same bucket as a key due 8 ticks earlier
+        self.wheel.schedule('a', 2.0, self.start)
+        self.wheel.schedule('b', 10.0, self.start)
+        self.assertEqual(self.advance(3.0), ['a'])
+        self.assertEqual(self.advance(9.0), [])
+        self.assertEqual(self.advance(11.0), ['b'])
+
+    def test_long_pause(self):
+        # More elapsed ticks than slots
+        for i in range(20):
+            self.wheel.schedule(i, float(i), self.start)
+        self.assertEqual(self.advance(100.0), list(range(20)))
+
+    def test_deadline(self):
+        self.wheel.schedule('a', 2.5, self.start)
+        self.assertEqual(self.wheel.deadline('a'), self.start + 3.0)
+        self.assertIsNone(self.wheel.deadline('b'))
+
+    def test_invalid_settings(self):
+        for kwargs in ({'tick': 0}, {'slots': 0}):
+            with self.subTest(**kwargs):
+                with self.assertRaises(ValueError):
+                    TimingWheel(**kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
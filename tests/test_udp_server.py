@@ -0,0 +1,46 @@
+# tests/test_udp_server.py
+
+import socket
+import threading
+import unittest
+
+from Project.server.hole_punching import DestruckUDPServer, AsyncDestruckUDPServer
+from Project.server.hole_punching.fstring import encode_fstring
+
+
+REGISTER = encode_fstring('{"Origin": "Host", "Request": "Register", "SessionId": "session"}')
+
+
+class ServerStartStopTest(unittest.TestCase):
+
+    """Both engines on a port chosen by the system (TestingConfig.UDP_PORT = 0)."""
+
+    def _start_stop(self, factory, host='127.0.0.1'):
+        before = set(threading.enumerate())
+        server = factory()
+        self.assertTrue(server.start(host, 0))
+        self.assertNotEqual(server.port, 0)
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.settimeout(2.0)
+            client.sendto(REGISTER, ('127.0.0.1', server.port))
+            self.assertIn(b'"Request": "Register"', client.recv(2048))
+
+        self.assertTrue(server.stop())
+        for thread in set(threading.enumerate()) - before:
+            thread.join(2.0)
+            self.assertFalse(thread.is_alive(), thread.name)
+
+    def test_thread_engine(self):
+        self._start_stop(DestruckUDPServer)
+
+    def test_asyncio_engine(self):
+        self._start_stop(AsyncDestruckUDPServer)
+
+    def test_any_address(self):
+        # Stop wakes the receive thread up through localhost
+        self._start_stop(DestruckUDPServer, '0.0.0.0')
+
+
+if __name__ == '__main__':
+    unittest.main()
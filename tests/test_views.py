@@ -0,0 +1,92 @@
+# tests/test_views.py
+
+import json
+import unittest
+
+from unittest import mock
+
+from flask import Flask, request
+
+from Project.server import container
+from Project.server.main import views
+
+
+class HandlersIO(object):
+
+    """Collect handlers registered by an IOBlueprint (no socket.io server)."""
+
+    def __init__(self):
+        self.handlers = {}
+
+    def on(self, key, namespace=None):
+        def register(func):
+            self.handlers[key] = func
+            return func
+        return register
+
+
+class AddHostTest(unittest.TestCase):
+
+    SID = 'tests_add_host'
+
+    def setUp(self):
+        io = HandlersIO()
+        views.mainIO_blueprint.init_io(io)
+        self.on_add_host = io.handlers[views.OnAddHost]
+        self.app = Flask(__name__)
+        container.register_client(AddHostTest.SID, '10.0.0.1', 1234)
+
+    def tearDown(self):
+        container.remove_host_by_ID(AddHostTest.SID)
+        container.unregister_client(AddHostTest.SID)
+
+    def add(self) -> list:
+        with self.app.test_request_context('/'), mock.patch.object(views, 'emit') as emit:
+            request.sid = AddHostTest.SID
+            self.on_add_host({'unrealName': 'Unreal', 'hostName': 'Player', 'SessionId': 'session'})
+        return [call[0][0] for call in emit.call_args_list]
+
+    def test_token_only_when_added(self):
+        self.assertEqual(self.add(), [views.OnHostStatusToken])
+        token = container.issue_status_token(AddHostTest.SID)
+        # Already hosting, refused without a new token
+        self.assertEqual(self.add(), [views.OnAddHostFailed])
+        self.assertEqual(container.issue_status_token(AddHostTest.SID), token)
+
+
+class AskHostsDeltaTest(unittest.TestCase):
+
+    def setUp(self):
+        io = HandlersIO()
+        views.mainIO_blueprint.init_io(io)
+        self.on_ask_hosts = io.handlers[views.OnAskHosts]
+        self.app = Flask(__name__)
+
+    def ask(self, msg) -> tuple:
+        with self.app.test_request_context('/'), mock.patch.object(views, 'emit') as emit:
+            request.sid = 'tests_ask_hosts'
+            self.on_ask_hosts(msg)
+        event, payload = emit.call_args[0][:2]
+        # Every hosts are sent pre-encoded (RawJSON)
+        return event, payload if isinstance(payload, dict) else json.loads(payload)
+
+    def test_same_epoch_gets_delta(self):
+        event, payload = self.ask({'since': container.version, 'epoch': container.epoch})
+        self.assertEqual(event, views.OnHostsDelta)
+        self.assertFalse(payload['full'])
+        self.assertEqual(payload['epoch'], container.epoch)
+
+    def test_other_epoch_gets_every_host(self):
+        event, payload = self.ask({'since': container.version, 'epoch': 'previous'})
+        self.assertEqual(event, views.OnHostsDelta)
+        self.assertTrue(payload['full'])
+        self.assertEqual(payload['epoch'], container.epoch)
+        self.assertEqual(payload['version'], container.version)
+
+    def test_epoch_required(self):
+        event, payload = self.ask({'since': container.version})
+        self.assertEqual(event, views.OnAskHostsFailed)
+
+
+if __name__ == '__main__':
+    unittest.main()
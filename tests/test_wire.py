@@ -0,0 +1,82 @@
+# tests/test_wire.py
+
+import struct
+import unittest
+
+from Project.server.hole_punching import DestruckUDPServer, wire
+
+
+CLIENT = ('203.0.113.7', 61000)
+HOST = ('198.51.100.20', 7777)
+SESSION = '0123456789ABCDEF0123456789ABCDEF'
+
+
+class WireFormatTest(unittest.TestCase):
+
+    def test_requests_round_trip(self):
+        self.assertEqual(wire.decode_register(wire.encode_register(SESSION)), SESSION)
+        self.assertEqual(wire.decode_join(wire.encode_join(HOST, 'short')),
+                         (bytes([198, 51, 100, 20]), 7777, 'short'))
+        self.assertEqual(wire.decode_probe(wire.encode_probe('probe')), 'probe')
+        self.assertEqual(wire.decode_relay(wire.encode_relay(SESSION)), SESSION)
+        token = bytes(range(wire.STATUS_TOKEN_SIZE))
+        self.assertEqual(wire.decode_status(wire.encode_status(token, 1, 3)), (token, 1, 3))
+
+    def test_replies_round_trip(self):
+        self.assertEqual(wire.decode_reply(wire.encode_register_reply(CLIENT)), (CLIENT,))
+        joinReply = wire.encode_join_reply(CLIENT, bytes([198, 51, 100, 20]), 7777)
+        self.assertEqual(wire.decode_reply(joinReply), (CLIENT, HOST))
+        self.assertEqual(wire.decode_reply(joinReply + wire.encode_nat(2, 4001, 4016)),
+                         (CLIENT, HOST, (2, 4001, 4016)))
+        self.assertEqual(wire.decode_reply(wire.encode_probe_reply(CLIENT, 1, 3)), (CLIENT, 1, 3))
+        token = bytes(range(wire.RELAY_TOKEN_SIZE))
+        self.assertEqual(wire.decode_reply(wire.encode_relay_reply(token, 5003)), (token, 5003))
+        self.assertEqual(wire.decode_reply(wire.encode_status_reply(wire.STATUS_UPDATED)),
+                         (wire.STATUS_UPDATED,))
+
+    def test_header(self):
+        data = wire.encode_register(SESSION)
+        self.assertTrue(wire.is_binary(data))
+        self.assertEqual(wire.message_type(data), wire.REGISTER)
+        self.assertFalse(wire.is_binary(b'\x00\x00\x00\x05hello'))
+        self.assertFalse(wire.is_binary(bytes([wire.MAGIC])))
+        # Other versions are not understood
+        self.assertIsNone(wire.message_type(bytes([wire.MAGIC, wire.VERSION + 1, wire.REGISTER])))
+
+    def test_truncated_messages_raise_struct_error(self):
+        for encoded, decode in ((wire.encode_register(SESSION), wire.decode_register),
+                                (wire.encode_join(HOST, SESSION), wire.decode_join),
+                                (wire.encode_status(bytes(wire.STATUS_TOKEN_SIZE), 0, 0), wire.decode_status)):
+            with self.subTest(decode=decode.__name__):
+                with self.assertRaises(struct.error):
+                    decode(encoded[:-1])
+
+
+class BinaryServerTest(unittest.TestCase):
+
+    """Binary requests handled by a server never started, replies read from its queue."""
+
+    def setUp(self):
+        self.server = DestruckUDPServer()
+        self.addCleanup(self.server._sock.close)
+
+    def handle(self, addr, data):
+        self.server._handle_client(self.server._sock, addr, data)
+        return self.server._container.get_batch(timeout=0)
+
+    def test_register_then_join(self):
+        replies = self.handle(HOST, wire.encode_register(SESSION))
+        self.assertEqual([(wire.decode_reply(m), a) for m, a in replies], [((HOST,), HOST)])
+
+        replies = self.handle(CLIENT, wire.encode_join(('0.0.0.0', 0), SESSION))
+        # Host introduced to the client, client given the host endpoint
+        self.assertEqual([(wire.decode_reply(m), a) for m, a in replies],
+                         [((CLIENT,), HOST), ((CLIENT, HOST), CLIENT)])
+
+    def test_join_unknown_session_echoes_given_host(self):
+        replies = self.handle(CLIENT, wire.encode_join(HOST, 'unknown'))
+        self.assertEqual([(wire.decode_reply(m), a) for m, a in replies], [((CLIENT, HOST), CLIENT)])
+
+
+if __name__ == '__main__':
+    unittest.main()
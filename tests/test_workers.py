@@ -0,0 +1,95 @@
+# tests/test_workers.py
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from Project.server.hole_punching import UDPWorkerSupervisor
+
+
+class FakeProcess(object):
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.exitcode = None
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def die(self) -> None:
+        self.alive = False
+        self.exitcode = 1
+
+    def terminate(self):
+        self.alive = False
+
+    def join(self, timeout=None):
+        pass
+
+    def kill(self):
+        self.alive = False
+
+
+class FakeSupervisor(UDPWorkerSupervisor):
+
+    """Workers are fake processes, health checked by hand."""
+
+    def _spawn(self) -> FakeProcess:
+        self.spawned = getattr(self, 'spawned', 0) + 1
+        return FakeProcess(self.spawned)
+
+
+class SupervisorRestartTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.supervisor = FakeSupervisor('127.0.0.1', 0, workers=2, check_interval=5.0,
+                                         store_path=os.path.join(directory, 'endpoints.db'))
+        self.supervisor.start()
+        self.addCleanup(self.supervisor.stop)
+        self.start = self.supervisor._startedAt[0]
+
+    def test_dead_worker_restarted(self):
+        self.supervisor._processes[0].die()
+        self.supervisor._check_workers(self.start + UDPWorkerSupervisor.MAX_BACKOFF + 1.0)
+        self.assertEqual(self.supervisor.restarts, 1)
+        self.assertEqual(self.supervisor.alive(), 2)
+
+    def test_crash_loop_backs_off(self):
+        interval = self.supervisor.check_interval
+        now = self.start + UDPWorkerSupervisor.MAX_BACKOFF + 1.0
+        # Ran long enough: restarted at once
+        self.supervisor._processes[0].die()
+        self.supervisor._check_workers(now)
+        self.assertEqual(self.supervisor.restarts, 1)
+
+        # Died right after its restart: waits 2 intervals
+        self.supervisor._processes[0].die()
+        self.supervisor._check_workers(now + 1.0)
+        self.assertEqual(self.supervisor.restarts, 1)
+        self.supervisor._check_workers(now + 1.0 + 2 * interval - 0.5)
+        self.assertEqual(self.supervisor.restarts, 1)
+        self.supervisor._check_workers(now + 1.0 + 2 * interval)
+        self.assertEqual(self.supervisor.restarts, 2)
+        self.assertEqual(self.supervisor.alive(), 2)
+
+    def test_backoff_is_capped(self):
+        now = self.start
+        for _ in range(10):
+            self.supervisor._processes[1].die()
+            self.supervisor._check_workers(now)
+            now = self.supervisor._restartAt[1]
+            self.assertLessEqual(now - self.supervisor._startedAt[1], UDPWorkerSupervisor.MAX_BACKOFF)
+            self.supervisor._check_workers(now)
+        self.assertEqual(self.supervisor.restarts, 10)
+
+    def test_default_store_outside_working_directory(self):
+        supervisor = UDPWorkerSupervisor('127.0.0.1', 5999)
+        self.assertEqual(os.path.dirname(supervisor.store.path), tempfile.gettempdir())
+
+
+if __name__ == '__main__':
+    unittest.main()